@@ -0,0 +1,334 @@
+"""
+Copia columnar (Parquet) de ventas / compras para los tableros de Finanzas.
+
+Los tableros (ventas por mes y sucursal, sabores más vendidos, margen por producto)
+recorren años de historial: en vez de agregarlo en MySQL en cada rerun, se leen de
+una copia en Parquet y se agregan en memoria con pandas/pyarrow.
+
+Estructura en disco (AURUM_ANALITICA_DIR, por defecto ./analitica):
+  ventas/parte-<k>.parquet    filas con id en [k*ANCHO, (k+1)*ANCHO)
+  compras/parte-<k>.parquet
+  estado.json                 por tabla: último id copiado ("marca") y última anotación
+                              de cambios_historial procesada ("cambios")
+
+Refresco incremental (refrescar()):
+  - se vuelven a leer las filas con id > marca - VENTANA (lo nuevo, más un margen para
+    las transacciones que confirmaron tarde con un id más bajo);
+  - se vuelven a leer las filas anotadas en cambios_historial (ediciones y borrados,
+    ver database._registrar_cambio); las que ya no existen se sacan de la copia;
+  - solo se reescriben las partes afectadas, cada una de forma atómica.
+Si el último id de la tabla quedó muy por debajo de la marca (base restaurada / vaciada) se copia de nuevo.
+
+Si está instalado duckdb, consultar() corre SQL directo sobre los Parquet.
+
+Uso:
+    python analitica.py                  # refresco incremental
+    python analitica.py --reconstruir    # copia completa desde cero
+    python analitica.py --sql "SELECT sucursal_id, SUM(total) FROM ventas GROUP BY 1"
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CARPETA = os.environ.get("AURUM_ANALITICA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analitica"))
+TABLAS = ("ventas", "compras")
+ANCHO = 100_000   # ids por parte
+VENTANA = 500     # ids que se vuelven a leer por debajo de la marca
+VIEJA = 15 * 60   # segundos: a partir de acá la pantalla pide un refresco en segundo plano
+
+ESQUEMAS = {
+    "ventas": pa.schema([("id", pa.int64()), ("fecha", pa.timestamp("s")), ("producto_id", pa.int64()),
+                         ("variante_id", pa.int64()), ("sucursal_id", pa.int64()), ("cliente_id", pa.int64()),
+                         ("producto", pa.string()), ("variante", pa.string()), ("cantidad", pa.int64()),
+                         ("precio_unitario", pa.float64()), ("total", pa.float64()), ("metodo_pago", pa.string())]),
+    "compras": pa.schema([("id", pa.int64()), ("fecha", pa.timestamp("s")), ("producto_id", pa.int64()),
+                          ("variante_id", pa.int64()), ("sucursal_id", pa.int64()), ("producto", pa.string()),
+                          ("variante", pa.string()), ("cantidad", pa.int64()), ("costo_total", pa.float64()),
+                          ("proveedor", pa.string()), ("metodo_pago", pa.string())]),
+}
+
+_lock = threading.Lock()
+_en_segundo_plano = threading.Lock()  # a lo sumo un refresco en segundo plano por proceso
+_cargadas = {}  # tabla -> (versión, DataFrame)
+
+
+# --- ESTADO Y PARTES ---
+def _ruta_estado():
+    return os.path.join(CARPETA, "estado.json")
+
+
+def leer_estado():
+    try:
+        with open(_ruta_estado(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"version": 0, "actualizado": None, **{t: {"marca": 0, "cambios": 0} for t in TABLAS}}
+
+
+def _guardar_estado(estado):
+    temporal = _ruta_estado() + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(temporal, _ruta_estado())
+
+
+def _ruta_parte(tabla, k):
+    return os.path.join(CARPETA, tabla, f"parte-{k:05d}.parquet")
+
+
+def _leer_parte(tabla, k):
+    ruta = _ruta_parte(tabla, k)
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=ESQUEMAS[tabla].names)
+    return pq.read_table(ruta).to_pandas()
+
+
+def _a_tabla(tabla, df):
+    esquema = ESQUEMAS[tabla]
+    df = df[esquema.names].copy()
+    for campo in esquema:
+        if pa.types.is_floating(campo.type):
+            # Los DECIMAL de MySQL llegan como Decimal
+            df[campo.name] = df[campo.name].astype(float)
+        elif pa.types.is_integer(campo.type):
+            df[campo.name] = pd.to_numeric(df[campo.name]).astype("Int64")
+        elif pa.types.is_timestamp(campo.type):
+            df[campo.name] = pd.to_datetime(df[campo.name]).astype("datetime64[s]")
+    return pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+
+
+def _escribir_parte(tabla, k, df):
+    ruta = _ruta_parte(tabla, k)
+    if df.empty:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        return
+    # El temporal empieza con "." para que pyarrow no lo tome como parte al leer la carpeta
+    temporal = os.path.join(os.path.dirname(ruta), "." + os.path.basename(ruta) + ".tmp")
+    pq.write_table(_a_tabla(tabla, df.sort_values("id")), temporal, compression="zstd")
+    os.replace(temporal, ruta)
+
+
+# --- REFRESCO ---
+def _refrescar_tabla(tabla, est):
+    """Aplica a la copia de `tabla` lo nuevo y lo editado desde la última vez. Devuelve filas releídas."""
+    import database as db
+    os.makedirs(os.path.join(CARPETA, tabla), exist_ok=True)
+    hasta_cambio, cambiados = db.leer_cambios_historial(tabla, max(est["cambios"] - VENTANA, 0))
+    maximo = db.ultimo_id(tabla)
+    if maximo < est["marca"] - VENTANA:
+        # La tabla se vació o se restauró una copia anterior: los ids ya no significan lo mismo
+        # (borrar las últimas ventas baja el máximo un poco, eso lo cubre la ventana)
+        shutil.rmtree(os.path.join(CARPETA, tabla))
+        os.makedirs(os.path.join(CARPETA, tabla))
+        est["marca"], cambiados = 0, set()
+
+    desde = max(est["marca"] - VENTANA, 0)
+    cambiados = {i for i in cambiados if i <= desde}
+    # Partes a reescribir: las de la ventana y las de filas editadas (aunque no traigan filas nuevas)
+    pendientes = set(range(desde // ANCHO, est["marca"] // ANCHO + 1)) if est["marca"] else set()
+    pendientes |= {i // ANCHO for i in cambiados}
+    nuevas = {}  # parte -> [DataFrames releídos]
+    releidas, marca = 0, max(maximo, est["marca"])
+
+    def volcar(k):
+        viejas = _leer_parte(tabla, k)
+        viejas = viejas[(viejas["id"] <= desde) & ~viejas["id"].isin(cambiados)]
+        partes = [d for d in [viejas] + nuevas.pop(k, []) if not d.empty]
+        _escribir_parte(tabla, k, pd.concat(partes, ignore_index=True) if partes else viejas)
+        pendientes.discard(k)
+
+    def repartir(df):
+        for k, grupo in df.groupby(df["id"] // ANCHO):
+            nuevas.setdefault(int(k), []).append(grupo)
+            pendientes.add(int(k))
+
+    if cambiados:
+        for df in db.iterar_filas_analitica(tabla, ids=cambiados):
+            releidas += len(df)
+            repartir(df)
+    for df in db.iterar_filas_analitica(tabla, desde_id=desde):
+        releidas += len(df)
+        marca = max(marca, int(df["id"].max()))
+        repartir(df)
+        # Las filas vienen ordenadas por id (y las editadas ya se leyeron): las partes
+        # anteriores a este bloque están completas y se escriben ya, para no juntarlas en memoria
+        menor = int(df["id"].min()) // ANCHO
+        for k in sorted(p for p in pendientes if p < menor):
+            volcar(k)
+    for k in sorted(pendientes):
+        volcar(k)
+
+    est["marca"], est["cambios"] = marca, max(hasta_cambio, est["cambios"])
+    return releidas
+
+
+def refrescar(reconstruir=False):
+    """Trae a la copia lo nuevo y lo editado en ventas / compras. Devuelve {tabla: filas releídas}."""
+    with _lock:
+        os.makedirs(CARPETA, exist_ok=True)
+        if reconstruir:
+            for tabla in TABLAS:
+                shutil.rmtree(os.path.join(CARPETA, tabla), ignore_errors=True)
+            if os.path.exists(_ruta_estado()):
+                os.remove(_ruta_estado())
+        estado = leer_estado()
+        releidas = {tabla: _refrescar_tabla(tabla, estado[tabla]) for tabla in TABLAS}
+        estado["version"] += 1
+        estado["actualizado"] = time.time()
+        _guardar_estado(estado)
+        return releidas
+
+
+def refrescar_en_segundo_plano():
+    """Lanza refrescar() en un hilo aparte (si no hay uno corriendo). Devuelve True si lo lanzó."""
+    if not _en_segundo_plano.acquire(blocking=False):
+        return False
+
+    def correr():
+        try:
+            refrescar()
+        except Exception as e:
+            print(f"Error refrescando la copia analítica: {e}")
+        finally:
+            _en_segundo_plano.release()
+    threading.Thread(target=correr, name="refresco-analitica", daemon=True).start()
+    return True
+
+
+def refrescando():
+    return _en_segundo_plano.locked()
+
+
+def esta_vieja():
+    actualizado = leer_estado()["actualizado"]
+    return actualizado is None or time.time() - actualizado > VIEJA
+
+
+# --- LECTURA ---
+def cargar(tabla):
+    """DataFrame con toda la copia de `tabla` (queda en memoria hasta el próximo refresco)."""
+    version = leer_estado()["version"]
+    en_memoria = _cargadas.get(tabla)
+    if en_memoria is not None and en_memoria[0] == version:
+        return en_memoria[1]
+    carpeta = os.path.join(CARPETA, tabla)
+    if os.path.isdir(carpeta) and any(n.endswith(".parquet") and not n.startswith(".") for n in os.listdir(carpeta)):
+        df = pq.read_table(carpeta, schema=ESQUEMAS[tabla]).to_pandas()
+    else:
+        df = ESQUEMAS[tabla].empty_table().to_pandas()
+    _cargadas[tabla] = (version, df)
+    return df
+
+
+def _entre(df, desde=None, hasta=None):
+    if desde is not None:
+        df = df[df["fecha"] >= pd.Timestamp(desde)]
+    if hasta is not None:
+        df = df[df["fecha"] < pd.Timestamp(hasta) + pd.Timedelta(days=1)]
+    return df
+
+
+def _nombres_sucursales():
+    import database as db
+    return {id_s: nombre for nombre, id_s in db._mapa_ids()[1].items()}
+
+
+def ventas_por_mes(sucursal=None, desde=None, hasta=None):
+    """MES, SUCURSAL, OPERACIONES, UNIDADES, INGRESOS por mes y sucursal."""
+    df = _entre(cargar("ventas"), desde, hasta)
+    nombres = _nombres_sucursales()
+    if sucursal:
+        ids = [i for i, n in nombres.items() if n == sucursal]
+        df = df[df["sucursal_id"].isin(ids)]
+    if df.empty:
+        return pd.DataFrame(columns=["MES", "SUCURSAL", "OPERACIONES", "UNIDADES", "INGRESOS"])
+    res = (df.assign(MES=df["fecha"].dt.to_period("M").dt.to_timestamp())
+             .groupby(["MES", "sucursal_id"], as_index=False)
+             .agg(OPERACIONES=("id", "size"), UNIDADES=("cantidad", "sum"), INGRESOS=("total", "sum")))
+    res["SUCURSAL"] = res["sucursal_id"].map(nombres).fillna("(sin sucursal)")
+    return res[["MES", "SUCURSAL", "OPERACIONES", "UNIDADES", "INGRESOS"]]
+
+
+def sabores_mas_vendidos(limite=15, desde=None, hasta=None):
+    """SABOR, UNIDADES, INGRESOS, PRODUCTOS (cuántos productos distintos lo vendieron), de mayor a menor."""
+    import database as db
+    df = _entre(cargar("ventas"), desde, hasta)
+    # El nombre actual de la variante (por variante_id), como en Movimientos: el texto guardado
+    # en cada venta queda con el nombre que tenía al venderse
+    nombres = {id_v: nombre for (_, nombre), id_v in db._mapa_ids()[2].items()}
+    df = df.assign(SABOR=df["variante_id"].map(nombres).fillna(df["variante"]).fillna(""))
+    df = df[df["SABOR"] != ""]
+    if df.empty:
+        return pd.DataFrame(columns=["SABOR", "UNIDADES", "INGRESOS", "PRODUCTOS"])
+    res = (df.groupby("SABOR", as_index=False)
+             .agg(UNIDADES=("cantidad", "sum"), INGRESOS=("total", "sum"), PRODUCTOS=("producto_id", "nunique")))
+    return res.sort_values("UNIDADES", ascending=False).head(limite).reset_index(drop=True)
+
+
+def margen_por_producto(desde=None, hasta=None):
+    """
+    PRODUCTO, UNIDADES, INGRESOS, COSTO, MARGEN, MARGEN %.
+    El costo unitario es el promedio ponderado de todas las compras del producto;
+    si nunca se compró, el costo de catálogo.
+    """
+    import database as db
+    ventas = _entre(cargar("ventas"), desde, hasta)
+    if ventas.empty:
+        return pd.DataFrame(columns=["PRODUCTO", "UNIDADES", "INGRESOS", "COSTO", "MARGEN", "MARGEN %"])
+    res = ventas.groupby("producto_id", as_index=False).agg(
+        PRODUCTO=("producto", "last"), UNIDADES=("cantidad", "sum"), INGRESOS=("total", "sum"))
+
+    compras = cargar("compras")
+    compras = compras[compras["cantidad"] > 0].groupby("producto_id")[["costo_total", "cantidad"]].sum()
+    costo_unitario = compras["costo_total"] / compras["cantidad"]
+    df_prod, _ = db.obtener_datos_globales()
+    ids = db._mapa_ids()[0]
+    catalogo = pd.Series({ids[n]: float(c) for n, c in zip(df_prod.get("Nombre", []), df_prod.get("Costo", [])) if n in ids},
+                         dtype=float)
+    unitario = res["producto_id"].map(costo_unitario).fillna(res["producto_id"].map(catalogo)).fillna(0.0)
+
+    nombres = {id_p: nombre for nombre, id_p in ids.items()}
+    res["PRODUCTO"] = res["producto_id"].map(nombres).fillna(res["PRODUCTO"])
+    res["COSTO"] = unitario * res["UNIDADES"]
+    res["MARGEN"] = res["INGRESOS"] - res["COSTO"]
+    res["MARGEN %"] = (res["MARGEN"] / res["INGRESOS"].where(res["INGRESOS"] != 0) * 100).round(1)
+    return (res.sort_values("MARGEN", ascending=False)
+               [["PRODUCTO", "UNIDADES", "INGRESOS", "COSTO", "MARGEN", "MARGEN %"]].reset_index(drop=True))
+
+
+def consultar(sql):
+    """Corre SQL con duckdb sobre la copia (tablas `ventas` y `compras`). Requiere `pip install duckdb`."""
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("Para consultas SQL sobre la copia analítica hace falta duckdb (pip install duckdb)") from e
+    con = duckdb.connect()
+    try:
+        for tabla in TABLAS:
+            patron = os.path.join(CARPETA, tabla, "parte-*.parquet").replace("'", "''")
+            con.execute(f"CREATE VIEW {tabla} AS SELECT * FROM read_parquet('{patron}')")
+        return con.execute(sql).fetchdf()
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copia analítica de ventas / compras en Parquet")
+    parser.add_argument("--reconstruir", action="store_true", help="borrar la copia y volver a copiar todo")
+    parser.add_argument("--sql", help="consulta a correr sobre la copia (requiere duckdb)")
+    args = parser.parse_args()
+    if args.sql:
+        print(consultar(args.sql).to_string(index=False))
+    else:
+        t0 = time.perf_counter()
+        releidas = refrescar(reconstruir=args.reconstruir)
+        print(f"✅ Copia en {CARPETA} al día en {time.perf_counter() - t0:.1f}s: "
+              + ", ".join(f"{t} {n:,} filas leídas" for t, n in releidas.items()))
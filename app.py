@@ -1,9 +1,18 @@
+import os
 import streamlit as st
 import pandas as pd
-import time
 import database as db
+import importador
+import exportador
+import reportes_pdf
+import analitica
+import diario_local
+import datos_pagina
+import diagnostico
+import cache_db
 from datetime import datetime
-from fpdf import FPDF
+from functools import wraps
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # --- CONFIGURACIÓN ---
 st.set_page_config(page_title="Aurum Suplementos", page_icon="logo.png", layout="wide")
@@ -13,15 +22,70 @@ except:
     pass # Si no hay logo, no falla
 st.sidebar.title("Aurum Gestión")
 
-# Menú Principal (Incluye Clientes)
-menu = st.sidebar.radio("MENÚ", ["Registrar Venta", "Registrar Compra", "Movimientos", "Stock", "Clientes", "Finanzas"])
+# Menú Principal (Incluye Clientes). "Diagnóstico" queda oculto: se habilita con ?diagnostico=1 en la URL
+opciones_menu = ["Registrar Venta", "Registrar Compra", "Movimientos", "Stock", "Clientes", "Finanzas"]
+if st.query_params.get("diagnostico") == "1":
+    opciones_menu.append("Diagnóstico")
+menu = st.sidebar.radio("MENÚ", opciones_menu)
 
-# Carga inicial de datos
-df_prod, sucursales, df_ventas, df_compras = db.obtener_datos_globales()
+# Tiempos de base de datos de esta corrida de la página (las anteriores quedan para la página Diagnóstico).
+# Si la anterior terminó en st.stop() / st.rerun(), iniciar_rerun la cierra.
+st.session_state.diag_rerun = diagnostico.iniciar_rerun(menu, anterior=st.session_state.get("diag_rerun"))
+st.session_state.diag_historial = (st.session_state.get("diag_historial", []) + [st.session_state.diag_rerun])[-30:]
+
+def en_fragmento():
+    """True si Streamlit está corriendo solo un fragmento (no la página entera)."""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+def medir_fragmento(funcion):
+    """Debajo de @st.fragment: cuando Streamlit corre solo el fragmento, esa corrida se mide aparte."""
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not en_fragmento():
+            return funcion(*args, **kwargs)  # dentro de la corrida de la página: se suma a esa
+        r = diagnostico.iniciar_rerun(menu, fragmento=funcion.__name__)
+        st.session_state.diag_historial = (st.session_state.get("diag_historial", []) + [r])[-30:]
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            diagnostico.terminar_rerun(r)
+    return envoltura
+
+# Migraciones pendientes (solo corre la primera vez en el proceso)
+db.inicializar_db()
+# Instantánea del libro de stock si ya corresponde (se revisa cada tanto, en un hilo aparte)
+db.revisar_instantanea_stock()
+
+# Diario local: ventas / compras pendientes de pasar a la base (solo si está activo)
+if diario_local.activo():
+    diario_local.iniciar()
+    est_diario = diario_local.estado()
+    st.sidebar.caption(f"🔄 Sincronización: {est_diario['pendientes']} pendientes · atraso {est_diario['atraso_seg']:.0f}s")
+    if est_diario["ultimo_error"]:
+        st.sidebar.warning(f"Sin conexión con la base: {est_diario['ultimo_error'][1][:120]}")
+    if est_diario["rechazadas"]:
+        with st.sidebar.expander(f"⚠️ {est_diario['rechazadas']} operaciones rechazadas"):
+            for op in diario_local.rechazadas():
+                if op["tipo"] == "venta":
+                    detalle = ", ".join(f"{it['producto']} {it['variante']} x{it['cantidad']}" for it in op["datos"]["items"])
+                else:
+                    detalle = f"Compra {op['datos']['producto']} {op['datos']['variante']} x{op['datos']['cantidad']}"
+                st.write(f"**{op['creada'][:16]}** {detalle}")
+                st.caption(op["mensaje"])
+                r1, r2 = st.columns(2)
+                if r1.button("Reintentar", key=f"reint_{op['uid']}"):
+                    diario_local.reintentar(op["uid"]); st.rerun()
+                if r2.button("Descartar", key=f"desc_{op['uid']}"):
+                    diario_local.descartar(op["uid"]); st.rerun()
+
+# Datos de la página: cada página declara los suyos (datos_pagina.PAGINAS) y se leen recién al pedirlos
+datos = datos_pagina.Pagina(menu)
 
 # --- 1. REGISTRAR VENTA ---
 if menu == "Registrar Venta":
     st.title("💸 Nueva Venta")
+    sucursales = datos["sucursales"]
     
     if not sucursales:
         st.warning("⚠️ Carga sucursales en la base de datos primero.")
@@ -29,7 +93,7 @@ if menu == "Registrar Venta":
         # ---------------------------------------------------------
         # A) LÓGICA DE CLIENTES
         # ---------------------------------------------------------
-        lista_tuples = db.obtener_lista_clientes_simple()
+        lista_tuples = datos["clientes"]
         dict_clientes = {nombre: id_c for id_c, nombre in lista_tuples}
         nombres_ordenados = sorted(list(dict_clientes.keys()))
         
@@ -76,213 +140,293 @@ if menu == "Registrar Venta":
 
         cliente_id_final = dict_clientes.get(cliente_sel)
 
-        # ---------------------------------------------------------
-        # B) LÓGICA DE PRODUCTOS CON VARIANTE
-        # ---------------------------------------------------------
-        
-        # Traemos el catálogo "expandido" (Producto + Variante)
-        df_catalogo = db.obtener_catalogo_venta()
-        
-        opciones_venta = []
-        mapa_datos = {} 
+        # El carrito pertenece a una sucursal: si se cambia de sucursal, se empieza de nuevo
+        if "carrito" not in st.session_state or st.session_state.carrito['sucursal'] != suc_sel:
+            st.session_state.carrito = {"sucursal": suc_sel, "items": []}
+
+        # Producto, carrito y confirmación corren como fragmento: agregar / quitar líneas o
+        # registrar la venta solo vuelve a correr esta parte (stock del SKU y carrito), no toda la página
+        # ni la lista de clientes de arriba
+        @st.fragment
+        @medir_fragmento
+        def panel_venta(suc_sel, cliente_id_final):
+            # ---------------------------------------------------------
+            # B) LÓGICA DE PRODUCTOS CON VARIANTE
+            # ---------------------------------------------------------
         
-        if not df_catalogo.empty:
-            for _, row in df_catalogo.iterrows():
-                # Si tiene variante, mostramos "Producto | Sabor"
-                if row['nombre_variante']:
-                    etiqueta = f"{row['nombre']} | {row['nombre_variante']}"
-                    var_real = row['nombre_variante']
-                else:
-                    etiqueta = row['nombre']
-                    var_real = ""
-                
-                opciones_venta.append(etiqueta)
-                
-                # Guardamos la info real para usarla luego
-                mapa_datos[etiqueta] = {
-                    "base": row['nombre'],
-                    "variante": var_real,
-                    "precio": float(row['precio'])
-                }
+            # Catálogo "expandido" (Producto + Variante) ya indexado para búsqueda
+            indice = datos["indice_catalogo"]
+            mapa_datos = indice.datos
         
-        # Selectbox Buscador
-        prod_sel_txt = st.selectbox("Producto / Sabor", opciones_venta, index=None, placeholder="Escribe para buscar (ej: Star Choco)")
+            # Buscador: palabras en cualquier orden, sin acentos y con tolerancia a errores
+            busqueda = st.text_input("🔎 Buscar producto / sabor", placeholder="Ej: choco star", key="buscar_venta")
+            opciones_venta = indice.buscar(busqueda, limite=100) if busqueda else indice.etiquetas
+            if busqueda and not opciones_venta:
+                st.caption("Sin resultados.")
+            prod_sel_txt = st.selectbox("Producto / Sabor", opciones_venta, index=0 if busqueda and opciones_venta else None, placeholder="Elegí un producto")
         
-        if prod_sel_txt:
-            datos_prod = mapa_datos[prod_sel_txt]
+            if prod_sel_txt:
+                datos_prod = mapa_datos[prod_sel_txt]
             
-            nombre_real = datos_prod['base']
-            variante_real = datos_prod['variante']
-            precio_lista = datos_prod['precio']
+                nombre_real = datos_prod['base']
+                variante_real = datos_prod['variante']
+                precio_lista = datos_prod['precio']
             
-            # Consultar Stock (Ahora buscamos en df_prod que tiene claves combinadas "Nombre | Sabor")
-            row_stock = df_prod[df_prod['Nombre'] == prod_sel_txt]
-            
-            stock_disp = db.obtener_stock_actual(nombre_real, suc_sel, variante_real)
+                stock_disp = db.obtener_stock_actual(nombre_real, suc_sel, variante_real)
+                # Lo que ya está en el carrito de este mismo SKU no está disponible para otra línea
+                en_carrito = sum(l['cantidad'] for l in st.session_state.carrito['items'] if l['etiqueta'] == prod_sel_txt)
+                stock_libre = stock_disp - en_carrito
                 
-            # --- C) PRECIO DINÁMICO ---
+                # --- C) PRECIO DINÁMICO ---
             
-            # Resetear si cambia el producto
-            if "last_prod_v" not in st.session_state or st.session_state.last_prod_v != prod_sel_txt:
-                st.session_state.last_prod_v = prod_sel_txt
-                st.session_state.v_cant = 1
-                st.session_state.v_precio_total = precio_lista
-                st.rerun()
-
-            def actualizar_precio_total():
-                st.session_state.v_precio_total = st.session_state.v_cant * precio_lista
-
-            m1, m2 = st.columns(2)
-            m1.metric("Precio Unitario", f"${precio_lista:,.0f}")
+                # Resetear si cambia el producto (antes de dibujar los inputs: no hace falta otra corrida)
+                if "last_prod_v" not in st.session_state or st.session_state.last_prod_v != prod_sel_txt:
+                    st.session_state.last_prod_v = prod_sel_txt
+                    st.session_state.v_cant = 1
+                    st.session_state.v_precio_total = precio_lista
+
+                def actualizar_precio_total():
+                    st.session_state.v_precio_total = st.session_state.v_cant * precio_lista
+
+                m1, m2 = st.columns(2)
+                m1.metric("Precio Unitario", f"${precio_lista:,.0f}")
             
-            if stock_disp > 0:
-                m2.metric(f"Stock {suc_sel}", f"{stock_disp} u.", delta="Disponible")
-            else:
-                m2.metric(f"Stock {suc_sel}", "❌ AGOTADO", delta="- Sin Stock", delta_color="inverse")
+                if stock_libre > 0:
+                    m2.metric(f"Stock {suc_sel}", f"{stock_libre} u.", delta="Disponible" if not en_carrito else f"{en_carrito} en el carrito")
+                else:
+                    m2.metric(f"Stock {suc_sel}", "❌ AGOTADO", delta="- Sin Stock", delta_color="inverse")
             
-            st.divider()
+                col_f1, col_f2 = st.columns(2)
+                cant = col_f1.number_input("Cantidad", min_value=1, key="v_cant", on_change=actualizar_precio_total)
+                precio_total_final = col_f2.number_input("Precio Final Total ($)", min_value=0.0, key="v_precio_total")
             
-            col_f1, col_f2 = st.columns(2)
-            cant = col_f1.number_input("Cantidad", min_value=1, key="v_cant", on_change=actualizar_precio_total)
-            precio_total_final = col_f2.number_input("Precio Final Total ($)", min_value=0.0, key="v_precio_total")
+                # Los botones del fragmento actualizan la sesión en su callback: la corrida que sigue
+                # (solo este fragmento) ya dibuja el carrito y el stock nuevos, sin st.rerun()
+                def agregar_al_carrito():
+                    cant = st.session_state.v_cant
+                    if stock_libre < cant:
+                        st.session_state.error_venta = "Stock insuficiente."
+                        return
+                    st.session_state.carrito['items'].append({
+                        "etiqueta": prod_sel_txt,
+                        "producto": nombre_real,
+                        "variante": variante_real,
+                        "cantidad": int(cant),
+                        "precio": st.session_state.v_precio_total / cant,
+                    })
+                    del st.session_state.last_prod_v
+
+                st.button("➕ AGREGAR AL CARRITO", use_container_width=True, on_click=agregar_al_carrito)
+
+            # ---------------------------------------------------------
+            # D) CARRITO: se arma en la sesión y se confirma en una sola transacción
+            # ---------------------------------------------------------
+            def quitar_linea(i):
+                st.session_state.carrito['items'].pop(i)
+
+            def vaciar_carrito():
+                st.session_state.carrito = {"sucursal": suc_sel, "items": []}
+
+            def confirmar_venta():
+                items = st.session_state.carrito['items']
+                if diario_local.activo():
+                    # Queda en el diario local al instante; el stock se valida al pasarla a la base
+                    ok, res = diario_local.anotar_venta(items, st.session_state.v_metodo, suc_sel, st.session_state.v_notas, cliente_id_final)
+                else:
+                    ok, res = db.registrar_venta_carrito(items, st.session_state.v_metodo, suc_sel, st.session_state.v_notas, cliente_id_final)
+                if not ok:
+                    st.session_state.error_venta = res
+                    return
+                vaciar_carrito()
+                if diario_local.activo():
+                    st.session_state.aviso_venta = "¡Venta registrada! Se sincroniza con la base en segundo plano."
+                else:
+                    st.session_state.aviso_venta = "¡Venta registrada! Quedan: " + ", ".join(f"{k}: {v} u." for k, v in res.items())
+
+            # Los callbacks no dibujan: dejan el mensaje en la sesión y se muestra acá
+            if "aviso_venta" in st.session_state:
+                st.toast(st.session_state.pop("aviso_venta"), icon="✅")
+            if "error_venta" in st.session_state:
+                st.error(f"❌ {st.session_state.pop('error_venta')}")
+
+            items = st.session_state.carrito['items']
+            if items:
+                st.divider()
+                st.subheader(f"🛒 Carrito ({len(items)})")
+                for i, l in enumerate(items):
+                    k1, k2, k3, k4 = st.columns([5, 1, 2, 1])
+                    k1.write(l['etiqueta'])
+                    k2.write(f"x{l['cantidad']}")
+                    k3.write(f"${l['precio'] * l['cantidad']:,.0f}")
+                    k4.button("🗑️", key=f"quitar_{i}", on_click=quitar_linea, args=(i,))
+                total_carrito = sum(l['precio'] * l['cantidad'] for l in items)
+                st.metric("Total", f"${total_carrito:,.0f}")
             
-            metodo = st.radio("Pago", ["Efectivo", "Transferencia"], horizontal=True)
-            notas = st.text_input("Notas")
+                st.radio("Pago", ["Efectivo", "Transferencia"], horizontal=True, key="v_metodo")
+                st.text_input("Notas", key="v_notas")
             
-            if st.button("✅ REGISTRAR VENTA", type="primary", use_container_width=True):
-                if stock_disp < cant:
-                    st.error("❌ Stock insuficiente.")
-                else:
-                    precio_unitario_calc = precio_total_final / cant
-                    
-                    # Llamamos a registrar_venta con TODOS los argumentos nuevos
-                    exito = db.registrar_venta(
-                        producto=nombre_real, 
-                        variante=variante_real, 
-                        cantidad=cant, 
-                        precio=precio_unitario_calc, 
-                        metodo=metodo, 
-                        ubicacion=suc_sel, 
-                        notas=notas, 
-                        cliente_id=cliente_id_final
-                    )
-                    
-                    if exito:
-                        st.success(f"¡Venta de {prod_sel_txt} registrada!")
-                        time.sleep(1)
-                        if "last_prod_v" in st.session_state: del st.session_state.last_prod_v
-                        st.rerun()
+                b1, b2 = st.columns([3, 1])
+                b1.button("✅ REGISTRAR VENTA", type="primary", use_container_width=True, on_click=confirmar_venta)
+                b2.button("Vaciar", use_container_width=True, on_click=vaciar_carrito)
+
+        panel_venta(suc_sel, cliente_id_final)
 
 # --- 2. REGISTRAR COMPRA (CORREGIDO) ---
 elif menu == "Registrar Compra":
     st.title("📦 Ingreso de Mercadería")
+    sucursales = datos["sucursales"]
     
     if not sucursales:
         st.warning("⚠️ Carga sucursales en la base de datos primero.")
     else:
-        # 1. Obtener catálogo completo (Producto + Variantes)
-        # Usamos la misma función que en ventas para ver todos los sabores
-        df_catalogo = db.obtener_catalogo_venta()
+        # Buscador + formulario como fragmento: registrar un ingreso no vuelve a correr la página
+        @st.fragment
+        @medir_fragmento
+        def form_compra():
+            # 1. Catálogo completo (Producto + Variantes), el mismo índice que en ventas
+            indice = datos["indice_catalogo"]
+            mapa_datos = indice.datos
         
-        opciones_compra = []
-        mapa_datos = {}
-        
-        if not df_catalogo.empty:
-            for _, row in df_catalogo.iterrows():
-                # Construimos el string "Producto | Sabor"
-                if row['nombre_variante']:
-                    etiqueta = f"{row['nombre']} | {row['nombre_variante']}"
-                    var_real = row['nombre_variante']
-                else:
-                    etiqueta = row['nombre']
-                    var_real = ""
-                
-                opciones_compra.append(etiqueta)
-                
-                # Guardamos la info para recuperarla al seleccionar
-                mapa_datos[etiqueta] = {
-                    "base": row['nombre'],
-                    "variante": var_real
-                }
-        
-        # 2. Formulario de Compra
-        c1, c2 = st.columns(2)
-        prod_compra_full = c1.selectbox("Producto / Sabor", opciones_compra, placeholder="Escribe para buscar...")
-        suc_compra = c2.selectbox("Destino (Sucursal)", sucursales)
+            # 2. Formulario de Compra
+            busqueda_c = st.text_input("🔎 Buscar producto / sabor", placeholder="Ej: choco star", key="buscar_compra")
+            opciones_compra = indice.buscar(busqueda_c, limite=100) if busqueda_c else indice.etiquetas
+            c1, c2 = st.columns(2)
+            prod_compra_full = c1.selectbox("Producto / Sabor", opciones_compra, placeholder="Escribe para buscar...")
+            suc_compra = c2.selectbox("Destino (Sucursal)", sucursales)
 
-        # Lógica para mostrar costo sugerido (Opcional, busca el último costo)
-        costo_sugerido = 0.0
+            # Lógica para mostrar costo sugerido (Opcional, busca el último costo)
+            costo_sugerido = 0.0
         
-        with st.form("form_compra"):
-            st.divider()
-            cc1, cc2 = st.columns(2)
-            cant_c = cc1.number_input("Cantidad a Ingresar", min_value=1, value=1)
-            costo_c = cc2.number_input("Costo Total de la Compra ($)", min_value=0.0, step=100.0)
+            with st.form("form_compra", clear_on_submit=True):
+                st.divider()
+                cc1, cc2 = st.columns(2)
+                cant_c = cc1.number_input("Cantidad a Ingresar", min_value=1, value=1)
+                costo_c = cc2.number_input("Costo Total de la Compra ($)", min_value=0.0, step=100.0)
             
-            cc3, cc4 = st.columns(2)
-            prov = cc3.text_input("Proveedor")
-            metodo_c = cc4.selectbox("Método de Pago", ["Efectivo", "Transferencia"])
+                cc3, cc4 = st.columns(2)
+                prov = cc3.text_input("Proveedor")
+                metodo_c = cc4.selectbox("Método de Pago", ["Efectivo", "Transferencia"])
             
-            notas_c = st.text_input("Notas / Nro Factura")
+                notas_c = st.text_input("Notas / Nro Factura")
             
-            # Feedback visual del costo unitario
-            if cant_c > 0 and costo_c > 0:
-                st.caption(f"💡 Costo unitario calculado: **${costo_c / cant_c:,.2f}**")
+                # Feedback visual del costo unitario
+                if cant_c > 0 and costo_c > 0:
+                    st.caption(f"💡 Costo unitario calculado: **${costo_c / cant_c:,.2f}**")
             
-            if st.form_submit_button("📥 REGISTRAR INGRESO", type="primary"):
-                if prod_compra_full:
-                    # Recuperamos los datos limpios del mapa
-                    datos = mapa_datos[prod_compra_full]
-                    prod_real = datos['base']
-                    var_real = datos['variante']
+                if st.form_submit_button("📥 REGISTRAR INGRESO", type="primary"):
+                    if prod_compra_full:
+                        # Recuperamos los datos limpios del mapa
+                        datos_prod = mapa_datos[prod_compra_full]
+                        prod_real = datos_prod['base']
+                        var_real = datos_prod['variante']
                     
-                    # Llamamos a la base de datos pasando la variante explícitamente
-                    if db.registrar_compra(prod_real, var_real, cant_c, costo_c, prov, metodo_c, suc_compra, notas_c):
-                        st.success(f"✅ ¡Ingreso de {prod_compra_full} registrado en {suc_compra}!")
-                        time.sleep(1.5)
-                        st.rerun()
+                        # Llamamos a la base de datos pasando la variante explícitamente
+                        registrar = diario_local.anotar_compra if diario_local.activo() else db.registrar_compra
+                        if registrar(prod_real, var_real, cant_c, costo_c, prov, metodo_c, suc_compra, notas_c):
+                            # El formulario se vacía solo (clear_on_submit): no hace falta volver a correr nada
+                            st.toast(f"¡Ingreso de {prod_compra_full} registrado en {suc_compra}!", icon="✅")
+                        else:
+                            st.error("❌ Error al registrar en base de datos.")
                     else:
-                        st.error("❌ Error al registrar en base de datos.")
+                        st.warning("Selecciona un producto.")
+
+        form_compra()
+
+        # 3. Importación masiva (remitos de proveedor / lista de precios)
+        with st.expander("📥 Importar desde archivo (CSV / Excel)"):
+            tipo_imp = st.radio("Contenido", ["Compras", "Catálogo"], horizontal=True,
+                                help="Compras: producto, variante, sucursal, cantidad, costo_total, proveedor, metodo_pago, notas, fecha. "
+                                     "Catálogo: nombre, costo, precio, variante.")
+            archivo = st.file_uploader("Archivo", type=["csv", "xlsx"])
+            if archivo and st.button("Importar", type="primary"):
+                barra = st.empty()
+                try:
+                    r = importador.importar(archivo, archivo.name, "compras" if tipo_imp == "Compras" else "catalogo",
+                                            progreso=lambda n: barra.caption(f"⏳ {n} filas procesadas..."))
+                except ValueError as e:
+                    st.error(f"❌ {e}")
                 else:
-                    st.warning("Selecciona un producto.")
+                    barra.empty()
+                    st.success(f"✅ {r['importadas']} de {r['leidas']} filas importadas.")
+                    if not r['errores'].empty:
+                        st.warning(f"{len(r['errores'])} filas con errores (no se importaron):")
+                        st.dataframe(r['errores'].head(200), hide_index=True, use_container_width=True)
+                        st.download_button("⬇️ Descargar reporte de errores", r['errores'].to_csv(index=False).encode("utf-8"),
+                                           file_name="errores_importacion.csv", mime="text/csv")
 # --- 3. MOVIMIENTOS ---
 elif menu == "Movimientos":
     st.title("📜 Historial de Transacciones")
     
     # Filtros Superiores
-    c_filtro1, c_filtro2, c_filtro3 = st.columns([1, 2, 2])
+    c_filtro1, c_filtro2, c_filtro3, c_filtro4 = st.columns([1, 2, 2, 2])
     tipo_mov = c_filtro1.radio("Ver:", ["Ventas", "Compras"], horizontal=True)
-    f_suc = c_filtro2.selectbox("Sucursal", ["Todas"] + sucursales)
-    f_prod = c_filtro3.text_input("Buscar Producto", placeholder="Ej: Proteína")
-    
-    # Obtener DataFrames
-    df_show = df_ventas.copy() if tipo_mov == "Ventas" else df_compras.copy()
+    f_suc = c_filtro2.selectbox("Sucursal", ["Todas"] + datos["sucursales"])
+    f_texto = c_filtro3.text_input("Buscar", placeholder="Producto, proveedor, cliente o nota (Ej: factura 0012-3344)")
+    f_fechas = c_filtro4.date_input("Rango de fechas", value=[], format="DD/MM/YYYY")
+    f_desde = f_fechas[0] if len(f_fechas) > 0 else None
+    f_hasta = f_fechas[1] if len(f_fechas) > 1 else f_desde
+
+    # Paginación: guardamos la clave (fecha, id) de inicio de cada página visitada.
+    # Si cambian los filtros, se vuelve a la primera página.
+    filtros_actuales = (tipo_mov, f_suc, f_texto, f_desde, f_hasta)
+    if st.session_state.get("mov_filtros") != filtros_actuales:
+        st.session_state.mov_filtros = filtros_actuales
+        st.session_state.mov_paginas = [None]
+    paginas = st.session_state.mov_paginas
+
+    # Solo se trae la página visible (filtros resueltos en SQL).
+    # Con texto de búsqueda: los más relevantes según el índice de texto completo, sin paginar.
+    if f_texto.strip():
+        df_show = db.buscar_movimientos(
+            tipo_mov,
+            f_texto,
+            sucursal=None if f_suc == "Todas" else f_suc,
+            desde=f_desde,
+            hasta=f_hasta,
+        )
+        clave_siguiente = None
+    else:
+        df_show, clave_siguiente = db.obtener_movimientos(
+            tipo_mov,
+            sucursal=None if f_suc == "Todas" else f_suc,
+            desde=f_desde,
+            hasta=f_hasta,
+            despues_de=paginas[-1],
+        )
 
-    # Aplicar Filtros
-    if f_suc != "Todas" and not df_show.empty: 
-        df_show = df_show[df_show['UBICACION'] == f_suc]
-    
-    if f_prod and not df_show.empty: 
-        df_show = df_show[df_show['PRODUCTO'].str.contains(f_prod, case=False, na=False)]
-    
     # Mostrar Tabla Principal
     st.markdown("### 📋 Listado")
     if not df_show.empty:
-        # Formatear producto para mostrar variante
-        if 'VARIANTE' in df_show.columns:
-            df_show['PRODUCTO_FULL'] = df_show.apply(lambda x: f"{x['PRODUCTO']} {('| ' + x['VARIANTE']) if x['VARIANTE'] else ''}", axis=1)
-        else:
-            df_show['PRODUCTO_FULL'] = df_show['PRODUCTO']
-
         # Columnas a mostrar
         cols = ['ID', 'FECHA', 'PRODUCTO_FULL', 'CANTIDAD', 'UBICACION']
         if tipo_mov == "Ventas": cols += ['TOTAL', 'METODO PAGO', 'CLIENTE_ID']
         else: cols += ['COSTO', 'PROVEEDOR']
         
+        if f_texto.strip(): cols += ['NOTAS']
         st.dataframe(df_show[cols], use_container_width=True, hide_index=True)
     else:
         st.info("No se encontraron movimientos con esos filtros.")
 
+    if f_texto.strip():
+        st.caption(f"{len(df_show)} resultados, los más relevantes primero (hasta 100).")
+    else:
+        c_prev, c_pag, c_next = st.columns([1, 2, 1])
+        if c_prev.button("⬅️ Anterior", disabled=len(paginas) == 1):
+            paginas.pop()
+            st.rerun()
+        c_pag.caption(f"Página {len(paginas)}")
+        if c_next.button("Siguiente ➡️", disabled=clave_siguiente is None):
+            paginas.append(clave_siguiente)
+            st.rerun()
+
+        # Exportación del historial completo con los filtros actuales (se genera recién al hacer clic)
+        filtros_export = dict(sucursal=None if f_suc == "Todas" else f_suc, desde=f_desde, hasta=f_hasta)
+        e1, e2 = st.columns(2)
+        e1.download_button("⬇️ Exportar CSV", lambda: exportador.a_archivo_temporal(tipo_mov, "csv", **filtros_export),
+                           file_name=f"{tipo_mov.lower()}.csv", mime="text/csv", on_click="ignore", use_container_width=True)
+        e2.download_button("⬇️ Exportar Parquet", lambda: exportador.a_archivo_temporal(tipo_mov, "parquet", **filtros_export),
+                           file_name=f"{tipo_mov.lower()}.parquet", mime="application/octet-stream", on_click="ignore", use_container_width=True)
+
     st.divider()
     
     # --- ZONA DE GESTIÓN (EDITAR / ELIMINAR) ---
@@ -306,6 +450,38 @@ elif menu == "Movimientos":
             # Extraer ID del texto seleccionado "ID 123 | ..."
             id_sel = int(sel_registro.split(" | ")[0].replace("ID ", ""))
             
+            # Comprobante: se dibuja en segundo plano (queda guardado en disco) y la página no lo espera.
+            # Clave (id, ruta vigente): si se editó el carrito, el Future guardado ya no se usa
+            if tipo_mov == "Ventas":
+                comprobantes = st.session_state.setdefault("comprobantes", {})
+                clave_comp = (id_sel, reportes_pdf.ruta_comprobante(id_sel))
+                for vieja in [k for k in comprobantes if k[0] == id_sel and k != clave_comp]:
+                    comprobantes.pop(vieja)
+                futuro = comprobantes.get(clave_comp)
+                pdf = None
+                if futuro is not None and futuro.done() and futuro.exception() is None:
+                    pdf = reportes_pdf.leer(futuro)
+                    if pdf is None:  # limpiar() borró el archivo: se vuelve a pedir
+                        comprobantes.pop(clave_comp); futuro = None
+                if futuro is None:
+                    col_sel.button("🧾 Comprobante PDF", key="pedir_comprobante",
+                                   on_click=lambda: comprobantes.update({clave_comp: reportes_pdf.encargar_comprobante(id_sel)}))
+                elif not futuro.done():
+                    # Revisa cada segundo solo este pedacito; cuando está listo, redibuja la página con el botón de descarga
+                    @st.fragment(run_every=1)
+                    @medir_fragmento
+                    def esperar_comprobante():
+                        if futuro.done(): st.rerun()
+                        st.caption("⏳ Generando comprobante...")
+                    with col_sel:
+                        esperar_comprobante()
+                elif futuro.exception() is not None:
+                    col_sel.error(f"No se pudo generar el comprobante: {futuro.exception()}")
+                    comprobantes.pop(clave_comp)
+                else:
+                    col_sel.download_button("⬇️ Descargar comprobante", pdf,
+                                            file_name=f"comprobante_{id_sel}.pdf", mime="application/pdf", on_click="ignore")
+            
             # Pestañas de Acción
             tab_edit, tab_del = col_action.tabs(["✏️ Editar", "🗑️ Eliminar"])
             
@@ -326,7 +502,9 @@ elif menu == "Movimientos":
                             st.info(f"Nuevo Total: ${nc*np:,.0f}")
                             if st.form_submit_button("💾 Actualizar Venta"):
                                 ok, msg = db.actualizar_venta(id_sel, nc, np, nm, nn)
-                                if ok: st.success(msg); time.sleep(1); st.rerun()
+                                if ok:
+                                    st.session_state.pop("comprobantes", None)  # los ya generados quedaron viejos
+                                    st.toast(msg, icon="✅"); st.rerun()
                                 else: st.error(msg)
                 
                 # B) EDICIÓN DE COMPRAS (NUEVO)
@@ -353,8 +531,7 @@ elif menu == "Movimientos":
                             if st.form_submit_button("💾 Actualizar Compra"):
                                 ok, msg = db.actualizar_compra(id_sel, nc, n_costo, n_prov, n_met, n_notas)
                                 if ok: 
-                                    st.success(msg)
-                                    time.sleep(1); st.rerun()
+                                    st.toast(msg, icon="✅"); st.rerun()
                                 else: 
                                     st.error(msg)
 
@@ -364,18 +541,16 @@ elif menu == "Movimientos":
                 st.warning("El stock asociado será devuelto al inventario automáticamente.")
                 
                 if st.button("🚨 CONFIRMAR ELIMINACIÓN", type="primary"):
-                    # Obtener la fila completa del dataframe original para pasarla a la funcion eliminar
-                    row_del = df_show[df_show['ID'] == id_sel].iloc[0]
-                    
+                    # El producto, variante y sucursal se leen de la base por ID
                     exito = False
                     if tipo_mov == "Ventas":
-                        exito = db.eliminar_venta(id_sel, row_del)
+                        exito = db.eliminar_venta(id_sel)
                     else:
-                        exito = db.eliminar_compra(id_sel, row_del)
+                        exito = db.eliminar_compra(id_sel)
                         
                     if exito:
-                        st.success("Registro eliminado correctamente.")
-                        time.sleep(1.5)
+                        st.session_state.pop("comprobantes", None)
+                        st.toast("Registro eliminado correctamente.", icon="✅")
                         st.rerun()
                     else:
                         st.error("Error al eliminar el registro.")
@@ -384,52 +559,69 @@ elif menu == "Movimientos":
 elif menu == "Stock":
     st.title("📦 Gestión de Inventario Flexible")
     
-    # Obtenemos los datos en formato "Matriz" para editar
-    df_matrix, lista_sucursales = db.obtener_datos_matrix()
-    
-    tab_editor, tab_avanzado, tab_nuevo = st.tabs(["📦 Stock", "🛠️ Gestión Variantes / Bajas", "➕ Nuevo Producto"])
+    tab_editor, tab_avanzado, tab_nuevo, tab_libro = st.tabs(["📦 Stock", "🛠️ Gestión Variantes / Bajas", "➕ Nuevo Producto", "🕓 Stock a una fecha"])
 
     # --- TAB 1: EDITOR TIPO EXCEL ---
     with tab_editor:
-        st.caption("Modifica precios, costos y stock directamente en las celdas. Los cambios se guardan al pulsar el botón.")
+        # Fragmento: guardar solo vuelve a leer la matriz y redibujar el editor
+        @st.fragment
+        @medir_fragmento
+        def editor_stock():
+            st.caption("Modifica precios, costos y stock directamente en las celdas. Los cambios se guardan al pulsar el botón.")
+            if "aviso_editor" in st.session_state:
+                st.toast(st.session_state.pop("aviso_editor"), icon="✅")
         
-        if not df_matrix.empty:
-            # Configuración de columnas para el editor
-            column_config = {
-                "Producto": st.column_config.TextColumn("Producto", disabled=True), # Bloqueamos nombre para no romper integridad
-                "Variante": st.column_config.TextColumn("Variante", disabled=True), # Bloqueamos variante aquí
-                "Costo": st.column_config.NumberColumn("Costo ($)", min_value=0, format="$%d"),
-                "Precio": st.column_config.NumberColumn("Precio ($)", min_value=0, format="$%d"),
-            }
-            # Configurar columnas dinámicas de sucursales
-            for suc in lista_sucursales:
-                column_config[suc] = st.column_config.NumberColumn(f"Stock {suc}", min_value=0, step=1, format="%d u.")
-
-            # EDITOR DE DATOS
-            df_editado = st.data_editor(
-                df_matrix,
-                column_config=column_config,
-                use_container_width=True,
-                hide_index=True,
-                num_rows="fixed", # No permitir agregar filas aquí, usar pestaña "Nuevo"
-                key="editor_stock"
-            )
-
-            # Botón de guardado
-            st.write("")
-            col_save, col_info = st.columns([1, 4])
-            if col_save.button("💾 GUARDAR CAMBIOS", type="primary"):
-                if db.guardar_cambios_masivos(df_editado, lista_sucursales):
-                    st.success("✅ ¡Base de datos actualizada!")
-                    time.sleep(1)
-                    st.rerun()
-        else:
-            st.info("No hay productos activos. Ve a 'Nuevo Producto'.")
+            # Obtenemos los datos en formato "Matriz" para editar
+            df_matrix, lista_sucursales = datos["matriz"]
+        
+            if not df_matrix.empty:
+                # Configuración de columnas para el editor
+                column_config = {
+                    "Producto": st.column_config.TextColumn("Producto", disabled=True), # Bloqueamos nombre para no romper integridad
+                    "Variante": st.column_config.TextColumn("Variante", disabled=True), # Bloqueamos variante aquí
+                    "Costo": st.column_config.NumberColumn("Costo ($)", min_value=0, format="$%d"),
+                    "Precio": st.column_config.NumberColumn("Precio ($)", min_value=0, format="$%d"),
+                }
+                # Configurar columnas dinámicas de sucursales
+                for suc in lista_sucursales:
+                    column_config[suc] = st.column_config.NumberColumn(f"Stock {suc}", min_value=0, step=1, format="%d u.")
+
+                # EDITOR DE DATOS
+                df_editado = st.data_editor(
+                    df_matrix,
+                    column_config=column_config,
+                    use_container_width=True,
+                    hide_index=True,
+                    num_rows="fixed", # No permitir agregar filas aquí, usar pestaña "Nuevo"
+                    # Versión en la clave: después de guardar, el editor arranca limpio sobre la matriz nueva
+                    key=f"editor_stock_{st.session_state.get('version_editor', 0)}"
+                )
+
+                # Botón de guardado
+                st.write("")
+                col_save, col_info = st.columns([1, 4])
+                if col_save.button("💾 GUARDAR CAMBIOS", type="primary"):
+                    # Solo se escriben las celdas modificadas respecto de la matriz cargada
+                    ok, res = db.guardar_cambios_masivos(df_editado, lista_sucursales, df_matrix)
+                    if not ok:
+                        st.error(f"Error al guardar: {res}")
+                    elif res == 0:
+                        col_info.info("No hay cambios para guardar.")
+                    else:
+                        # Editor nuevo (otra clave) sobre la matriz guardada, dibujado ya: si no, la
+                        # primera edición después de guardar caería en el editor viejo y se perdería
+                        st.session_state.aviso_editor = f"¡Base de datos actualizada! ({res} fila(s) modificada(s))"
+                        st.session_state.version_editor = st.session_state.get('version_editor', 0) + 1
+                        st.rerun(scope="fragment" if en_fragmento() else "app")
+            else:
+                st.info("No hay productos activos. Ve a 'Nuevo Producto'.")
+
+        editor_stock()
 
 # --- TAB 2: GESTIÓN AVANZADA (Variantes y Bajas) ---
     with tab_avanzado:
         # 1. RECUPERAR DATOS: Obtenemos AMBAS listas (Sucursales y Productos)
-        sucs_list, all_prods = db.obtener_listas_auxiliares()
+        sucs_list, all_prods = datos["listas_auxiliares"]
         
         # --- SECCIÓN A: CREAR NUEVA VARIANTE ---
         st.subheader("🎨 Agregar Variantes")
@@ -442,8 +634,7 @@ elif menu == "Stock":
                 if prod_add and nombre_var:
                     ok, msg = db.crear_variante(prod_add, nombre_var)
                     if ok:
-                        st.success(f"Variante '{nombre_var}' agregada.")
-                        time.sleep(1); st.rerun()
+                        st.toast(f"Variante '{nombre_var}' agregada.", icon="✅"); st.rerun()
                     else: st.error(msg)
                 else: st.warning("Completa los campos.")
         
@@ -467,8 +658,7 @@ elif menu == "Stock":
                     if st.button("Renombrar"):
                         ok, msg = db.renombrar_variante(p_renom, v_old, v_new_name)
                         if ok: 
-                            st.success("¡Renombrado exitoso!")
-                            time.sleep(1); st.rerun()
+                            st.toast("¡Renombrado exitoso!", icon="✅"); st.rerun()
                         else: st.error(msg)
                 else:
                     st.info("Este producto no tiene variantes.")
@@ -482,8 +672,7 @@ elif menu == "Stock":
             
             if st.button("Confirmar Eliminación", type="primary"):
                 if db.borrado_logico_producto(prod_del):
-                    st.success(f"'{prod_del}' eliminado.")
-                    time.sleep(1); st.rerun()
+                    st.toast(f"'{prod_del}' eliminado.", icon="✅"); st.rerun()
 
     # --- TAB 3: NUEVO PRODUCTO ---
     with tab_nuevo:
@@ -504,79 +693,125 @@ elif menu == "Stock":
                         lista_v = [v.strip() for v in np_vars.split(',') if v.strip()]
                         for v in lista_v:
                             db.crear_variante(np_nombre, v)
-                    st.success("¡Producto Creado!"); time.sleep(1); st.rerun()
+                    st.toast("¡Producto Creado!", icon="✅"); st.rerun()
                 else:
                     st.error("Error: Probablemente el nombre ya existe.")
 
+    # --- TAB 4: LIBRO DE STOCK (stock a una fecha y movimientos de cada SKU) ---
+    with tab_libro:
+        df_matrix, lista_sucursales = datos["matriz"]
+        dia_stock = st.date_input("Al cierre del día", value=datetime.now().date(), key="stock_dia")
+        df_al = db.obtener_stock_al(dia_stock)
+        if df_al.empty:
+            st.info("No había stock registrado a esa fecha.")
+        else:
+            tabla_al = df_al.pivot_table(index=["Producto", "Variante"], columns="Sucursal", values="Cantidad",
+                                         aggfunc="sum", fill_value=0).reset_index()
+            st.dataframe(tabla_al, use_container_width=True, hide_index=True)
+
+        st.divider()
+        st.markdown("**📒 Movimientos de un producto**")
+        if not df_matrix.empty and lista_sucursales:
+            skus = (df_matrix['Producto'] + df_matrix['Variante'].map(lambda v: f" | {v}" if v else "")).tolist()
+            l1, l2 = st.columns([3, 1])
+            sku_sel = l1.selectbox("Producto / Sabor", skus, key="libro_sku")
+            suc_sel = l2.selectbox("Sucursal", lista_sucursales, key="libro_suc")
+            prod_sel, _, var_sel = sku_sel.partition(" | ")
+            st.dataframe(db.obtener_movimientos_stock(prod_sel, var_sel, suc_sel), use_container_width=True, hide_index=True)
+
+        if st.button("🔍 Verificar inventario contra el libro"):
+            df_dif = db.verificar_stock()
+            if df_dif.empty:
+                st.success("El inventario coincide con el libro de movimientos.")
+            else:
+                st.warning(f"{len(df_dif)} producto(s) con stock que no pasó por el sistema (ej. cambios hechos a mano en la base).")
+                st.dataframe(df_dif, use_container_width=True, hide_index=True)
+
 # ... (resto de las secciones igual) ...
 # --- 5. CLIENTES ---
 elif menu == "Clientes":
     st.title("👥 Gestión de Clientes")
-    tab1, tab2, tab3 = st.tabs(["📊 Directorio", "➕ Nuevo", "⚙️ Administrar"])
     
-    with tab1:
-        df_c = db.obtener_clientes_metricas()
-        if not df_c.empty:
-            df_c['total_gastado'] = df_c['total_gastado'].apply(lambda x: f"${x:,.0f}")
-            bsq = st.text_input("Buscar Cliente")
-            if bsq: df_c = df_c[df_c['nombre'].str.contains(bsq, case=False, na=False)]
-            st.dataframe(df_c, use_container_width=True, hide_index=True)
-        else: st.info("Sin clientes.")
+    # Fragmento: crear / renombrar / eliminar vuelve a dibujar solo las pestañas de clientes
+    @st.fragment
+    @medir_fragmento
+    def gestion_clientes():
+        tab1, tab2, tab3 = st.tabs(["📊 Directorio", "➕ Nuevo", "⚙️ Administrar"])
+    
+        with tab1:
+            df_c = datos["clientes_metricas"].copy()
+            if not df_c.empty:
+                df_c['total_gastado'] = df_c['total_gastado'].apply(lambda x: f"${x:,.0f}")
+                bsq = st.text_input("Buscar Cliente")
+                if bsq: df_c = df_c[df_c['nombre'].str.contains(bsq, case=False, na=False)]
+                st.dataframe(df_c, use_container_width=True, hide_index=True)
+            else: st.info("Sin clientes.")
         
-    with tab2:
-        with st.form("new_cl"):
-            cn = st.text_input("Nombre")
-            cl = st.text_input("Ubicación")
-            if st.form_submit_button("Crear"):
-                if cn and db.crear_cliente(cn, cl): st.success("Creado"); time.sleep(1); st.rerun()
+        # Las acciones corren en el callback del botón, antes de que el fragmento se vuelva a dibujar
+        def crear_cliente():
+            if st.session_state.cl_nombre and db.crear_cliente(st.session_state.cl_nombre, st.session_state.cl_ubicacion):
+                st.session_state.aviso_clientes = "Creado"
+
+        def renombrar_cliente(id_c):
+            if db.actualizar_cliente(id_c, st.session_state[f"cl_renombre_{id_c}"], ""): st.session_state.aviso_clientes = "Listo"
+
+        def eliminar_cliente(id_c):
+            if db.eliminar_cliente(id_c): st.session_state.aviso_clientes = "Eliminado"
+
+        if "aviso_clientes" in st.session_state:
+            st.toast(st.session_state.pop("aviso_clientes"), icon="✅")
+
+        with tab2:
+            with st.form("new_cl", clear_on_submit=True):
+                st.text_input("Nombre", key="cl_nombre")
+                st.text_input("Ubicación", key="cl_ubicacion")
+                st.form_submit_button("Crear", on_click=crear_cliente)
                 
-    with tab3:
-        lst = db.obtener_lista_clientes_simple()
-        if lst:
-            n_map = {n: i for i, n in lst}
-            c_edit = st.selectbox("Cliente a editar", sorted(n_map.keys()))
-            id_e = n_map[c_edit]
+        with tab3:
+            lst = datos["clientes"]
+            if lst:
+                n_map = {n: i for i, n in lst}
+                c_edit = st.selectbox("Cliente a editar", sorted(n_map.keys()))
+                id_e = n_map[c_edit]
             
-            c_col1, c_col2 = st.columns([2,1])
-            with c_col1:
-                with st.form("ed_cl"):
-                    ncn = st.text_input("Nuevo Nombre", value=c_edit)
-                    if st.form_submit_button("Renombrar"):
-                        if db.actualizar_cliente(id_e, ncn, ""): st.success("Listo"); time.sleep(1); st.rerun()
-            with c_col2:
-                st.write("Zona de peligro")
-                if st.button("❌ Eliminar Cliente"):
-                    if db.eliminar_cliente(id_e): st.success("Eliminado"); time.sleep(1); st.rerun()
+                c_col1, c_col2 = st.columns([2,1])
+                with c_col1:
+                    with st.form("ed_cl"):
+                        # Una clave por cliente: si no, el campo conserva el nombre del cliente anterior
+                        st.text_input("Nuevo Nombre", value=c_edit, key=f"cl_renombre_{id_e}")
+                        st.form_submit_button("Renombrar", on_click=renombrar_cliente, args=(id_e,))
+                with c_col2:
+                    st.write("Zona de peligro")
+                    st.button("❌ Eliminar Cliente", on_click=eliminar_cliente, args=(id_e,))
+
+    gestion_clientes()
 
 # --- 6. FINANZAS (MEJORADO) ---
 elif menu == "Finanzas":
     st.title("💰 Tablero Financiero")
     
-    tab1, tab2 = st.tabs(["💵 Flujo de Caja (Caja/Banco)", "📦 Valorización de Stock"])
+    tab1, tab2, tab3, tab4 = st.tabs(["💵 Flujo de Caja (Caja/Banco)", "📦 Valorización de Stock", "🧾 Reportes Mensuales", "📈 Análisis"])
     
     # --- TAB 1: CAJA Y BANCO (Lo que ya tenías restaurado) ---
     with tab1:
         st.subheader("Disponibilidad Actual")
-        df_v, df_c, df_s = db.obtener_resumen_finanzas()
+        df_v, df_c = datos["resumen_finanzas"]
+        df_saldos = datos["saldos"]
         
         def get_tot(df, met): 
             val = df.loc[df['metodo_pago'] == met, 'total'] if not df.empty else pd.Series([0])
             return float(val.iloc[0]) if not val.empty else 0.0
 
-        # Totales Históricos
+        def get_saldo(df, cuenta):
+            val = df.loc[df['cuenta'] == cuenta, 'saldo'] if not df.empty else pd.Series([0])
+            return float(val.iloc[0]) if not val.empty else 0.0
+
+        # Ingresos históricos (para el detalle de cada tarjeta)
         ve, vt = get_tot(df_v, 'Efectivo'), get_tot(df_v, 'Transferencia')
-        ce, ct = get_tot(df_c, 'Efectivo'), get_tot(df_c, 'Transferencia')
         
-        # Saldos Iniciales
-        be, bt = 0.0, 0.0
-        if not df_s.empty:
-            re = df_s[df_s['cuenta']=='Efectivo']
-            rt = df_s[df_s['cuenta']=='Transferencia']
-            if not re.empty: be = float(re.iloc[0]['monto'])
-            if not rt.empty: bt = float(rt.iloc[0]['monto'])
-            
-        fin_e = (be + ve - ce)
-        fin_t = (bt + vt - ct)
+        # Saldos: vienen del libro de cuentas, ya actualizados en cada operación
+        fin_e = get_saldo(df_saldos, 'Efectivo')
+        fin_t = get_saldo(df_saldos, 'Transferencia')
         
         # Tarjetas Métricas
         k1, k2, k3 = st.columns(3)
@@ -584,23 +819,26 @@ elif menu == "Finanzas":
         k2.metric("🏦 MERCADO PAGO", f"${fin_t:,.0f}", delta=f"Ingresos: ${vt:,.0f}")
         k3.metric("💰 Total Líquido", f"${(fin_e + fin_t):,.0f}")
         
+        with st.expander("📅 Saldo a una fecha"):
+            dia = st.date_input("Al cierre del día", value=datetime.now().date(), key="fin_dia")
+            df_al = db.obtener_saldos_al(dia)
+            h_e, h_t = get_saldo(df_al, 'Efectivo'), get_saldo(df_al, 'Transferencia')
+            h1, h2, h3 = st.columns(3)
+            h1.metric("💵 Efectivo", f"${h_e:,.0f}")
+            h2.metric("🏦 Mercado Pago", f"${h_t:,.0f}")
+            h3.metric("💰 Total", f"${(h_e + h_t):,.0f}")
+        
         st.divider()
         
-        with st.expander("⚙️ Ajustar Saldos Iniciales"):
-            st.caption("Usa esto si el monto real no coincide con el sistema.")
+        with st.expander("⚙️ Ajustar Saldos"):
+            st.caption("Usa esto si el monto real no coincide con el sistema. La diferencia queda registrada como ajuste.")
             with st.form("calib"):
                 n_e = st.number_input("Efectivo Real en Mano", value=fin_e)
                 n_t = st.number_input("Saldo Real en Banco", value=fin_t)
                 if st.form_submit_button("Guardar Ajuste"):
-                    # Calculamos el saldo inicial necesario para llegar a ese número
-                    # Formula: Saldo_Ini = Real - Ventas + Compras
-                    nuevo_be = n_e - ve + ce
-                    nuevo_bt = n_t - vt + ct
-                    
-                    db.actualizar_saldo_inicial('Efectivo', nuevo_be)
-                    db.actualizar_saldo_inicial('Transferencia', nuevo_bt)
-                    st.success("Saldos recalibrados.")
-                    time.sleep(1)
+                    db.ajustar_saldo_cuenta('Efectivo', n_e)
+                    db.ajustar_saldo_cuenta('Transferencia', n_t)
+                    st.toast("Saldos recalibrados.", icon="✅")
                     st.rerun()
 
     # --- TAB 2: VALORIZACIÓN DE STOCK (NUEVO) ---
@@ -608,11 +846,11 @@ elif menu == "Finanzas":
         st.subheader("Activos en Mercadería")
         
         # Usamos la matriz para calcular todo en tiempo real
-        df_matrix, sucursales = db.obtener_datos_matrix()
+        df_matrix, sucs_matriz = datos["matriz"]
         
-        if not df_matrix.empty and sucursales:
-            # 1. Calcular Stock Total por producto (Suma de sucursales)
-            df_matrix['stock_total'] = df_matrix[sucursales].sum(axis=1)
+        if not df_matrix.empty and sucs_matriz:
+            # 1. Calcular Stock Total por producto (Suma de sucursales); la matriz es compartida: se agrega sobre una copia
+            df_matrix = df_matrix.assign(stock_total=df_matrix[sucs_matriz].sum(axis=1))
             
             # 2. Filtrar solo lo que tiene stock > 0
             df_con_stock = df_matrix[df_matrix['stock_total'] > 0].copy()
@@ -656,4 +894,130 @@ elif menu == "Finanzas":
             else:
                 st.info("No tienes mercadería en stock actualmente.")
         else:
-            st.warning("No hay productos cargados o sucursales configuradas.")
\ No newline at end of file
+            st.warning("No hay productos cargados o sucursales configuradas.")
+
+    # --- TAB 3: REPORTES MENSUALES POR SUCURSAL (PDF) ---
+    with tab3:
+        st.subheader("Reporte mensual de ventas y compras")
+        hoy = datetime.now()
+        r1, r2 = st.columns(2)
+        anio_r = r1.number_input("Año", min_value=2000, max_value=2100, value=hoy.year, step=1)
+        mes_r = r2.selectbox("Mes", list(range(1, 13)), index=hoy.month - 1, format_func=lambda m: reportes_pdf.MESES[m - 1])
+        
+        if st.button("🧾 Generar reportes de todas las sucursales", type="primary"):
+            # Un proceso por núcleo; los que ya estaban generados (mismos datos) salen del disco
+            with st.spinner("Generando..."):
+                st.session_state.reportes_mes = (int(anio_r), mes_r, reportes_pdf.generar_mes(int(anio_r), mes_r, datos["sucursales"]))
+        
+        listos = st.session_state.get("reportes_mes")
+        if listos and not all(os.path.exists(r) for r in listos[2].values()):
+            # limpiar() borró alguno: hay que volver a generarlos
+            st.session_state.pop("reportes_mes"); listos = None
+        if listos and listos[:2] == (int(anio_r), mes_r):
+            for suc, ruta in listos[2].items():
+                with open(ruta, "rb") as f:
+                    st.download_button(f"⬇️ {suc}", f.read(), file_name=f"reporte_{anio_r}-{mes_r:02d}_{suc}.pdf",
+                                       mime="application/pdf", key=f"rep_{suc}", on_click="ignore")
+
+    # --- TAB 4: ANÁLISIS HISTÓRICO (copia Parquet, ver analitica.py) ---
+    with tab4:
+        st.subheader("Análisis del historial")
+        a1, a2 = st.columns([3, 1])
+        if a2.button("🔄 Actualizar datos"):
+            # Incremental: solo lee lo nuevo y lo editado desde el último refresco
+            with st.spinner("Actualizando copia analítica..."):
+                analitica.refrescar()
+        elif analitica.esta_vieja():
+            # st.tabs corre todas las pestañas: abrir Finanzas no puede esperar la copia
+            analitica.refrescar_en_segundo_plano()
+        actualizado = analitica.leer_estado()["actualizado"]
+        estado_copia = f"Datos al {datetime.fromtimestamp(actualizado):%d/%m/%Y %H:%M}" if actualizado else "Sin datos"
+        a1.caption(estado_copia + (" (actualizando en segundo plano...)" if analitica.refrescando() else ""))
+        
+        f1, f2, f3 = st.columns(3)
+        suc_a = f1.selectbox("Sucursal", ["Todas"] + datos["sucursales"], key="an_suc")
+        desde_a = f2.date_input("Desde", value=None, key="an_desde")
+        hasta_a = f3.date_input("Hasta", value=None, key="an_hasta")
+        
+        st.write("📅 **Ventas por mes**")
+        df_mes = analitica.ventas_por_mes(None if suc_a == "Todas" else suc_a, desde_a, hasta_a)
+        if df_mes.empty:
+            st.info("No hay ventas en el período.")
+        else:
+            st.bar_chart(df_mes.pivot_table(index="MES", columns="SUCURSAL", values="INGRESOS", aggfunc="sum"))
+        
+        c1, c2 = st.columns(2)
+        with c1:
+            st.write("🍫 **Sabores más vendidos**")
+            st.dataframe(analitica.sabores_mas_vendidos(15, desde_a, hasta_a), hide_index=True, use_container_width=True,
+                         column_config={"INGRESOS": st.column_config.NumberColumn(format="$%d")})
+        with c2:
+            st.write("💰 **Margen por producto**")
+            st.dataframe(analitica.margen_por_producto(desde_a, hasta_a), hide_index=True, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="$%d") for c in ["INGRESOS", "COSTO", "MARGEN"]})
+
+# --- 7. DIAGNÓSTICO (oculto, ?diagnostico=1) ---
+elif menu == "Diagnóstico":
+    st.title("🩺 Diagnóstico de rendimiento")
+    st.caption(f"Mediciones de database.py desde que arrancó el proceso. Consultas lentas: más de {diagnostico.UMBRAL_LENTO * 1000:.0f} ms (AURUM_LENTO_MS).")
+    
+    # Corridas anteriores de esta sesión (la actual todavía no terminó)
+    historial = [r for r in st.session_state.get("diag_historial", []) if r['fin']]
+    etiqueta = lambda r: f"{r['pagina']} › {r['fragmento']}" if r.get('fragmento') else r['pagina']
+    if historial:
+        ult = historial[-1]
+        st.subheader(f"Última corrida: {etiqueta(ult)}")
+        d1, d2, d3, d4, d5, d6 = st.columns(6)
+        d1.metric("Duración", f"{(ult['fin'] - ult['inicio']) * 1000:,.0f} ms")
+        d2.metric("En database.py", f"{ult['database_ms']:,.0f} ms")
+        d3.metric("SQL (execute+fetch)", f"{ult['sql_ms']:,.0f} ms", delta=f"{ult['sentencias']} sentencias", delta_color="off")
+        d4.metric("Conexiones", ult['conexiones'], delta=f"espera {ult['espera_conexion_ms']:,.1f} ms", delta_color="off")
+        d5.metric("Filas", f"{ult['filas']:,}")
+        carga = sum(ult['datos'].values())
+        d6.metric("Carga de datos", f"{carga:,.0f} ms",
+                  delta=f"presupuesto {ult['presupuesto_ms']:,.0f} ms" if ult['presupuesto_ms'] else None,
+                  delta_color="inverse" if ult['presupuesto_ms'] and carga > ult['presupuesto_ms'] else "off")
+        if ult['funciones']:
+            df_f = pd.DataFrame([(n, c, ms) for n, (c, ms) in ult['funciones'].items()], columns=["Función", "Llamadas", "ms"])
+            st.dataframe(df_f.sort_values("ms", ascending=False), use_container_width=True, hide_index=True)
+        
+        with st.expander("Corridas recientes de esta sesión"):
+            st.dataframe(pd.DataFrame([{
+                "Página": etiqueta(r), "Hora": datetime.fromtimestamp(r['inicio']).strftime("%H:%M:%S"),
+                "Duración ms": round((r['fin'] - r['inicio']) * 1000),
+                "database.py ms": round(r['database_ms']), "SQL ms": round(r['sql_ms']), "Datos ms": round(sum(r['datos'].values())),
+                "Sentencias": r['sentencias'], "Conexiones": r['conexiones'], "Filas": r['filas'],
+            } for r in reversed(historial)]), use_container_width=True, hide_index=True)
+    else:
+        st.info("Todavía no hay corridas medidas en esta sesión: navegá a otra página y volvé.")
+    
+    st.divider()
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["⏱️ Funciones", "🗄️ Sentencias SQL", "🐢 Consultas lentas", "🔌 Conexiones y caché", "📦 Carga por página"])
+    with tab1:
+        st.dataframe(pd.DataFrame(diagnostico.resumen_funciones()).round(2), use_container_width=True, hide_index=True)
+    with tab2:
+        st.dataframe(pd.DataFrame(diagnostico.resumen_sentencias()).round(2), use_container_width=True, hide_index=True)
+    with tab3:
+        lentas = diagnostico.lentas()
+        if lentas: st.dataframe(pd.DataFrame(lentas).round(1), use_container_width=True, hide_index=True)
+        else: st.success("Sin consultas lentas.")
+    with tab4:
+        conx = diagnostico.resumen_conexiones()
+        if conx:
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Préstamos", f"{conx['llamadas']:,}")
+            c2.metric("Espera p50", f"{conx['p50_ms']:.2f} ms")
+            c3.metric("Espera p95", f"{conx['p95_ms']:.2f} ms")
+            c4.metric("Espera máx.", f"{conx['max_ms']:.1f} ms")
+        st.json({"pool": db.obtener_pool().estado(), "cache": cache_db.estadisticas()})
+    with tab5:
+        # Suma de cargas de datos_pagina por corrida, contra el presupuesto de cada página
+        st.dataframe(pd.DataFrame(diagnostico.resumen_paginas()).round(1), use_container_width=True, hide_index=True)
+        st.dataframe(pd.DataFrame(diagnostico.resumen_cargas()).round(2), use_container_width=True, hide_index=True)
+    
+    if st.button("🔄 Reiniciar mediciones"):
+        diagnostico.reiniciar()
+        st.session_state.diag_historial = []
+        st.rerun()
+
+diagnostico.terminar_rerun()
@@ -0,0 +1,506 @@
+"""
+Motor SQLite embebido, detrás de la misma API de database.py.
+
+Para el modo local de una sola sucursal (sin servidor MySQL ni latencia de red) y
+para pruebas / demos. Se activa con la variable de entorno AURUM_SQLITE=<archivo>
+o con una sección [sqlite] ruta = "..." en secrets (tiene prioridad sobre [mysql]).
+
+database.py no cambia sus consultas: la conexión de este módulo recibe el SQL de
+MySQL y lo traduce (una vez por sentencia, queda cacheado):
+  - %s -> ?                                   - NOW() / CURDATE() -> datetime/date locales
+  - INSERT IGNORE -> INSERT OR IGNORE         - ON DUPLICATE KEY UPDATE ... VALUES(c)
+  - a <=> b -> a IS b                           -> ON CONFLICT (clave) DO UPDATE ... excluded.c
+  - ... FOR UPDATE -> (se quita; la transacción ya toma el lock de escritura)
+  - UPDATE t a JOIN (...) x ON ... SET ...    -> UPDATE t AS a SET ... FROM (...) AS x WHERE ...
+                                                 (parámetros numerados: ?1, ?2... en el orden de MySQL)
+  - LIKE %s -> LIKE ? ESCAPE '\\'  (mismo escape que MySQL)
+  - LAST_INSERT_ID(expr): función registrada en la conexión; cursor.lastrowid la devuelve igual que MySQL
+Las fechas se guardan como texto ISO y vuelven como datetime / date (tipos declarados
+DATETIME y DATE), los DECIMAL vuelven como números.
+
+Transacciones: las lecturas sueltas corren sin transacción; la primera escritura
+(o un SELECT ... FOR UPDATE) abre BEGIN IMMEDIATE, así dos escritores se serializan
+(con espera, busy_timeout) en vez de pisarse. La base usa WAL: las lecturas no
+esperan a las escrituras.
+
+El esquema se crea directamente en su versión final (el resultado de todas las
+migraciones de migraciones.py sobre aurum_db.sql); no hay migraciones incrementales.
+"""
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ESPERA_LOCK_MS = 10000
+
+# Clave única que usa cada ON DUPLICATE KEY UPDATE de database.py / migraciones.py
+CLAVES_UNICAS = {
+    "inventario": "producto_id, sucursal_id, variante_id",
+    "resumen_diario": "dia, sucursal_id, producto_id, variante_id, metodo_pago",
+    "productos": "nombre",
+    "variantes": "producto_id, nombre_variante",
+    "cuentas": "nombre",
+}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    costo DECIMAL(10,2) DEFAULT 0,
+    precio DECIMAL(10,2) DEFAULT 0,
+    activo INTEGER DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_productos_activo_nombre ON productos (activo, nombre);
+
+CREATE TABLE IF NOT EXISTS sucursales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL UNIQUE COLLATE NOCASE
+);
+
+CREATE TABLE IF NOT EXISTS variantes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    producto_id INTEGER NOT NULL REFERENCES productos(id) ON DELETE CASCADE,
+    producto_nombre TEXT,
+    nombre_variante TEXT COLLATE NOCASE,
+    UNIQUE (producto_id, nombre_variante)
+);
+
+CREATE TABLE IF NOT EXISTS inventario (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    producto_id INTEGER NOT NULL,
+    sucursal_id INTEGER NOT NULL,
+    variante_id INTEGER NOT NULL DEFAULT 0,
+    cantidad INTEGER DEFAULT 0,
+    UNIQUE (producto_id, sucursal_id, variante_id)
+);
+
+CREATE TABLE IF NOT EXISTS clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    ubicacion TEXT,
+    fecha_alta DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha DATETIME,
+    producto TEXT,
+    variante TEXT DEFAULT '',
+    cantidad INTEGER,
+    precio_unitario DECIMAL(10,2),
+    total DECIMAL(10,2),
+    metodo_pago TEXT,
+    ubicacion TEXT,
+    notas TEXT,
+    cliente_id INTEGER REFERENCES clientes(id),
+    producto_id INTEGER,
+    variante_id INTEGER NOT NULL DEFAULT 0,
+    sucursal_id INTEGER,
+    carrito_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_carrito ON ventas (carrito_id);
+CREATE INDEX IF NOT EXISTS idx_ventas_sucursal_fecha ON ventas (sucursal_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_sku_fecha ON ventas (producto_id, variante_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_cliente_total ON ventas (cliente_id, total);
+CREATE INDEX IF NOT EXISTS idx_ventas_metodo_total ON ventas (metodo_pago, total);
+
+CREATE TABLE IF NOT EXISTS compras (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha DATETIME,
+    producto TEXT,
+    variante TEXT DEFAULT '',
+    cantidad INTEGER,
+    costo_total DECIMAL(10,2),
+    envio DECIMAL(10,2) DEFAULT 0,
+    metodo_pago TEXT,
+    proveedor TEXT,
+    ubicacion TEXT,
+    notas TEXT,
+    producto_id INTEGER,
+    variante_id INTEGER NOT NULL DEFAULT 0,
+    sucursal_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_compras_fecha ON compras (fecha);
+CREATE INDEX IF NOT EXISTS idx_compras_sucursal_fecha ON compras (sucursal_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_compras_sku_fecha ON compras (producto_id, variante_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_compras_metodo_costo ON compras (metodo_pago, costo_total);
+
+CREATE TABLE IF NOT EXISTS saldos_iniciales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cuenta TEXT UNIQUE,
+    monto DECIMAL(10,2) DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    dia DATE NOT NULL,
+    sucursal_id INTEGER NOT NULL DEFAULT 0,
+    producto_id INTEGER NOT NULL DEFAULT 0,
+    variante_id INTEGER NOT NULL DEFAULT 0,
+    metodo_pago TEXT NOT NULL DEFAULT '',
+    unidades_vendidas INTEGER NOT NULL DEFAULT 0,
+    ingresos DECIMAL(14,2) NOT NULL DEFAULT 0,
+    ventas INTEGER NOT NULL DEFAULT 0,
+    unidades_compradas INTEGER NOT NULL DEFAULT 0,
+    costo DECIMAL(14,2) NOT NULL DEFAULT 0,
+    compras INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, sucursal_id, producto_id, variante_id, metodo_pago)
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_metodo ON resumen_diario (metodo_pago, ventas, ingresos, compras, costo);
+
+CREATE TABLE IF NOT EXISTS cuentas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    saldo DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS movimientos_cuenta (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cuenta_id INTEGER NOT NULL REFERENCES cuentas(id),
+    fecha DATETIME NOT NULL,
+    monto DECIMAL(14,2) NOT NULL,
+    saldo DECIMAL(14,2) NOT NULL,
+    origen TEXT NOT NULL,
+    referencia_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_movcuenta_fecha ON movimientos_cuenta (cuenta_id, fecha, id);
+
+CREATE TABLE IF NOT EXISTS cambios_historial (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabla TEXT NOT NULL,
+    fila_id INTEGER NOT NULL,
+    fecha DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_cambios_tabla ON cambios_historial (tabla, id);
+
+CREATE TABLE IF NOT EXISTS operaciones_aplicadas (
+    uid TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    aplicada DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS movimientos_stock (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha DATETIME NOT NULL,
+    producto_id INTEGER NOT NULL,
+    sucursal_id INTEGER NOT NULL,
+    variante_id INTEGER NOT NULL DEFAULT 0,
+    delta INTEGER NOT NULL,
+    origen TEXT NOT NULL,
+    referencia_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_movstock_sku ON movimientos_stock (producto_id, sucursal_id, variante_id, id);
+CREATE INDEX IF NOT EXISTS idx_movstock_fecha ON movimientos_stock (fecha);
+
+CREATE TABLE IF NOT EXISTS instantaneas_stock (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha DATETIME NOT NULL,
+    hasta_movimiento INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_instantaneas_fecha ON instantaneas_stock (fecha);
+
+CREATE TABLE IF NOT EXISTS instantaneas_stock_filas (
+    instantanea_id INTEGER NOT NULL,
+    producto_id INTEGER NOT NULL,
+    sucursal_id INTEGER NOT NULL,
+    variante_id INTEGER NOT NULL DEFAULT 0,
+    cantidad INTEGER NOT NULL,
+    PRIMARY KEY (instantanea_id, producto_id, sucursal_id, variante_id)
+);
+
+-- Búsqueda de texto (en MySQL: índices FULLTEXT de la migración 012). Tablas FTS5 que
+-- indexan ventas / compras / clientes sin copiar el texto; los triggers las mantienen al día.
+CREATE VIRTUAL TABLE IF NOT EXISTS ventas_fts USING fts5(producto, variante, notas, content='ventas', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS ventas_fts_alta AFTER INSERT ON ventas BEGIN
+    INSERT INTO ventas_fts (rowid, producto, variante, notas) VALUES (new.id, new.producto, new.variante, new.notas);
+END;
+CREATE TRIGGER IF NOT EXISTS ventas_fts_baja AFTER DELETE ON ventas BEGIN
+    INSERT INTO ventas_fts (ventas_fts, rowid, producto, variante, notas) VALUES ('delete', old.id, old.producto, old.variante, old.notas);
+END;
+CREATE TRIGGER IF NOT EXISTS ventas_fts_cambio AFTER UPDATE OF producto, variante, notas ON ventas BEGIN
+    INSERT INTO ventas_fts (ventas_fts, rowid, producto, variante, notas) VALUES ('delete', old.id, old.producto, old.variante, old.notas);
+    INSERT INTO ventas_fts (rowid, producto, variante, notas) VALUES (new.id, new.producto, new.variante, new.notas);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS compras_fts USING fts5(producto, variante, proveedor, notas, content='compras', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS compras_fts_alta AFTER INSERT ON compras BEGIN
+    INSERT INTO compras_fts (rowid, producto, variante, proveedor, notas) VALUES (new.id, new.producto, new.variante, new.proveedor, new.notas);
+END;
+CREATE TRIGGER IF NOT EXISTS compras_fts_baja AFTER DELETE ON compras BEGIN
+    INSERT INTO compras_fts (compras_fts, rowid, producto, variante, proveedor, notas) VALUES ('delete', old.id, old.producto, old.variante, old.proveedor, old.notas);
+END;
+CREATE TRIGGER IF NOT EXISTS compras_fts_cambio AFTER UPDATE OF producto, variante, proveedor, notas ON compras BEGIN
+    INSERT INTO compras_fts (compras_fts, rowid, producto, variante, proveedor, notas) VALUES ('delete', old.id, old.producto, old.variante, old.proveedor, old.notas);
+    INSERT INTO compras_fts (rowid, producto, variante, proveedor, notas) VALUES (new.id, new.producto, new.variante, new.proveedor, new.notas);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(nombre, content='clientes', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS clientes_fts_alta AFTER INSERT ON clientes BEGIN
+    INSERT INTO clientes_fts (rowid, nombre) VALUES (new.id, new.nombre);
+END;
+CREATE TRIGGER IF NOT EXISTS clientes_fts_baja AFTER DELETE ON clientes BEGIN
+    INSERT INTO clientes_fts (clientes_fts, rowid, nombre) VALUES ('delete', old.id, old.nombre);
+END;
+CREATE TRIGGER IF NOT EXISTS clientes_fts_cambio AFTER UPDATE OF nombre ON clientes BEGIN
+    INSERT INTO clientes_fts (clientes_fts, rowid, nombre) VALUES ('delete', old.id, old.nombre);
+    INSERT INTO clientes_fts (rowid, nombre) VALUES (new.id, new.nombre);
+END;
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    aplicada_en DATETIME NOT NULL
+);
+
+INSERT OR IGNORE INTO saldos_iniciales (cuenta, monto) VALUES ('Efectivo', 0), ('Transferencia', 0);
+INSERT OR IGNORE INTO cuentas (nombre) VALUES ('Efectivo'), ('Transferencia');
+INSERT OR IGNORE INTO clientes (nombre, ubicacion) VALUES ('Consumidor Final', 'General');
+"""
+
+# --- TIPOS ---
+# Parámetros: lo que mysql.connector acepta y sqlite3 no
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(pd.Timestamp, lambda d: d.to_pydatetime().isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+# Resultados: columnas declaradas DATETIME / DATE vuelven como en MySQL
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()[:10]))
+
+
+# --- TRADUCCIÓN DE SQL ---
+RE_ODKU = re.compile(r"\s+ON\s+DUPLICATE\s+KEY\s+UPDATE\s+(.*)$", re.S | re.I)
+RE_INSERT_TABLA = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+(\w+)", re.I)
+RE_UPDATE_JOIN = re.compile(
+    r"^\s*UPDATE\s+(\w+)\s+(\w+)\s+JOIN\s+(.*)\s+(\w+)\s+ON\s+(.*?)\s+SET\s+(.*?)\s+WHERE\s+(.*?)\s*$", re.S | re.I)
+
+
+def _update_join(m):
+    tabla, alias, fuente, alias_fuente, on, asignaciones, where = m.groups()
+    # En SQLite el SET va antes del FROM: los parámetros se numeran (?1, ?2...) en el orden
+    # de MySQL (fuente, ON, SET, WHERE), así siguen tomando su valor aunque cambien de lugar
+    numeros = iter(range(1, m.group(0).count("%s") + 1))
+    fuente, on, asignaciones, where = (re.sub("%s", lambda _: f"?{next(numeros)}", parte)
+                                       for parte in (fuente, on, asignaciones, where))
+    # En SQLite la columna asignada no lleva alias
+    asignaciones = ", ".join(re.sub(rf"^\s*{alias}\.", "", a) for a in asignaciones.split(","))
+    return f"UPDATE {tabla} AS {alias} SET {asignaciones} FROM {fuente} AS {alias_fuente} WHERE ({on}) AND ({where})"
+
+
+@lru_cache(maxsize=1024)
+def traducir(sql):
+    """SQL de MySQL (como lo escribe database.py) -> SQL de SQLite."""
+    if re.fullmatch(r"\s*SELECT\s+NOW\(\)\s*", sql, re.I):
+        # Alias con tipo: sqlite3 lo convierte a datetime como haría MySQL
+        return "SELECT datetime('now', 'localtime') AS \"ahora [DATETIME]\""
+    sql = re.sub(r"\bNOW\(\)", "datetime('now', 'localtime')", sql, flags=re.I)
+    sql = re.sub(r"\bCURDATE\(\)", "date('now', 'localtime')", sql, flags=re.I)
+    sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.I)
+    m = RE_ODKU.search(sql)
+    if m:
+        tabla = RE_INSERT_TABLA.match(sql).group(1)
+        asignaciones = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", m.group(1), flags=re.I)
+        sql = sql[:m.start()] + f" ON CONFLICT ({CLAVES_UNICAS[tabla]}) DO UPDATE SET {asignaciones}"
+    sql = RE_UPDATE_JOIN.sub(_update_join, sql)
+    sql = re.sub(r"\s+FOR\s+UPDATE\s*$", "", sql, flags=re.I)
+    sql = sql.replace("<=>", " IS ")
+    sql = re.sub(r"\bLIKE\s+(%s|\?\d+)", "LIKE \\1 ESCAPE '\\\\'", sql, flags=re.I)
+    return sql.replace("%s", "?")
+
+
+def _es_lectura(sql):
+    return re.match(r"\s*(SELECT|WITH)\b", sql, re.I) is not None and not re.search(r"\bFOR\s+UPDATE\s*$", sql, re.I)
+
+
+# --- CONEXIÓN ---
+class CursorSqlite:
+    """Cursor con la interfaz que usa database.py de mysql.connector (incluye dictionary=True)."""
+
+    def __init__(self, conexion, diccionario=False):
+        self._conexion = conexion
+        self._cursor = conexion._cnx.cursor()
+        self._diccionario = diccionario
+        self._lastrowid = None
+
+    def _preparar(self, sql):
+        if not _es_lectura(sql) and not self._conexion.in_transaction:
+            self._conexion._cnx.execute("BEGIN IMMEDIATE")
+        self._conexion._ultimo_id = None
+        return traducir(sql)
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._preparar(sql), tuple(params or ()))
+        self._lastrowid = self._cursor.lastrowid
+        return None
+
+    def executemany(self, sql, filas):
+        filas = [tuple(f) for f in filas]
+        self._cursor.executemany(self._preparar(sql), filas)
+        if re.match(r"\s*INSERT\b", sql, re.I) and self._cursor.rowcount > 0:
+            # Como en MySQL: el id de la PRIMERA fila del lote (los ids son consecutivos dentro de la transacción)
+            ultimo = self._conexion._cnx.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._lastrowid = ultimo - self._cursor.rowcount + 1
+        return None
+
+    @property
+    def lastrowid(self):
+        # UPDATE ... SET x = LAST_INSERT_ID(expr): el valor queda como lastrowid, igual que en MySQL
+        if self._conexion._ultimo_id is not None:
+            return self._conexion._ultimo_id
+        return self._lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _fila(self, fila):
+        if fila is None or not self._diccionario:
+            return fila
+        return dict(zip([c[0] for c in self._cursor.description], fila))
+
+    def fetchone(self):
+        return self._fila(self._cursor.fetchone())
+
+    def fetchmany(self, tamano=1):
+        return [self._fila(f) for f in self._cursor.fetchmany(tamano)]
+
+    def fetchall(self):
+        return [self._fila(f) for f in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSqlite:
+    """Conexión prestada por PoolSqlite: close() la devuelve al pool."""
+
+    unread_result = False
+
+    def __init__(self, pool, cnx):
+        self._pool = pool
+        self._cnx = cnx
+        self._devuelta = False
+        self._ultimo_id = None
+
+    def cursor(self, dictionary=False, buffered=None):
+        return CursorSqlite(self, dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._cnx.in_transaction
+
+    def commit(self):
+        self._cnx.commit()
+
+    def rollback(self):
+        self._cnx.rollback()
+
+    def executescript(self, script):
+        self._cnx.executescript(script)
+
+    def is_connected(self):
+        return not self._devuelta
+
+    def close(self):
+        if not self._devuelta:
+            self._devuelta = True
+            self._pool._devolver(self._cnx)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PoolSqlite:
+    """
+    Mismo contrato que PoolConexiones (obtener / estado / cerrar_todo) sobre un archivo SQLite.
+    Las conexiones abiertas se reutilizan (abrir una y configurar los PRAGMA no es gratis).
+    `ruta` admite URIs: "file:prueba?mode=memory&cache=shared" es una base en memoria compartida.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._libres = []
+        self._lock = threading.Lock()
+
+    def _abrir(self):
+        cnx = sqlite3.connect(self.ruta, uri=True, isolation_level=None, check_same_thread=False,
+                              timeout=ESPERA_LOCK_MS / 1000,
+                              detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        cnx.execute("PRAGMA journal_mode = WAL")
+        cnx.execute("PRAGMA synchronous = NORMAL")
+        cnx.execute("PRAGMA foreign_keys = ON")
+        cnx.execute(f"PRAGMA busy_timeout = {ESPERA_LOCK_MS}")
+        return cnx
+
+    def obtener(self):
+        with self._lock:
+            cnx = self._libres.pop() if self._libres else None
+        if cnx is None:
+            cnx = self._abrir()
+        conexion = ConexionSqlite(self, cnx)
+        cnx.create_function("LAST_INSERT_ID", 1, lambda valor: setattr(conexion, "_ultimo_id", valor) or valor)
+        return conexion
+
+    def _devolver(self, cnx):
+        try:
+            # Igual que con MySQL: nunca devolver una conexión con una transacción abierta
+            if cnx.in_transaction:
+                cnx.rollback()
+            with self._lock:
+                self._libres.append(cnx)
+        except Exception:
+            cnx.close()
+
+    def cerrar_todo(self):
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for cnx in libres:
+            cnx.close()
+
+    def estado(self):
+        with self._lock:
+            return {"motor": "sqlite", "ruta": self.ruta, "libres": len(self._libres)}
+
+
+def crear_esquema(conn):
+    """Crea las tablas en su versión final (idempotente) y marca todas las migraciones como aplicadas."""
+    import migraciones
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('ventas', 'ventas_fts', 'movimientos_stock')")
+    tablas_previas = {fila[0] for fila in cursor.fetchall()}
+    if "ventas" in tablas_previas:
+        # Columnas agregadas después de crear la tabla (antes del script: sus índices las usan)
+        cursor.execute("SELECT name FROM pragma_table_info('ventas')")
+        if "carrito_id" not in {fila[0] for fila in cursor.fetchall()}:
+            conn.executescript("ALTER TABLE ventas ADD COLUMN carrito_id INTEGER;")
+    conn.executescript(ESQUEMA)
+    if "ventas" in tablas_previas and "ventas_fts" not in tablas_previas:
+        # Base de antes de la búsqueda de texto: indexar el historial que ya tenía
+        conn.executescript("INSERT INTO ventas_fts (ventas_fts) VALUES ('rebuild');"
+                           "INSERT INTO compras_fts (compras_fts) VALUES ('rebuild');"
+                           "INSERT INTO clientes_fts (clientes_fts) VALUES ('rebuild');")
+    if "ventas" in tablas_previas and "movimientos_stock" not in tablas_previas:
+        # Base de antes del libro de stock: abrirlo con el stock que ya tenía
+        migraciones.abrir_movimientos_stock(cursor)
+    cursor.executemany(
+        "INSERT IGNORE INTO schema_version (version, nombre, aplicada_en) VALUES (%s, %s, %s)",
+        [(version, nombre, datetime.now()) for version, nombre, _ in migraciones.MIGRACIONES],
+    )
+    conn.commit()
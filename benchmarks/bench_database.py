@@ -0,0 +1,276 @@
+"""
+Benchmark de las funciones públicas de database.py contra la base sintética.
+
+Mide cada lectura en frío (caché en memoria vacía: va a la base) y en caliente
+(servida por cache_db, si la función está cacheada), y cada escritura seguida de
+su reversión (registrar + eliminar, editar + volver al valor original), así la
+base queda igual después de cada corrida. Escribe el resultado en JSON:
+min / p50 / p95 / promedio en milisegundos por caso, más los volúmenes de la base
+y la revisión de git, para comparar una versión contra otra.
+
+Correr SOLO contra la base de benchmarks (ver generar_datos.py).
+
+Uso:
+    python benchmarks/generar_datos.py
+    python benchmarks/bench_database.py                                  # -> benchmarks/resultados/<fecha>.json
+    python benchmarks/bench_database.py --repeticiones 20 --salida nuevo.json
+    python benchmarks/bench_database.py --comparar base.json --umbral 1.25   # exit 1 si algo empeoró más de 25%
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+TABLAS = ["productos", "variantes", "sucursales", "clientes", "inventario", "ventas", "compras",
+          "resumen_diario", "movimientos_cuenta"]
+
+
+def medir(funcion, repeticiones, antes=None, despues=None):
+    """Corre `funcion` n veces; `antes`/`despues` (sin medir) preparan o revierten cada corrida."""
+    tiempos = []
+    for _ in range(repeticiones):
+        contexto = antes() if antes else None
+        t0 = time.perf_counter()
+        resultado = funcion(contexto) if antes else funcion()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        if despues:
+            despues(contexto, resultado)
+    t = np.array(tiempos)
+    return {"n": len(t), "min_ms": round(float(t.min()), 3), "p50_ms": round(float(np.percentile(t, 50)), 3),
+            "p95_ms": round(float(np.percentile(t, 95)), 3), "promedio_ms": round(float(t.mean()), 3)}
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _volumenes(db):
+    conn = db.get_db_connection(); cursor = conn.cursor()
+    try:
+        volumenes = {}
+        for t in TABLAS:
+            cursor.execute(f"SELECT COUNT(*) FROM {t}")
+            volumenes[t] = cursor.fetchone()[0]
+        return volumenes
+    finally:
+        conn.close()
+
+
+def _ultimo_id(db, tabla):
+    conn = db.get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT MAX(id) FROM {tabla}")
+        return cursor.fetchone()[0] or 0
+    finally:
+        conn.close()
+
+
+def casos_lectura(db):
+    """(nombre, función, cacheada). Los argumentos salen de datos reales de la base."""
+    import cache_db
+    cache_db.limpiar()
+    _, sucursales = db.obtener_datos_globales()
+    indice = db.obtener_indice_catalogo()
+    if not sucursales or not len(indice):
+        raise SystemExit("La base está vacía: correr primero benchmarks/generar_datos.py")
+    suc = sucursales[0]
+    # Un SKU con variante, para las lecturas por producto
+    etiqueta = next((e for e in indice.etiquetas if indice.datos[e]["variante"]), indice.etiquetas[0])
+    prod, var = indice.datos[etiqueta]["base"], indice.datos[etiqueta]["variante"]
+    palabra = prod.split()[0]
+    id_venta = _ultimo_id(db, "ventas")
+    hoy = date.today()
+    mes_pasado = (hoy.year - (hoy.month == 1), (hoy.month - 2) % 12 + 1)
+    _, siguiente = db.obtener_movimientos("Ventas")
+
+    return [
+        ("obtener_datos_globales", db.obtener_datos_globales, True),
+        ("obtener_datos_matrix", db.obtener_datos_matrix, True),
+        ("obtener_listas_auxiliares", db.obtener_listas_auxiliares, True),
+        ("obtener_catalogo_venta", db.obtener_catalogo_venta, False),
+        ("obtener_indice_catalogo", db.obtener_indice_catalogo, True),
+        ("indice.buscar (prefijo)", lambda: db.obtener_indice_catalogo().buscar(palabra[:4]), True),
+        ("indice.buscar (tipeo)", lambda: db.obtener_indice_catalogo().buscar(palabra[:-1] + "x"), True),
+        ("obtener_variantes_de_producto", lambda: db.obtener_variantes_de_producto(prod), False),
+        ("obtener_stock_actual", lambda: db.obtener_stock_actual(prod, suc, var), True),
+        ("obtener_movimientos ventas (1a página)", lambda: db.obtener_movimientos("Ventas"), False),
+        ("obtener_movimientos ventas (2a página)", lambda: db.obtener_movimientos("Ventas", despues_de=siguiente), False),
+        ("obtener_movimientos ventas (sucursal+producto)", lambda: db.obtener_movimientos("Ventas", suc, palabra), False),
+        ("obtener_movimientos compras (rango de fechas)",
+         lambda: db.obtener_movimientos("Compras", desde=date(*mes_pasado, 1), hasta=hoy), False),
+        ("obtener_clientes_metricas", db.obtener_clientes_metricas, False),
+        ("obtener_lista_clientes_simple", db.obtener_lista_clientes_simple, False),
+        ("obtener_resumen_finanzas", db.obtener_resumen_finanzas, False),
+        ("obtener_saldos_cuentas", db.obtener_saldos_cuentas, True),
+        ("obtener_saldos_al", lambda: db.obtener_saldos_al(date(*mes_pasado, 1)), True),
+        ("obtener_venta_por_id", lambda: db.obtener_venta_por_id(id_venta), False),
+        ("obtener_datos_comprobante", lambda: db.obtener_datos_comprobante(id_venta), False),
+        ("obtener_datos_reporte_mensual", lambda: db.obtener_datos_reporte_mensual(suc, *mes_pasado), False),
+    ], (suc, prod, var)
+
+
+def correr_lecturas(db, repeticiones):
+    import cache_db
+    casos, sku = casos_lectura(db)
+    resultados = {}
+    for nombre, funcion, cacheada in casos:
+        resultados[f"{nombre} [frío]"] = medir(lambda _: funcion(), repeticiones, antes=cache_db.limpiar)
+        if cacheada:
+            funcion()
+            resultados[f"{nombre} [caliente]"] = medir(funcion, repeticiones)
+        print(f"  {nombre}")
+    return resultados, sku
+
+
+def correr_historial(db):
+    """Recorrido completo del historial (exportaciones): filas por segundo."""
+    resultados = {}
+    for tipo in ("Ventas", "Compras"):
+        t0, filas = time.perf_counter(), 0
+        for df in db.iterar_movimientos(tipo):
+            filas += len(df)
+        seg = time.perf_counter() - t0
+        resultados[f"iterar_movimientos {tipo.lower()}"] = {"filas": filas, "total_ms": round(seg * 1000, 1),
+                                                             "filas_por_seg": round(filas / seg) if seg else None}
+        print(f"  iterar_movimientos {tipo.lower()}: {filas:,} filas")
+    return resultados
+
+
+def correr_escrituras(db, repeticiones, sku):
+    suc, prod, var = sku
+    # Stock de sobra para que ninguna venta falle por faltante
+    con_stock, sucursales, sin_cambios = _matriz_con_stock(db, [(prod, var, suc, 10 ** 6)])
+    db.guardar_cambios_masivos(con_stock, sucursales, sin_cambios)
+    linea = {"producto": prod, "variante": var, "cantidad": 1, "precio": 100}
+    resultados = {}
+
+    def venta_nueva(*_):
+        return _ultimo_id(db, "ventas")
+
+    def borrar_ventas_nuevas(desde, _):
+        # Un carrito deja una fila por línea: se eliminan todas las posteriores a `desde`
+        for id_v in range(desde + 1, venta_nueva() + 1):
+            db.eliminar_venta(id_v)
+
+    resultados["registrar_venta (+ eliminar_venta)"] = medir(
+        lambda _: db.registrar_venta(prod, var, 1, 100, "Efectivo", suc, "bench", None), repeticiones,
+        antes=venta_nueva, despues=borrar_ventas_nuevas)
+    resultados["registrar_venta_carrito x3 líneas"] = medir(
+        lambda _: db.registrar_venta_carrito([linea] * 3, "Transferencia", suc, "bench", None), repeticiones,
+        antes=venta_nueva, despues=borrar_ventas_nuevas)
+
+    db.registrar_venta(prod, var, 1, 100, "Efectivo", suc, "bench", None)
+    id_v = venta_nueva()
+    resultados["eliminar_venta"] = medir(
+        lambda v: db.eliminar_venta(v), repeticiones,
+        antes=lambda: (db.registrar_venta(prod, var, 1, 100, "Efectivo", suc, "bench", None), venta_nueva())[1])
+    resultados["actualizar_venta"] = medir(
+        lambda: db.actualizar_venta(id_v, 2, 100, "Transferencia", "bench"), repeticiones,
+        despues=lambda *_: db.actualizar_venta(id_v, 1, 100, "Efectivo", "bench"))
+    db.eliminar_venta(id_v)
+
+    resultados["registrar_compra (+ eliminar_compra)"] = medir(
+        lambda: db.registrar_compra(prod, var, 5, 500, "bench", "Efectivo", suc, "bench"), repeticiones,
+        despues=lambda *_: db.eliminar_compra(_ultimo_id(db, "compras")))
+
+    # Editor de stock: 100 celdas cambiadas por guardado (y vuelta atrás)
+    df, sucursales = db.obtener_datos_matrix()
+    original = df.copy()
+    editado = df.copy()
+    filas = editado.index[:100]
+    editado.loc[filas, sucursales[0]] = editado.loc[filas, sucursales[0]] + 1
+    resultados["guardar_cambios_masivos (100 celdas)"] = medir(
+        lambda: db.guardar_cambios_masivos(editado, sucursales, original), repeticiones,
+        despues=lambda *_: db.guardar_cambios_masivos(original, sucursales, editado))
+    db.guardar_cambios_masivos(sin_cambios, sucursales, con_stock)
+    print("  escrituras")
+    return resultados
+
+
+def _matriz_con_stock(db, cambios):
+    """(df_nuevo, sucursales, df_original) para fijar el stock de algunos SKUs con guardar_cambios_masivos."""
+    df, sucursales = db.obtener_datos_matrix()
+    nuevo = df.copy()
+    for prod, var, suc, cant in cambios:
+        nuevo.loc[(nuevo["Producto"] == prod) & (nuevo["Variante"] == var), suc] = cant
+    return nuevo, sucursales, df
+
+
+def comparar(actual, base, umbral):
+    """Imprime la relación actual/base por caso (p50). Devuelve los casos que empeoraron más que `umbral`."""
+    peores = []
+    print(f"\n{'caso':60} {'base p50':>10} {'actual p50':>11} {'x':>6}")
+    for nombre, r in actual["casos"].items():
+        b = base.get("casos", {}).get(nombre)
+        if not b or "p50_ms" not in r or not b.get("p50_ms"):
+            continue
+        relacion = r["p50_ms"] / b["p50_ms"]
+        marca = "  <-- más lento" if relacion > umbral else ""
+        print(f"{nombre:60} {b['p50_ms']:10.2f} {r['p50_ms']:11.2f} {relacion:6.2f}{marca}")
+        if relacion > umbral:
+            peores.append(nombre)
+    return peores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base", default=os.environ.get("AURUM_DB", "aurum_bench"))
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto benchmarks/resultados/<fecha>.json)")
+    parser.add_argument("--sin-escrituras", action="store_true", help="solo lecturas (no modifica la base)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior contra el cual comparar")
+    parser.add_argument("--umbral", type=float, default=1.25, help="relación actual/base a partir de la cual se marca una regresión")
+    args = parser.parse_args()
+
+    os.environ["AURUM_DB"] = args.base
+    import database as db
+    db.inicializar_db()
+
+    print(f"Benchmark sobre {args.base} ({args.repeticiones} repeticiones)...")
+    casos, sku = correr_lecturas(db, args.repeticiones)
+    casos.update(correr_historial(db))
+    if not args.sin_escrituras:
+        casos.update(correr_escrituras(db, args.repeticiones, sku))
+
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "revision": _revision(),
+        "base": args.base,
+        "repeticiones": args.repeticiones,
+        "python": platform.python_version(),
+        "volumenes": _volumenes(db),
+        "casos": casos,
+    }
+    salida = args.salida
+    if not salida:
+        os.makedirs(CARPETA_RESULTADOS, exist_ok=True)
+        salida = os.path.join(CARPETA_RESULTADOS, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"✅ Resultados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            peores = comparar(resultado, json.load(f), args.umbral)
+        if peores:
+            print(f"\n❌ {len(peores)} casos más lentos que x{args.umbral}: {', '.join(peores)}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark de construir_matriz() (editor de Stock).
+
+Genera datos sintéticos en memoria (no necesita base de datos), verifica que el
+resultado sea idéntico al armado fila por fila de la versión anterior, y mide el
+tiempo con el volumen objetivo: 20.000 SKUs x 50 sucursales.
+
+Uso:
+    python benchmarks/bench_matriz.py
+    python benchmarks/bench_matriz.py --productos 4000 --variantes 5 --sucursales 50
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import construir_matriz
+
+
+def datos_sinteticos(n_productos, n_variantes, n_sucursales, densidad=0.9, semilla=0):
+    rng = np.random.default_rng(semilla)
+    nombres = [f"PRODUCTO {i:05d}" for i in range(n_productos)]
+    df_base = pd.DataFrame({
+        'nombre': nombres,
+        'costo': [Decimal(int(c)) for c in rng.integers(1000, 50000, n_productos)],
+        'precio': [Decimal(int(p)) for p in rng.integers(1000, 80000, n_productos)],
+    })
+    # Un 10% de productos sin variantes, el resto con n_variantes sabores
+    con_vars = [n for i, n in enumerate(nombres) if i % 10]
+    df_vars = pd.DataFrame(
+        [(n, f"SABOR {j}") for n in con_vars for j in range(n_variantes)],
+        columns=['producto_nombre', 'nombre_variante'],
+    )
+    sucursales = [f"Sucursal {k:02d}" for k in range(n_sucursales)]
+
+    skus = [(n, '') for i, n in enumerate(nombres) if not i % 10] + list(df_vars.itertuples(index=False, name=None))
+    filas = [(p, v, s) for p, v in skus for s in sucursales]
+    elegidas = rng.random(len(filas)) < densidad
+    df_stock = pd.DataFrame([f for f, e in zip(filas, elegidas) if e], columns=['producto_nombre', 'variante', 'sucursal_nombre'])
+    df_stock['cantidad'] = rng.integers(0, 40, len(df_stock))
+    return df_base, df_vars, df_stock, sucursales
+
+
+def construir_matriz_por_filas(df_base, df_vars, df_stock, sucursales):
+    """Implementación anterior (iterrows + apply), solo como referencia de resultado."""
+    lista_skus = []
+    for _, prod in df_base.iterrows():
+        nombre = prod['nombre']
+        variantes_prod = df_vars[df_vars['producto_nombre'] == nombre]['nombre_variante'].tolist()
+        if not variantes_prod:
+            lista_skus.append({'Producto': nombre, 'Variante': '', 'Costo': prod['costo'], 'Precio': prod['precio']})
+        else:
+            for v in variantes_prod:
+                lista_skus.append({'Producto': nombre, 'Variante': v, 'Costo': prod['costo'], 'Precio': prod['precio']})
+    df_matrix = pd.DataFrame(lista_skus)
+    if not df_stock.empty and not df_matrix.empty:
+        df_stock = df_stock.copy()
+        df_stock['variante'] = df_stock['variante'].fillna('')
+        for suc in sucursales:
+            stock_suc = df_stock[df_stock['sucursal_nombre'] == suc]
+            stock_map = stock_suc.set_index(['producto_nombre', 'variante'])['cantidad'].to_dict()
+            df_matrix[f"{suc}"] = df_matrix.apply(lambda row: stock_map.get((row['Producto'], row['Variante']), 0), axis=1)
+    return df_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=4400)
+    parser.add_argument("--variantes", type=int, default=5)
+    parser.add_argument("--sucursales", type=int, default=50)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    # 1. Mismo resultado que la versión fila por fila (con un volumen chico)
+    chico = datos_sinteticos(200, 3, 6)
+    esperado = construir_matriz_por_filas(*chico)
+    obtenido = construir_matriz(*chico)
+    pd.testing.assert_frame_equal(obtenido, esperado)
+    print("✅ Resultado idéntico a la versión anterior.")
+
+    # 2. Tiempo con el volumen objetivo
+    datos = datos_sinteticos(args.productos, args.variantes, args.sucursales)
+    tiempos = []
+    for _ in range(args.repeticiones):
+        t0 = time.perf_counter()
+        df = construir_matriz(*datos)
+        tiempos.append(time.perf_counter() - t0)
+    print(f"SKUs: {len(df):,} | Sucursales: {args.sucursales} | Registros de stock: {len(datos[2]):,}")
+    print(f"⏱️ construir_matriz: mejor {min(tiempos):.3f}s | mediana {sorted(tiempos)[len(tiempos) // 2]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Prueba de concurrencia del descuento de stock (registrar_venta_carrito).
+
+Varios hilos venden a la vez el mismo SKU en la misma sucursal hasta agotarlo,
+con carritos de una línea (sentencia condicionada + LAST_INSERT_ID) y de dos
+líneas (UPDATE con JOIN condicionado). Verifica que:
+  - el stock nunca queda negativo,
+  - se venden exactamente las unidades que había (ni una más),
+  - las unidades de las ventas registradas coinciden con lo descontado.
+
+Necesita una base MySQL (la misma configuración que la app). Crea un producto
+temporal con dos variantes y lo borra al terminar; las ventas de prueba se
+eliminan con eliminar_venta(), así que en el libro de cuentas quedan pares
+venta / venta eliminada que se anulan. Correrla contra una base de prueba.
+
+Uso:
+    python benchmarks/concurrencia_stock.py
+    python benchmarks/concurrencia_stock.py --hilos 16 --stock 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database as db
+
+PRODUCTO = "__PRUEBA CONCURRENCIA__"
+VARIANTES = ["A", "B"]
+
+
+def preparar(sucursal, stock):
+    db.inicializar_db()
+    if not db.crear_producto(PRODUCTO, 1, 1):
+        raise SystemExit(f"No se pudo crear {PRODUCTO} (¿quedó de una corrida anterior?)")
+    for var in VARIANTES:
+        db.crear_variante(PRODUCTO, var)
+    id_p, _, id_s = db._ids(PRODUCTO, "", sucursal)
+    conn = db.get_db_connection(); cursor = conn.cursor()
+    try:
+        for var in VARIANTES:
+            _, id_v, _ = db._ids(PRODUCTO, var)
+            db._ajustar_stock(cursor, id_p, id_s, id_v, stock, "ajuste")
+        conn.commit()
+    finally: conn.close()
+    db.cache_db.invalidar("inventario")
+    return id_p, id_s
+
+
+def leer(id_p, id_s):
+    conn = db.get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT v.nombre_variante, i.cantidad FROM inventario i JOIN variantes v ON v.id = i.variante_id WHERE i.producto_id=%s AND i.sucursal_id=%s", (id_p, id_s))
+        stock = dict(cursor.fetchall())
+        cursor.execute("SELECT id, variante, cantidad FROM ventas WHERE producto_id=%s AND sucursal_id=%s", (id_p, id_s))
+        ventas = cursor.fetchall()
+        return stock, ventas
+    finally: conn.close()
+
+
+def limpiar(id_p, id_s, ventas):
+    for id_v, _, _ in ventas:
+        db.eliminar_venta(id_v)
+    conn = db.get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM inventario WHERE producto_id=%s", (id_p,))
+        cursor.execute("DELETE FROM resumen_diario WHERE producto_id=%s", (id_p,))
+        # Sin sus movimientos (ni sus filas en instantáneas) el libro vuelve a cuadrar con inventario
+        cursor.execute("DELETE FROM movimientos_stock WHERE producto_id=%s", (id_p,))
+        cursor.execute("DELETE FROM instantaneas_stock_filas WHERE producto_id=%s", (id_p,))
+        cursor.execute("DELETE FROM variantes WHERE producto_id=%s", (id_p,))
+        cursor.execute("DELETE FROM productos WHERE id=%s", (id_p,))
+        conn.commit()
+    finally: conn.close()
+    db.cache_db.invalidar("productos", "variantes", "inventario", "ventas", "resumen_diario")
+
+
+def vendedor(items, sucursal, resultados, inicio):
+    inicio.wait()
+    ok_n, rechazos = 0, 0
+    while True:
+        ok, _ = db.registrar_venta_carrito(items, "Efectivo", sucursal, "prueba concurrencia", None)
+        if ok:
+            ok_n += 1
+        else:
+            rechazos += 1
+            if rechazos >= 3:
+                break
+    resultados.append(ok_n)
+
+
+def escenario(nombre, items, hilos, sucursal):
+    resultados, inicio = [], threading.Barrier(hilos)
+    ts = [threading.Thread(target=vendedor, args=(items, sucursal, resultados, inicio)) for _ in range(hilos)]
+    t0 = time.perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    seg = time.perf_counter() - t0
+    print(f"{nombre}: {sum(resultados)} ventas en {seg:.2f}s con {hilos} hilos")
+    return sum(resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=60)
+    args = parser.parse_args()
+
+    sucursal = db.obtener_datos_globales()[1][0]
+    id_p, id_s = preparar(sucursal, args.stock)
+    fallas = []
+    try:
+        # 1. Carritos de dos líneas: A x1 + B x2 (B se agota primero, A queda a la mitad)
+        escenario("Dos líneas (A x1 + B x2)", [
+            {"producto": PRODUCTO, "variante": "A", "cantidad": 1, "precio": 1},
+            {"producto": PRODUCTO, "variante": "B", "cantidad": 2, "precio": 1},
+        ], args.hilos, sucursal)
+        # 2. Carritos de una línea: lo que queda de A se vende de a 1 unidad
+        escenario("Una línea (A x1)", [{"producto": PRODUCTO, "variante": "A", "cantidad": 1, "precio": 1}], args.hilos, sucursal)
+
+        stock, ventas = leer(id_p, id_s)
+        vendidas = {var: sum(c for _, v, c in ventas if v == var) for var in VARIANTES}
+        for var in VARIANTES:
+            print(f"  Variante {var}: stock final {stock[var]}, vendidas {vendidas[var]}")
+            if stock[var] < 0:
+                fallas.append(f"stock negativo en {var}: {stock[var]}")
+            if vendidas[var] + stock[var] != args.stock:
+                fallas.append(f"{var}: vendidas {vendidas[var]} + stock {stock[var]} != {args.stock}")
+        if stock["A"] != 0:
+            fallas.append(f"A debía agotarse y quedó en {stock['A']}")
+        if stock["B"] > 1:
+            fallas.append(f"B debía quedar en 0 o 1 y quedó en {stock['B']}")
+    finally:
+        _, ventas = leer(id_p, id_s)
+        limpiar(id_p, id_s, ventas)
+
+    if fallas:
+        print("❌ " + "\n❌ ".join(fallas))
+        return 1
+    print("✅ El stock nunca bajó de cero y cada unidad se vendió una sola vez.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
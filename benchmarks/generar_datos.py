@@ -0,0 +1,183 @@
+"""
+Siembra una base MySQL local con datos sintéticos para los benchmarks.
+
+Crea la base si no existe (por defecto `aurum_bench`, con las mismas credenciales
+que la app), aplica las migraciones y carga sucursales, productos con variantes,
+clientes, stock por sucursal (con su movimiento de apertura en el libro de stock)
+e historial de ventas / compras repartido en `--dias` días hacia atrás. Al final recalcula resumen_diario y el libro de cuentas.
+
+Todo se inserta con sentencias multi-fila en bloques; 1M de ventas tarda unos minutos.
+
+Uso:
+    python benchmarks/generar_datos.py                       # volúmenes chicos (prueba rápida)
+    python benchmarks/generar_datos.py --ventas 1000000 --compras 200000 --productos 5000 \\
+        --variantes 3 --sucursales 50 --clientes 20000 --vaciar
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BLOQUE = 10000
+SABORES = ["Chocolate", "Vainilla", "Frutilla", "Banana", "Cookies", "Dulce de Leche", "Limón", "Naranja", "Natural", "Menta"]
+MARCAS = ["Star Nutrition", "ENA", "Gentech", "Xtrenght", "Body Advance", "Pulver", "Nutrilab", "One Fit"]
+TIPOS = ["Whey Protein", "Creatina", "Ultra Mass", "BCAA", "Pre Entreno", "Glutamina", "Isolate", "Barras"]
+TABLAS = ["movimientos_cuenta", "cuentas", "resumen_diario", "instantaneas_stock_filas", "instantaneas_stock", "movimientos_stock",
+          "cambios_historial", "operaciones_aplicadas", "ventas", "compras", "inventario", "variantes", "clientes", "productos", "sucursales"]
+
+
+def crear_base(nombre):
+    import mysql.connector
+    import database as db
+    config, _ = db._config_conexion()
+    config = {k: v for k, v in config.items() if k != "database"}
+    cnx = mysql.connector.connect(**config)
+    try:
+        cnx.cursor().execute(f"CREATE DATABASE IF NOT EXISTS `{nombre}` DEFAULT CHARSET utf8mb4")
+    finally:
+        cnx.close()
+
+
+def insertar(conn, cursor, sql, filas, etiqueta):
+    """Inserta un iterable de filas en bloques (sin armar la lista completa en memoria)."""
+    t0, n, bloque = time.perf_counter(), 0, []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == BLOQUE:
+            cursor.executemany(sql, bloque); conn.commit()
+            n += len(bloque); bloque = []
+    if bloque:
+        cursor.executemany(sql, bloque); conn.commit()
+        n += len(bloque)
+    print(f"  {etiqueta}: {n:,} filas en {time.perf_counter() - t0:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base", default="aurum_bench")
+    parser.add_argument("--ventas", type=int, default=50000)
+    parser.add_argument("--compras", type=int, default=10000)
+    parser.add_argument("--productos", type=int, default=500)
+    parser.add_argument("--variantes", type=int, default=3, help="sabores por producto (el 10%% no tiene)")
+    parser.add_argument("--sucursales", type=int, default=5)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--dias", type=int, default=730)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--vaciar", action="store_true", help="borrar los datos existentes de la base de benchmarks")
+    args = parser.parse_args()
+
+    os.environ["AURUM_DB"] = args.base
+    crear_base(args.base)
+    import database as db
+    import migraciones
+    db.inicializar_db()
+
+    rng = np.random.default_rng(args.semilla)
+    conn = db.get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM ventas")
+        if cursor.fetchone()[0]:
+            if not args.vaciar:
+                raise SystemExit(f"La base {args.base} ya tiene datos: usar --vaciar para regenerarla.")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            for t in TABLAS:
+                cursor.execute(f"TRUNCATE TABLE {t}")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            conn.commit()
+
+        print(f"Sembrando {args.base}...")
+        # 1. Catálogo
+        sucursales = [f"Sucursal {i:02d}" for i in range(1, args.sucursales + 1)]
+        insertar(conn, cursor, "INSERT INTO sucursales (nombre) VALUES (%s)", [(s,) for s in sucursales], "sucursales")
+        costos = rng.integers(2000, 40000, args.productos)
+        productos = [(f"{MARCAS[i % len(MARCAS)]} {TIPOS[i // len(MARCAS) % len(TIPOS)]} {i:05d}", int(c), int(c * rng.uniform(1.3, 1.8)))
+                     for i, c in enumerate(costos)]
+        insertar(conn, cursor, "INSERT INTO productos (nombre, costo, precio, activo) VALUES (%s, %s, %s, 1)", productos, "productos")
+        cursor.execute("SELECT id, nombre, precio, costo FROM productos ORDER BY id")
+        prods = cursor.fetchall()
+        variantes = [(nombre, id_p, SABORES[(i + j) % len(SABORES)])
+                     for i, (id_p, nombre, _, _) in enumerate(prods) if i % 10
+                     for j in range(args.variantes)]
+        insertar(conn, cursor, "INSERT INTO variantes (producto_nombre, producto_id, nombre_variante) VALUES (%s, %s, %s)", variantes, "variantes")
+        insertar(conn, cursor, "INSERT INTO clientes (nombre, ubicacion) VALUES (%s, %s)",
+                 [("Consumidor Final", "General")] + [(f"Cliente {i:06d}", f"Zona {i % 30}") for i in range(1, args.clientes)], "clientes")
+
+        # SKUs: (producto_id, variante_id, nombre, variante, precio, costo)
+        cursor.execute("SELECT id, producto_id, nombre_variante FROM variantes")
+        por_producto = {}
+        for id_v, id_p, nombre_v in cursor.fetchall():
+            por_producto.setdefault(id_p, []).append((id_v, nombre_v))
+        skus = [(id_p, id_v, nombre, nombre_v, float(precio), float(costo))
+                for id_p, nombre, precio, costo in prods
+                for id_v, nombre_v in por_producto.get(id_p, [(0, "")])]
+        cursor.execute("SELECT id, nombre FROM sucursales ORDER BY id")
+        sucs = cursor.fetchall()
+        cursor.execute("SELECT id FROM clientes ORDER BY id")
+        clientes = [c for (c,) in cursor.fetchall()]
+
+        # 2. Stock: 80% de los SKUs en cada sucursal
+        inventario = ((s[0], id_s, s[1], int(rng.integers(0, 60)))
+                      for id_s, _ in sucs for s in skus if rng.random() < 0.8)
+        insertar(conn, cursor, "INSERT INTO inventario (producto_id, sucursal_id, variante_id, cantidad) VALUES (%s, %s, %s, %s)", inventario, "inventario")
+        # Libro de stock: un movimiento 'apertura' por fila sembrada, al comienzo del historial,
+        # así verificar_stock() cuadra y obtener_stock_al() tiene de dónde partir
+        cursor.execute("""
+            INSERT INTO movimientos_stock (fecha, producto_id, sucursal_id, variante_id, delta, origen)
+            SELECT %s, producto_id, sucursal_id, variante_id, cantidad, 'apertura' FROM inventario WHERE cantidad <> 0
+        """, (datetime.now().replace(microsecond=0) - timedelta(days=args.dias),))
+        conn.commit()
+
+        # 3. Historial
+        ahora = datetime.now().replace(microsecond=0)
+
+        def movimientos(n):
+            sku = rng.integers(0, len(skus), n)
+            suc = rng.integers(0, len(sucs), n)
+            seg = np.sort(rng.integers(0, args.dias * 86400, n))[::-1]
+            cant = rng.integers(1, 4, n)
+            efectivo = rng.random(n) < 0.55
+            return sku, suc, seg, cant, efectivo
+
+        sku, suc, seg, cant, efectivo = movimientos(args.ventas)
+        cli = rng.integers(0, len(clientes), args.ventas)
+
+        def filas_ventas():
+            for k in range(args.ventas):
+                id_p, id_v, nombre, var, precio, _ = skus[sku[k]]
+                id_s, nombre_s = sucs[suc[k]]
+                c = int(cant[k])
+                yield (ahora - timedelta(seconds=int(seg[k])), id_p, id_v, id_s, nombre, var, c, precio, precio * c,
+                       "Efectivo" if efectivo[k] else "Transferencia", nombre_s, "", clientes[cli[k]])
+        insertar(conn, cursor, "INSERT INTO ventas (fecha, producto_id, variante_id, sucursal_id, producto, variante, cantidad, precio_unitario, total, metodo_pago, ubicacion, notas, cliente_id) "
+                               "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", filas_ventas(), "ventas")
+
+        sku_c, suc_c, seg_c, cant_c, efectivo_c = movimientos(args.compras)
+
+        def filas_compras():
+            for k in range(args.compras):
+                id_p, id_v, nombre, var, _, costo = skus[sku_c[k]]
+                id_s, nombre_s = sucs[suc_c[k]]
+                c = int(cant_c[k]) * 10
+                yield (ahora - timedelta(seconds=int(seg_c[k])), id_p, id_v, id_s, nombre, var, c, costo * c,
+                       MARCAS[sku_c[k] % len(MARCAS)], "Efectivo" if efectivo_c[k] else "Transferencia", nombre_s, "")
+        insertar(conn, cursor, "INSERT INTO compras (fecha, producto_id, variante_id, sucursal_id, producto, variante, cantidad, costo_total, proveedor, metodo_pago, ubicacion, notas) "
+                               "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", filas_compras(), "compras")
+
+        # 4. Tablas derivadas
+        t0 = time.perf_counter()
+        migraciones.llenar_resumen_diario(cursor)
+        migraciones.m009_cuentas(cursor)
+        conn.commit()
+        print(f"  resumen_diario + cuentas en {time.perf_counter() - t0:.1f}s")
+    finally:
+        conn.close()
+    print(f"✅ Listo. Correr los benchmarks con: AURUM_DB={args.base} python benchmarks/bench_database.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Índice de búsqueda en memoria para el selector de Producto / Sabor.
+
+Cada etiqueta ("Producto | Sabor") se parte en palabras normalizadas (minúsculas,
+sin acentos). Una consulta encuentra las etiquetas que contienen TODAS sus
+palabras, en cualquier orden, de tres maneras (de mejor a peor puntaje):
+  - palabra exacta          ("choco"  -> "choco")
+  - prefijo                 ("choc"   -> "chocolate")
+  - con un error de tipeo   ("chocolte", "protiena" -> "chocolate", "proteina")
+
+El índice se arma una vez por versión del catálogo (database.obtener_indice_catalogo
+lo cachea hasta que cambian productos o variantes) y cada búsqueda solo recorre
+las palabras del vocabulario, nunca las etiquetas.
+"""
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+RE_PALABRA = re.compile(r"[a-z0-9]+")
+
+# Puntaje por palabra de la consulta según cómo coincidió
+EXACTA, PREFIJO, TIPEO = 3, 2, 1
+# Palabras más cortas que esto no admiten errores de tipeo (demasiados falsos positivos)
+MIN_LARGO_TIPEO = 4
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'Proteína Chocolate' -> 'proteina chocolate'."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def palabras(texto):
+    return RE_PALABRA.findall(normalizar(texto))
+
+
+def _borrados(palabra):
+    # Todas las variantes con una letra menos: dos palabras a distancia 1
+    # (una letra de más, de menos o cambiada) comparten alguna de estas.
+    return {palabra[:i] + palabra[i + 1:] for i in range(len(palabra))}
+
+
+def _distancia_max_1(a, b):
+    """True si a y b difieren en a lo sumo una edición (inserción, borrado, cambio o transposición)."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        # Cambio de una letra o dos letras vecinas invertidas
+        return a[i + 1:] == b[i + 1:] or (a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:])
+    if la > lb:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+class IndiceCatalogo:
+    """
+    etiquetas: lista de textos a buscar, en el orden en que se muestran sin filtro.
+    datos: opcional, dict etiqueta -> info asociada (ej. producto base, variante, precio).
+    """
+
+    def __init__(self, etiquetas, datos=None):
+        self.etiquetas = list(etiquetas)
+        self.datos = datos or {}
+        self._largo = []              # cantidad de palabras de cada etiqueta (desempate)
+        self._postings = {}           # palabra -> set(posiciones de etiqueta)
+        for pos, etiqueta in enumerate(self.etiquetas):
+            toks = palabras(etiqueta)
+            self._largo.append(len(toks))
+            for t in toks:
+                self._postings.setdefault(t, set()).add(pos)
+        self._vocabulario = sorted(self._postings)
+        self._por_borrado = {}        # palabra con una letra menos -> palabras del vocabulario
+        for t in self._vocabulario:
+            if len(t) >= MIN_LARGO_TIPEO:
+                for b in _borrados(t):
+                    self._por_borrado.setdefault(b, []).append(t)
+
+    def __len__(self):
+        return len(self.etiquetas)
+
+    def _con_prefijo(self, prefijo):
+        desde = bisect_left(self._vocabulario, prefijo)
+        hasta = bisect_right(self._vocabulario, prefijo + "￿")
+        return self._vocabulario[desde:hasta]
+
+    def _con_tipeo(self, palabra):
+        if len(palabra) < MIN_LARGO_TIPEO:
+            return []
+        candidatas = set(self._por_borrado.get(palabra, ()))   # la consulta tiene una letra de menos
+        for b in _borrados(palabra):
+            if b in self._postings:                           # la consulta tiene una letra de más
+                candidatas.add(b)
+            candidatas.update(self._por_borrado.get(b, ()))   # letra cambiada / invertida
+        return [t for t in candidatas if _distancia_max_1(palabra, t)]
+
+    def _puntajes_palabra(self, palabra):
+        """posición de etiqueta -> mejor puntaje de esa palabra de la consulta."""
+        puntajes = {}
+        niveles = [(TIPEO, self._con_tipeo(palabra)), (PREFIJO, self._con_prefijo(palabra)), (EXACTA, [palabra])]
+        for puntaje, tokens in niveles:  # de peor a mejor: el mejor pisa al peor
+            for t in tokens:
+                for pos in self._postings.get(t, ()):
+                    puntajes[pos] = puntaje
+        return puntajes
+
+    def buscar(self, consulta, limite=50):
+        """Etiquetas que contienen todas las palabras de la consulta, de mejor a peor coincidencia."""
+        toks = palabras(consulta)
+        if not toks:
+            return self.etiquetas[:limite]
+        total = None
+        # Primero las palabras más raras: el conjunto de candidatos se achica rápido
+        for puntajes in sorted((self._puntajes_palabra(t) for t in dict.fromkeys(toks)), key=len):
+            if total is None:
+                total = puntajes
+            else:
+                total = {pos: total[pos] + p for pos, p in puntajes.items() if pos in total}
+            if not total:
+                return []
+        orden = sorted(total, key=lambda pos: (-total[pos], self._largo[pos], pos))
+        return [self.etiquetas[pos] for pos in orden[:limite]]
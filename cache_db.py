@@ -0,0 +1,128 @@
+"""
+Caché en memoria para las lecturas de catálogo (productos, variantes, sucursales, stock).
+
+Cada tabla tiene un contador de generación. Una lectura cacheada guarda su
+resultado junto con las generaciones de las tablas de las que depende; cuando
+una función de escritura llama a invalidar("productos"), la generación sube y
+las lecturas siguientes de esa tabla vuelven a la base. Mientras nadie escriba,
+todas las sesiones comparten el mismo resultado en memoria.
+
+Es por proceso: Streamlit corre un solo proceso, así que todas las escrituras
+pasan por acá. Si alguien modifica la base por fuera de la app, los cambios se
+ven recién después de la próxima escritura sobre esa tabla (o de limpiar()).
+"""
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+MAX_ENTRADAS = 256
+
+_lock = threading.Lock()
+_generaciones = {}
+_entradas = OrderedDict()  # clave -> (tablas, valor)
+_stats = {}  # nombre función -> {"hits": n, "misses": n}
+_evicciones = 0
+_local = threading.local()
+
+
+def _copiar(valor):
+    # Quien llama suele modificar los DataFrames (agregar columnas, formatear):
+    # nunca entregar el objeto guardado.
+    if isinstance(valor, pd.DataFrame):
+        return valor.copy()
+    if isinstance(valor, tuple):
+        return tuple(_copiar(v) for v in valor)
+    if isinstance(valor, list):
+        return list(valor)
+    if isinstance(valor, dict):
+        return dict(valor)
+    return valor
+
+
+def no_cachear():
+    """Llamar dentro de una función cacheada (en su except) para que ese resultado no se guarde."""
+    _local.no_cachear = True
+
+
+def invalidar(*tablas):
+    """Marca las tablas como modificadas: sube su generación y descarta lo cacheado que dependía de ellas."""
+    with _lock:
+        for t in tablas:
+            _generaciones[t] = _generaciones.get(t, 0) + 1
+        afectadas = [k for k, (deps, _) in _entradas.items() if deps & set(tablas)]
+        for k in afectadas:
+            del _entradas[k]
+
+
+def generaciones(*tablas):
+    """Generación actual de cada tabla: si cambia entre dos lecturas, hubo una escritura en el medio."""
+    with _lock:
+        return tuple(_generaciones.get(t, 0) for t in tablas)
+
+
+def cacheado(*tablas):
+    """
+    Decorador: cachea el resultado de la función hasta que se invalide alguna de `tablas`.
+
+    Un argumento `cursor=` no forma parte de la clave: lo pasa quien ya tiene una
+    conexión tomada, para que un miss lea por esa conexión en vez de pedir otra al pool.
+    """
+    deps = frozenset(tablas)
+
+    def decorador(funcion):
+        nombre = funcion.__name__
+
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            global _evicciones
+            with _lock:
+                gens = tuple(_generaciones.get(t, 0) for t in tablas)
+                clave = (nombre, args, tuple(sorted((k, v) for k, v in kwargs.items() if k != "cursor")), gens)
+                stats = _stats.setdefault(nombre, {"hits": 0, "misses": 0})
+                if clave in _entradas:
+                    _entradas.move_to_end(clave)
+                    stats["hits"] += 1
+                    return _copiar(_entradas[clave][1])
+                stats["misses"] += 1
+
+            anterior = getattr(_local, "no_cachear", False)
+            _local.no_cachear = False
+            try:
+                valor = funcion(*args, **kwargs)
+                descartar = _local.no_cachear
+            finally:
+                _local.no_cachear = anterior
+            if descartar:
+                return valor
+
+            with _lock:
+                # Si hubo una escritura mientras leíamos, la clave ya quedó vieja: no se guarda
+                if gens == tuple(_generaciones.get(t, 0) for t in tablas):
+                    _entradas[clave] = (deps, valor)
+                    while len(_entradas) > MAX_ENTRADAS:
+                        _entradas.popitem(last=False)
+                        _evicciones += 1
+            return _copiar(valor)
+
+        return envoltura
+
+    return decorador
+
+
+def limpiar():
+    with _lock:
+        _entradas.clear()
+
+
+def estadisticas():
+    """Hits/misses por función, cantidad de entradas y evicciones (para diagnóstico)."""
+    with _lock:
+        return {
+            "entradas": len(_entradas),
+            "max_entradas": MAX_ENTRADAS,
+            "evicciones": _evicciones,
+            "generaciones": dict(_generaciones),
+            "funciones": {k: dict(v) for k, v in _stats.items()},
+        }
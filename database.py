@@ -1,111 +1,532 @@
+import os
+import re
+import sqlite3
+import threading
+import time
 import mysql.connector
+import numpy as np
 import pandas as pd
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
+from pool_conexiones import PoolConexiones
+from base_sqlite import PoolSqlite
+from buscador import IndiceCatalogo
+import cache_db
+import diagnostico
 
 # --- 1. CONEXIÓN Y AUTO-REPARACIÓN ---
-def get_db_connection():
+_pool = None
+_pool_lock = threading.RLock()
+_esquema_listo = False
+
+def _config_conexion():
+    """
+    Devuelve (parámetros de conexión, opciones del pool).
+    Opciones opcionales en secrets [mysql]: pool_size, pool_recycle, pool_ping.
+    """
     # Detectar si estamos en la nube o local
     if "mysql" in st.secrets:
-        return mysql.connector.connect(
-            host=st.secrets["mysql"]["host"],
-            user=st.secrets["mysql"]["user"],
-            password=st.secrets["mysql"]["password"],
-            database=st.secrets["mysql"]["database"],
-            port=st.secrets["mysql"]["port"]
-        )
+        cfg = st.secrets["mysql"]
+        config = {
+            "host": cfg["host"],
+            "user": cfg["user"],
+            "password": cfg["password"],
+            "database": cfg["database"],
+            "port": cfg["port"],
+        }
+        opciones = {
+            "tamano": int(cfg.get("pool_size", 5)),
+            "reciclar_seg": int(cfg.get("pool_recycle", 1800)),
+            "ping_seg": int(cfg.get("pool_ping", 30)),
+        }
     else:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="aurum_db"
-        )
+        config = {
+            "host": "localhost",
+            "user": "root",
+            "password": "",
+            "database": "aurum_db",
+        }
+        opciones = {}
+    # AURUM_DB apunta a otra base con las mismas credenciales (ej. la de benchmarks)
+    config["database"] = os.environ.get("AURUM_DB", config["database"])
+    return config, opciones
 
-def asegurar_estructura_db(conn):
+def _ruta_sqlite():
     """
-    Función de AUTO-CURACIÓN:
-    Verifica que las tablas tengan las columnas nuevas (activo, cliente_id, etc).
-    Si no están, las crea automáticamente para evitar errores.
+    Archivo SQLite del modo local embebido (ver base_sqlite.py), o None para usar MySQL.
+    AURUM_SQLITE en el entorno o [sqlite] ruta en secrets.
     """
-    cursor = conn.cursor()
-    try:
-        # 1. Verificar columna 'activo' en productos
-        cursor.execute("SHOW COLUMNS FROM productos LIKE 'activo'")
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE productos ADD COLUMN activo TINYINT(1) DEFAULT 1")
-            cursor.execute("UPDATE productos SET activo = 1") # Activar todos los existentes
-            conn.commit()
-            print("✅ DB Reparada: Columna 'activo' creada.")
-
-        # 2. Verificar columna 'cliente_id' en ventas
-        cursor.execute("SHOW COLUMNS FROM ventas LIKE 'cliente_id'")
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE ventas ADD COLUMN cliente_id INT DEFAULT NULL")
-            conn.commit()
-            print("✅ DB Reparada: Columna 'cliente_id' creada.")
+    if os.environ.get("AURUM_SQLITE"):
+        return os.environ["AURUM_SQLITE"]
+    if "sqlite" in st.secrets:
+        return st.secrets["sqlite"]["ruta"]
+    return None
 
-    except Exception as e:
-        print(f"⚠️ Advertencia de esquema: {e}")
-    finally:
-        cursor.close()
+def obtener_pool():
+    """Pool único por proceso, compartido por todas las sesiones de Streamlit."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                ruta = _ruta_sqlite()
+                if ruta:
+                    _pool = PoolSqlite(ruta)
+                else:
+                    config, opciones = _config_conexion()
+                    _pool = PoolConexiones(config, **opciones)
+    return _pool
+
+def get_db_connection():
+    # Presta una conexión del pool; conn.close() la devuelve en vez de cerrarla.
+    # Va envuelta para medir la espera del préstamo y cada sentencia (ver diagnostico.py)
+    t0 = time.perf_counter()
+    conn = obtener_pool().obtener()
+    diagnostico.registrar_conexion(time.perf_counter() - t0)
+    return diagnostico.ConexionMedida(conn)
+
+def inicializar_db():
+    """
+    Aplica las migraciones pendientes una sola vez por proceso.
+    Se llama al arrancar la app; en las siguientes ejecuciones no toca la base.
+    """
+    global _esquema_listo
+    if _esquema_listo:
+        return
+    with _pool_lock:
+        if _esquema_listo:
+            return
+        import migraciones
+        import base_sqlite
+        conn = get_db_connection()
+        try:
+            if isinstance(obtener_pool(), PoolSqlite):
+                # SQLite nace con el esquema final: no hay bases viejas que migrar
+                base_sqlite.crear_esquema(conn)
+            else:
+                migraciones.ejecutar_migraciones(conn)
+        finally:
+            conn.close()
+        _esquema_listo = True
+
+# --- CLAVES ENTERAS (nombre -> id) ---
+# La interfaz trabaja con nombres; las tablas se relacionan por producto_id,
+# variante_id (0 = sin variante) y sucursal_id.
+@cache_db.cacheado("productos", "sucursales", "variantes")
+def _mapa_ids(cursor=None):
+    """
+    `cursor`: el de quien llama si ya tiene una conexión tomada. Pedir una segunda
+    conexión con la primera retenida puede vaciar el pool y trabarse esperando.
+    """
+    if cursor is not None:
+        return _leer_mapa_ids(cursor)
+    conn = get_db_connection(); cursor = conn.cursor()
+    try: return _leer_mapa_ids(cursor)
+    finally: conn.close()
+
+def _leer_mapa_ids(cursor):
+    cursor.execute("SELECT id, nombre FROM productos")
+    productos = {nombre: id_p for id_p, nombre in cursor.fetchall()}
+    cursor.execute("SELECT id, nombre FROM sucursales")
+    sucursales = {nombre: id_s for id_s, nombre in cursor.fetchall()}
+    cursor.execute("SELECT id, producto_id, nombre_variante FROM variantes")
+    variantes = {(id_p, nombre): id_v for id_v, id_p, nombre in cursor.fetchall()}
+    return productos, sucursales, variantes
+
+def _ids(producto, variante, sucursal=None, cursor=None):
+    """
+    Devuelve (producto_id, variante_id, sucursal_id). Lanza ValueError si algún nombre no existe.
+    Con una conexión abierta, pasar su `cursor` (ver _mapa_ids).
+    """
+    productos, sucursales, variantes = _mapa_ids(cursor=cursor)
+    if producto not in productos:
+        raise ValueError(f"Producto inexistente: {producto}")
+    id_p = productos[producto]
+    id_v = variantes.get((id_p, variante)) if variante else 0
+    if id_v is None:
+        raise ValueError(f"Variante inexistente: {producto} | {variante}")
+    id_s = None
+    if sucursal is not None:
+        if sucursal not in sucursales:
+            raise ValueError(f"Sucursal inexistente: {sucursal}")
+        id_s = sucursales[sucursal]
+    return id_p, id_v, id_s
+
+# Todo cambio de inventario.cantidad deja su fila en movimientos_stock (el libro) en la misma
+# transacción: inventario es el estado actual, el libro explica cómo se llegó (ver sección 9).
+def _anotar_stock(cursor, filas, origen, referencia_id=None):
+    """
+    filas: (producto_id, sucursal_id, variante_id, delta). Las de delta 0 no se anotan.
+    Llamar después de tocar inventario en la misma transacción (ver tomar_instantanea_stock).
+    """
+    # La fecha va como parámetro: con NOW() dentro de VALUES el conector no arma un
+    # único INSERT multi-fila y manda una sentencia por fila
+    fecha = datetime.now().replace(microsecond=0)
+    filas = [(fecha,) + tuple(f) + (origen, referencia_id) for f in filas if f[3]]
+    if filas:
+        cursor.executemany(
+            "INSERT INTO movimientos_stock (fecha, producto_id, sucursal_id, variante_id, delta, origen, referencia_id) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            filas,
+        )
+
+def _ajustar_stock(cursor, producto_id, sucursal_id, variante_id, delta, origen, referencia_id=None):
+    """Suma `delta` (puede ser negativo) al stock del SKU en la sucursal; crea el registro si no existe."""
+    cursor.execute(
+        "INSERT INTO inventario (producto_id, sucursal_id, variante_id, cantidad) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)",
+        (producto_id, sucursal_id, variante_id, delta),
+    )
+    _anotar_stock(cursor, [(producto_id, sucursal_id, variante_id, delta)], origen, referencia_id)
+
+def _descontar_stock(cursor, producto_id, sucursal_id, variante_id, cantidad):
+    """
+    Descuenta `cantidad` solo si alcanza, en una sola sentencia: el chequeo y la resta
+    son atómicos, así dos vendedores a la vez nunca dejan el stock en negativo.
+    Devuelve lo que queda, o None si no había stock suficiente (no se tocó nada).
+    No anota en movimientos_stock: lo hace quien llama, con la referencia de la venta.
+    """
+    # LAST_INSERT_ID(expr) deja el stock resultante en el paquete OK: sin ida y vuelta extra
+    cursor.execute(
+        "UPDATE inventario SET cantidad = LAST_INSERT_ID(cantidad - %s) WHERE producto_id = %s AND sucursal_id = %s AND variante_id = %s AND cantidad >= %s",
+        (cantidad, producto_id, sucursal_id, variante_id, cantidad),
+    )
+    return cursor.lastrowid if cursor.rowcount == 1 else None
 
 # --- 2. LECTURA DE DATOS GLOBAL ---
+# Nombres de columnas que usa la interfaz (Renombrar SIEMPRE para evitar KeyError: 'ID')
+COLUMNAS_VENTAS = {
+    'id': 'ID', 'fecha': 'FECHA', 'producto': 'PRODUCTO',
+    'cantidad': 'CANTIDAD', 'precio_unitario': 'PRECIO UNITARIO',
+    'total': 'TOTAL', 'metodo_pago': 'METODO PAGO',
+    'ubicacion': 'UBICACION', 'notas': 'NOTAS', 'cliente_id': 'CLIENTE_ID',
+    'variante': 'VARIANTE'
+}
+COLUMNAS_COMPRAS = {
+    'id': 'ID', 'fecha': 'FECHA', 'producto': 'PRODUCTO',
+    'cantidad': 'CANTIDAD', 'costo_total': 'COSTO',
+    'proveedor': 'PROVEEDOR', 'metodo_pago': 'METODO PAGO',
+    'ubicacion': 'UBICACION', 'notas': 'NOTAS',
+    'variante': 'VARIANTE'
+}
+
+@cache_db.cacheado("productos", "sucursales")
 def obtener_datos_globales():
+    """
+    Catálogo básico para todas las páginas: productos activos y sucursales.
+    El historial de ventas/compras NO se carga acá: ver obtener_movimientos().
+    """
     conn = get_db_connection()
-    
-    # ¡PASO CRÍTICO! Reparar DB antes de leer
-    asegurar_estructura_db(conn)
-    
     try:
         # Sucursales
         df_suc = pd.read_sql("SELECT nombre FROM sucursales", conn)
         lista_sucursales = df_suc['nombre'].tolist() if not df_suc.empty else []
         
-        # Productos (Ahora seguro existe 'activo')
-        try:
-            df_prod = pd.read_sql("SELECT nombre as Nombre, costo as Costo, precio as Precio FROM productos WHERE activo=1", conn)
-        except:
-            # Fallback por si acaso
-            df_prod = pd.read_sql("SELECT nombre as Nombre, costo as Costo, precio as Precio FROM productos", conn)
-        
-        # Ventas (Renombrar SIEMPRE para evitar KeyError: 'ID')
-        df_ventas = pd.read_sql("SELECT * FROM ventas ORDER BY fecha DESC", conn)
-        columnas_ventas = {
-            'id': 'ID', 'fecha': 'FECHA', 'producto': 'PRODUCTO', 
-            'cantidad': 'CANTIDAD', 'precio_unitario': 'PRECIO UNITARIO', 
-            'total': 'TOTAL', 'metodo_pago': 'METODO PAGO', 
-            'ubicacion': 'UBICACION', 'notas': 'NOTAS', 'cliente_id': 'CLIENTE_ID',
-            'variante': 'VARIANTE'
-        }
-        df_ventas = df_ventas.rename(columns=columnas_ventas)
-        
-        # Compras
-        df_compras = pd.read_sql("SELECT * FROM compras ORDER BY fecha DESC", conn)
-        columnas_compras = {
-            'id': 'ID', 'fecha': 'FECHA', 'producto': 'PRODUCTO', 
-            'cantidad': 'CANTIDAD', 'costo_total': 'COSTO', 
-            'proveedor': 'PROVEEDOR', 'metodo_pago': 'METODO PAGO', 
-            'ubicacion': 'UBICACION', 'notas': 'NOTAS',
-            'variante': 'VARIANTE'
-        }
-        df_compras = df_compras.rename(columns=columnas_compras)
+        # Productos ('activo' lo garantiza la migración 002)
+        df_prod = pd.read_sql("SELECT nombre as Nombre, costo as Costo, precio as Precio FROM productos WHERE activo=1", conn)
 
-        return df_prod, lista_sucursales, df_ventas, df_compras
+        return df_prod, lista_sucursales
     except Exception as e:
+        cache_db.no_cachear()
         st.error(f"Error crítico leyendo datos: {e}")
-        return pd.DataFrame(), [], pd.DataFrame(), pd.DataFrame()
+        return pd.DataFrame(), []
     finally:
         conn.close()
 
+def sql_movimientos(tipo, sucursal_id=None, producto=None, desde=None, hasta=None, despues_de=None, limite=50):
+    """
+    Arma (sql, params) de una página de historial. Separado para poder revisarlo con EXPLAIN.
+    limite=None: sin LIMIT (exportación completa, ver iterar_movimientos).
+    """
+    # La variante se muestra con su nombre actual (join por variante_id)
+    if tipo == "Ventas":
+        tabla = "ventas"
+        campos = "t.id, t.fecha, t.producto, COALESCE(v.nombre_variante, t.variante) AS variante, t.cantidad, t.precio_unitario, t.total, t.metodo_pago, t.ubicacion, t.notas, t.cliente_id"
+    else:
+        tabla = "compras"
+        campos = "t.id, t.fecha, t.producto, COALESCE(v.nombre_variante, t.variante) AS variante, t.cantidad, t.costo_total, t.proveedor, t.metodo_pago, t.ubicacion, t.notas"
+
+    condiciones, params = [], []
+    if sucursal_id is not None:
+        condiciones.append("t.sucursal_id = %s"); params.append(sucursal_id)
+    if producto:
+        patron = producto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        condiciones.append("t.producto LIKE %s"); params.append(f"%{patron}%")
+    if desde:
+        condiciones.append("t.fecha >= %s"); params.append(datetime.combine(desde, datetime.min.time()))
+    if hasta:
+        condiciones.append("t.fecha < %s"); params.append(datetime.combine(hasta, datetime.min.time()) + timedelta(days=1))
+    if despues_de:
+        fecha_k, id_k = despues_de
+        condiciones.append("(t.fecha < %s OR (t.fecha = %s AND t.id < %s))"); params += [fecha_k, fecha_k, id_k]
+
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    sql = f"SELECT {campos} FROM {tabla} t LEFT JOIN variantes v ON v.id = t.variante_id {where} ORDER BY t.fecha DESC, t.id DESC"
+    if limite is not None:
+        sql += " LIMIT %s"; params.append(limite)
+    return sql, params
+
+def obtener_movimientos(tipo, sucursal=None, producto=None, desde=None, hasta=None, despues_de=None, limite=50):
+    """
+    Una página del historial de 'Ventas' o 'Compras', con los filtros resueltos en SQL.
+
+    Paginación por keyset sobre (fecha, id) descendente: `despues_de` es la
+    clave (fecha, id) de la última fila de la página anterior (None = primera página).
+    `desde`/`hasta` son fechas inclusivas.
+    Devuelve (df, clave_siguiente); clave_siguiente es None si no hay más filas.
+    """
+    columnas = COLUMNAS_VENTAS if tipo == "Ventas" else COLUMNAS_COMPRAS
+    sucursal_id = _mapa_ids()[1].get(sucursal, -1) if sucursal else None
+    # Pedimos una fila de más para saber si existe una página siguiente
+    sql, params = sql_movimientos(tipo, sucursal_id, producto, desde, hasta, despues_de, limite + 1)
+
+    conn = get_db_connection()
+    try:
+        df = pd.read_sql(sql, conn, params=params)
+    except Exception as e:
+        st.error(f"Error leyendo movimientos: {e}")
+        return pd.DataFrame(columns=list(columnas.values()) + ['PRODUCTO_FULL']), None
+    finally:
+        conn.close()
+
+    hay_mas = len(df) > limite
+    df = df.head(limite).rename(columns=columnas)
+
+    # Etiqueta "Producto | Variante" solo para las filas visibles
+    variante = df['VARIANTE'].fillna('')
+    df['PRODUCTO_FULL'] = df['PRODUCTO'].where(variante == '', df['PRODUCTO'] + ' | ' + variante)
+
+    clave_siguiente = None
+    if hay_mas:
+        ultima = df.iloc[-1]
+        clave_siguiente = (ultima['FECHA'].to_pydatetime(), int(ultima['ID']))
+    return df, clave_siguiente
+
+def iterar_movimientos(tipo, sucursal=None, producto=None, desde=None, hasta=None, bloque=5000):
+    """
+    Recorre TODO el historial filtrado de a `bloque` filas (DataFrames con las columnas de pantalla).
+
+    Usa un cursor sin buffer: el servidor va mandando filas a medida que se leen, así
+    la memoria queda acotada a un bloque sin importar cuántos años de historial haya,
+    y el primer bloque sale apenas el servidor empieza a responder.
+    La conexión queda tomada hasta terminar de recorrer (o cerrar) el generador.
+    """
+    columnas = COLUMNAS_VENTAS if tipo == "Ventas" else COLUMNAS_COMPRAS
+    sucursal_id = _mapa_ids()[1].get(sucursal, -1) if sucursal else None
+    sql, params = sql_movimientos(tipo, sucursal_id, producto, desde, hasta, limite=None)
+    conn = get_db_connection(); cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(sql, params)
+        nombres = [columnas.get(c[0], c[0].upper()) for c in cursor.description]
+        while True:
+            filas = cursor.fetchmany(bloque)
+            if not filas:
+                break
+            yield pd.DataFrame(filas, columns=nombres)
+    finally:
+        # Si el generador se abandonó a mitad de camino, el pool descarta el resto del resultado
+        conn.close()
+
+# --- BÚSQUEDA DE TEXTO EN EL HISTORIAL ---
+# Columnas con índice de texto completo (migración 012 en MySQL, tablas FTS5 en base_sqlite.py).
+# clientes.nombre también tiene el suyo: las ventas se buscan por cliente.
+COLUMNAS_TEXTO = {"ventas": "producto, variante, notas", "compras": "producto, variante, proveedor, notas"}
+
+def _palabras(texto):
+    """'Factura 0012-3344' -> [['factura'], ['0012', '3344']]: cada palabra escrita, partida como la parte el índice."""
+    palabras = [re.findall(r"[^\W_]+", p.lower()) for p in texto.split()]
+    return [p for p in palabras if p]
+
+# InnoDB no indexa palabras de menos de innodb_ft_min_token_size (3 por defecto) ni las de su
+# lista de stopwords por defecto; como término obligatorio ('+de*') dejan vacío el resultado.
+MIN_PALABRA_MYSQL = 3
+STOPWORDS_MYSQL = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or "
+    "that the this to was what when where who will with und www".split())
+
+def _indexada_mysql(palabra):
+    """False si alguna parte de la palabra no está en el índice de texto de InnoDB."""
+    return all(len(p) >= MIN_PALABRA_MYSQL and p not in STOPWORDS_MYSQL for p in palabra)
+
+def consulta_texto(texto, motor="mysql"):
+    """
+    Texto del buscador -> consulta para MATCH, o None si no quedan palabras.
+    Todas las palabras son obligatorias; una palabra suelta busca también como prefijo
+    ('prote' encuentra 'proteína') y una con guiones / puntos ('0012-3344') busca esas
+    partes seguidas, como frase.
+    En MySQL se dejan afuera las palabras que InnoDB no indexa (ver palabras_like).
+    """
+    partes = []
+    for p in _palabras(texto):
+        if motor == "sqlite":
+            partes.append(f'"{p[0]}"*' if len(p) == 1 else '"' + " ".join(p) + '"')
+        elif _indexada_mysql(p):
+            partes.append(f"+{p[0]}*" if len(p) == 1 else '+"' + " ".join(p) + '"')
+    return " ".join(partes) or None
+
+def palabras_like(texto, motor="mysql"):
+    """
+    Patrones LIKE de las palabras que consulta_texto deja afuera en MySQL ('dulce de leche'
+    -> ['%de%']): siguen siendo obligatorias, pero se filtran sobre las filas que ya
+    encontró el índice. En SQLite (FTS5 no tiene stopwords) no hay ninguna.
+    """
+    if motor == "sqlite":
+        return []
+    return ["%" + "%".join(p) + "%" for p in _palabras(texto) if not _indexada_mysql(p)]
+
+def sql_busqueda(tipo, texto, sucursal_id=None, desde=None, hasta=None, limite=100, motor="mysql"):
+    """
+    Arma (sql, params) de la búsqueda de texto, o None si el texto no tiene palabras.
+
+    Busca en producto, variante, proveedor y notas con el índice de texto completo y, en
+    ventas, también por nombre de cliente (índice de texto de clientes y después el de
+    cliente_id de ventas). Ordena por relevancia y, a igual relevancia, lo más nuevo primero.
+    motor: "mysql" (MATCH ... AGAINST) o "sqlite" (tablas FTS5 de base_sqlite.py).
+    """
+    consulta = consulta_texto(texto, motor)
+    likes = palabras_like(texto, motor)
+    if consulta is None and not likes:
+        return None
+    tabla = "ventas" if tipo == "Ventas" else "compras"
+    columnas = COLUMNAS_TEXTO[tabla]
+    if tipo == "Ventas":
+        campos = "t.id, t.fecha, t.producto, COALESCE(v.nombre_variante, t.variante) AS variante, t.cantidad, t.precio_unitario, t.total, t.metodo_pago, t.ubicacion, t.notas, t.cliente_id"
+    else:
+        campos = "t.id, t.fecha, t.producto, COALESCE(v.nombre_variante, t.variante) AS variante, t.cantidad, t.costo_total, t.proveedor, t.metodo_pago, t.ubicacion, t.notas"
+
+    filtros, params_filtro = "", []
+    if sucursal_id is not None:
+        filtros += " AND t.sucursal_id = %s"; params_filtro.append(sucursal_id)
+    if desde:
+        filtros += " AND t.fecha >= %s"; params_filtro.append(datetime.combine(desde, datetime.min.time()))
+    if hasta:
+        filtros += " AND t.fecha < %s"; params_filtro.append(datetime.combine(hasta, datetime.min.time()) + timedelta(days=1))
+
+    if motor == "sqlite":
+        # rank = bm25: más chico = más relevante
+        texto_sql = (f"SELECT t.id, -f.rank AS rel FROM {tabla}_fts f JOIN {tabla} t ON t.id = f.rowid "
+                     f"WHERE {tabla}_fts MATCH %s{filtros}")
+        clientes_sql = ("SELECT t.id, 1 AS rel FROM clientes_fts f JOIN ventas t ON t.cliente_id = f.rowid "
+                        f"WHERE clientes_fts MATCH %s{filtros}")
+        params = [consulta] + params_filtro
+        params_clientes = [consulta] + params_filtro
+    else:
+        cols_t = ", ".join("t." + c for c in columnas.split(", "))
+        like_t = "".join(f" AND CONCAT_WS(' ', {cols_t}) LIKE %s" for _ in likes)
+        like_c = "".join(" AND c.nombre LIKE %s" for _ in likes)
+        if consulta is None:
+            # Sólo palabras fuera del índice: no hay MATCH que use, se recorre con LIKE
+            texto_sql = f"SELECT t.id, 1 AS rel FROM {tabla} t WHERE 1 = 1{like_t}{filtros}"
+            clientes_sql = ("SELECT t.id, 1 AS rel FROM clientes c JOIN ventas t ON t.cliente_id = c.id "
+                            f"WHERE 1 = 1{like_c}{filtros}")
+            params = likes + params_filtro
+            params_clientes = likes + params_filtro
+        else:
+            match = f"MATCH({cols_t}) AGAINST (%s IN BOOLEAN MODE)"
+            texto_sql = f"SELECT t.id, {match} AS rel FROM {tabla} t WHERE {match}{like_t}{filtros}"
+            clientes_sql = ("SELECT t.id, 1 AS rel FROM clientes c JOIN ventas t ON t.cliente_id = c.id "
+                            f"WHERE MATCH(c.nombre) AGAINST (%s IN BOOLEAN MODE){like_c}{filtros}")
+            params = [consulta, consulta] + likes + params_filtro
+            params_clientes = [consulta] + likes + params_filtro
+
+    if tipo == "Ventas":
+        # Una coincidencia por nombre de cliente suma lo mismo sin importar cuál
+        texto_sql += " UNION ALL " + clientes_sql
+        params += params_clientes
+
+    sql = (f"SELECT {campos}, r.relevancia FROM "
+           f"(SELECT id, SUM(rel) AS relevancia FROM ({texto_sql}) x GROUP BY id ORDER BY relevancia DESC, id DESC LIMIT %s) r "
+           f"JOIN {tabla} t ON t.id = r.id LEFT JOIN variantes v ON v.id = t.variante_id "
+           f"ORDER BY r.relevancia DESC, t.fecha DESC, t.id DESC")
+    params.append(limite)
+    return sql, params
+
+def buscar_movimientos(tipo, texto, sucursal=None, desde=None, hasta=None, limite=100):
+    """
+    Las `limite` ventas / compras más relevantes para `texto` (ej. "factura 0012-3344", un
+    proveedor, un cliente), con las mismas columnas que obtener_movimientos más RELEVANCIA.
+    """
+    columnas = COLUMNAS_VENTAS if tipo == "Ventas" else COLUMNAS_COMPRAS
+    vacio = pd.DataFrame(columns=list(columnas.values()) + ['PRODUCTO_FULL', 'RELEVANCIA'])
+    sucursal_id = _mapa_ids()[1].get(sucursal, -1) if sucursal else None
+    armado = sql_busqueda(tipo, texto, sucursal_id, desde, hasta, limite,
+                          motor="sqlite" if _ruta_sqlite() is not None else "mysql")
+    if armado is None:
+        return vacio
+    sql, params = armado
+
+    conn = get_db_connection()
+    try:
+        df = pd.read_sql(sql, conn, params=params)
+    except Exception as e:
+        st.error(f"Error en la búsqueda: {e}")
+        return vacio
+    finally:
+        conn.close()
+
+    df = df.rename(columns={**columnas, 'relevancia': 'RELEVANCIA'})
+    variante = df['VARIANTE'].fillna('')
+    df['PRODUCTO_FULL'] = df['PRODUCTO'].where(variante == '', df['PRODUCTO'] + ' | ' + variante)
+    return df
+
 # --- 3. LÓGICA DE STOCK TIPO EXCEL (MATRIZ) ---
+def construir_matriz(df_base, df_vars, df_stock, sucursales):
+    """
+    Arma la matriz SKU x sucursal del editor de stock, sin bucles por fila.
+
+    df_base: nombre, costo, precio (productos activos, en el orden a mostrar)
+    df_vars: producto_nombre, nombre_variante
+    df_stock: producto_nombre, variante, sucursal_nombre, cantidad
+    Cada producto se expande a una fila por variante (o una fila con Variante ''
+    si no tiene), y se agrega una columna de stock por sucursal (0 si no hay registro).
+    """
+    base = df_base.rename(columns={'nombre': 'Producto', 'costo': 'Costo', 'precio': 'Precio'})
+    vars_ = df_vars.rename(columns={'producto_nombre': 'Producto', 'nombre_variante': 'Variante'})
+
+    # Producto x Variante: el merge 'left' respeta el orden de productos y de variantes
+    df_matrix = base.merge(vars_[['Producto', 'Variante']], on='Producto', how='left', indicator=True)
+    sin_variantes = (df_matrix['_merge'] == 'left_only').to_numpy()
+    df_matrix['Variante'] = df_matrix['Variante'].mask(sin_variantes, '')
+    df_matrix = df_matrix[['Producto', 'Variante', 'Costo', 'Precio']].reset_index(drop=True)
+
+    if df_stock.empty or df_matrix.empty:
+        return df_matrix
+
+    # Pivot de stock: ubicamos cada registro en (fila SKU, columna sucursal) por índice
+    skus = pd.MultiIndex.from_arrays([df_matrix['Producto'], df_matrix['Variante']])
+    skus_unicos = skus.unique()
+    claves_stock = pd.MultiIndex.from_arrays([df_stock['producto_nombre'], df_stock['variante'].fillna('')])
+    fila = skus_unicos.get_indexer(claves_stock)
+    col = pd.Index(sucursales).get_indexer(df_stock['sucursal_nombre'])
+    ok = (fila >= 0) & (col >= 0)
+
+    cantidades = df_stock['cantidad'].to_numpy()
+    dtype = np.int64 if pd.api.types.is_integer_dtype(df_stock['cantidad']) else np.float64
+    tabla = np.zeros((len(skus_unicos), len(sucursales)), dtype=dtype)
+
+    # Si un SKU aparece repetido en una sucursal, gana el último registro
+    celda = fila[ok] * len(sucursales) + col[ok]
+    _, ultimo = np.unique(celda[::-1], return_index=True)
+    posiciones = np.flatnonzero(ok)[::-1][ultimo]
+    tabla[fila[posiciones], col[posiciones]] = cantidades[posiciones]
+
+    valores = tabla[skus_unicos.get_indexer(skus)]
+    df_stock_suc = pd.DataFrame(valores, columns=[f"{suc}" for suc in sucursales])
+    return pd.concat([df_matrix, df_stock_suc], axis=1)
+
+@cache_db.cacheado("productos", "variantes", "inventario", "sucursales")
 def obtener_datos_matrix():
     conn = get_db_connection()
     try:
         sql_prod = "SELECT nombre, costo, precio FROM productos WHERE activo = 1 ORDER BY nombre"
         df_base = pd.read_sql(sql_prod, conn)
         
-        sql_stock = "SELECT producto_nombre, variante, sucursal_nombre, cantidad FROM inventario"
+        # Los joins son por claves enteras; los nombres solo se usan para mostrar
+        sql_stock = """
+            SELECT p.nombre AS producto_nombre, COALESCE(v.nombre_variante, '') AS variante, s.nombre AS sucursal_nombre, i.cantidad
+            FROM inventario i
+            JOIN productos p ON p.id = i.producto_id
+            JOIN sucursales s ON s.id = i.sucursal_id
+            LEFT JOIN variantes v ON v.id = i.variante_id
+            WHERE p.activo = 1
+        """
         df_stock = pd.read_sql(sql_stock, conn)
         
         df_suc = pd.read_sql("SELECT nombre FROM sucursales ORDER BY nombre", conn)
@@ -113,69 +534,184 @@ def obtener_datos_matrix():
 
         if df_base.empty: return pd.DataFrame(), sucursales
 
-        df_vars = pd.read_sql("SELECT producto_nombre, nombre_variante FROM variantes", conn)
-        
-        lista_skus = []
-        for _, prod in df_base.iterrows():
-            nombre = prod['nombre']
-            variantes_prod = df_vars[df_vars['producto_nombre'] == nombre]['nombre_variante'].tolist()
-            
-            if not variantes_prod:
-                lista_skus.append({'Producto': nombre, 'Variante': '', 'Costo': prod['costo'], 'Precio': prod['precio']})
-            else:
-                for v in variantes_prod:
-                    lista_skus.append({'Producto': nombre, 'Variante': v, 'Costo': prod['costo'], 'Precio': prod['precio']})
-        
-        df_matrix = pd.DataFrame(lista_skus)
-        
-        if not df_stock.empty and not df_matrix.empty:
-            df_stock['variante'] = df_stock['variante'].fillna('')
-            for suc in sucursales:
-                col_name = f"{suc}"
-                df_matrix[col_name] = 0
-                stock_suc = df_stock[df_stock['sucursal_nombre'] == suc]
-                stock_map = stock_suc.set_index(['producto_nombre', 'variante'])['cantidad'].to_dict()
-                df_matrix[col_name] = df_matrix.apply(lambda row: stock_map.get((row['Producto'], row['Variante']), 0), axis=1)
+        df_vars = pd.read_sql("SELECT p.nombre AS producto_nombre, v.nombre_variante FROM variantes v JOIN productos p ON p.id = v.producto_id WHERE p.activo = 1 ORDER BY v.producto_id, v.nombre_variante", conn)
+        df_matrix = construir_matriz(df_base, df_vars, df_stock, sucursales)
 
         return df_matrix, sucursales
     except Exception as e:
+        cache_db.no_cachear()
         return pd.DataFrame(), []
     finally:
         conn.close()
 
-def guardar_cambios_masivos(df_nuevo, sucursales):
+def _valor_py(x):
+    # numpy -> tipos nativos (mysql.connector no convierte numpy.int64)
+    return x.item() if hasattr(x, 'item') else x
+
+def calcular_cambios_matriz(df_original, df_nuevo, sucursales):
+    """
+    Compara la matriz editada contra la cargada y devuelve solo lo que cambió:
+    - precios: [(costo, precio, producto)] una entrada por producto modificado
+    - stock: [(producto, sucursal, variante, cantidad)] una entrada por celda modificada
+    Las filas se alinean por (Producto, Variante).
+    """
+    claves = ['Producto', 'Variante']
+    orig = df_original.assign(Variante=df_original['Variante'].fillna('')).set_index(claves)
+    nuevo = df_nuevo.assign(Variante=df_nuevo['Variante'].fillna('')).set_index(claves)
+    orig = orig.reindex(nuevo.index)
+
+    def distintos(col):
+        a, b = nuevo[col], orig[col]
+        return (a != b) & ~(a.isna() & b.isna())
+
+    precios = {}
+    cambio_precio = distintos('Costo') | distintos('Precio')
+    for (prod, _), fila in nuevo.loc[cambio_precio, ['Costo', 'Precio']].iterrows():
+        # Costo y precio son del producto: si se tocaron varias variantes, gana la última fila
+        precios[prod] = (_valor_py(fila['Costo']), _valor_py(fila['Precio']), prod)
+
+    stock = []
+    for suc in sucursales:
+        cambiadas = distintos(suc) & nuevo[suc].notna()
+        for (prod, var), cant in nuevo.loc[cambiadas, suc].items():
+            stock.append((prod, suc, var, int(cant)))
+
+    return list(precios.values()), stock
+
+def guardar_cambios_masivos(df_nuevo, sucursales, df_original):
+    """
+    Guarda solo las celdas que cambiaron respecto de df_original (la matriz que se mostró),
+    en lotes y en una única transacción.
+    Devuelve (True, filas_actualizadas) o (False, mensaje de error).
+    """
+    precios, stock = calcular_cambios_matriz(df_original, df_nuevo, sucursales)
+    if not precios and not stock:
+        return True, 0
+
     conn = get_db_connection(); cursor = conn.cursor()
     try:
-        for index, row in df_nuevo.iterrows():
-            prod = row['Producto']
-            var = row['Variante'] if row['Variante'] else ""
-            nuevo_costo = row['Costo']
-            nuevo_precio = row['Precio']
-            
-            cursor.execute("UPDATE productos SET costo = %s, precio = %s WHERE nombre = %s", (nuevo_costo, nuevo_precio, prod))
-            
-            for suc in sucursales:
-                cantidad = int(row[suc])
-                sql_stock = "INSERT INTO inventario (producto_nombre, sucursal_nombre, variante, cantidad) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE cantidad = %s"
-                cursor.execute(sql_stock, (prod, suc, var, cantidad, cantidad))
-        conn.commit(); return True
-    except: return False
+        if precios:
+            filas = [(costo, precio, _ids(prod, '', cursor=cursor)[0]) for costo, precio, prod in precios]
+            cursor.executemany("UPDATE productos SET costo = %s, precio = %s WHERE id = %s", filas)
+        if stock:
+            filas = []
+            for prod, suc, var, cant in stock:
+                id_p, id_v, id_s = _ids(prod, var, suc, cursor=cursor)
+                filas.append((id_p, id_s, id_v, cant))
+            # El editor escribe cantidades absolutas: al libro va la diferencia con lo que había
+            # (leído con lock, así nadie lo cambia entre la lectura y la escritura)
+            cursor.execute(
+                "SELECT producto_id, sucursal_id, variante_id, cantidad FROM inventario WHERE (producto_id, sucursal_id, variante_id) IN ({}) FOR UPDATE".format(
+                    ", ".join(["(%s, %s, %s)"] * len(filas))),
+                [x for f in filas for x in f[:3]],
+            )
+            antes = {(id_p, id_s, id_v): c for id_p, id_s, id_v, c in cursor.fetchall()}
+            # executemany agrupa los INSERT en una sola sentencia multi-fila
+            sql_stock = "INSERT INTO inventario (producto_id, sucursal_id, variante_id, cantidad) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE cantidad = VALUES(cantidad)"
+            cursor.executemany(sql_stock, filas)
+            _anotar_stock(cursor, [f[:3] + (f[3] - antes.get(f[:3], 0),) for f in filas], "editor")
+        conn.commit()
+        cache_db.invalidar(*(["productos"] if precios else []) + (["inventario"] if stock else []))
+        return True, len(precios) + len(stock)
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally: conn.close()
+
+# --- IMPORTACIÓN MASIVA (ver importador.py) ---
+def registrar_compras_lote(filas):
+    """
+    Inserta un bloque de compras ya validadas en una sola transacción, con sentencias multi-fila.
+    filas: tuplas (fecha o None, producto_id, variante_id, sucursal_id, producto, variante,
+                   cantidad, costo_total, proveedor, metodo_pago, ubicacion, notas).
+    Stock, resumen diario y cuentas se actualizan agregados (una fila por SKU / día / cuenta).
+    Devuelve (True, filas insertadas) o (False, mensaje).
+    """
+    if not filas: return True, 0
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT NOW()")
+        ahora = cursor.fetchone()[0]
+        filas = [(f or ahora,) + tuple(resto) for f, *resto in filas]
+        cursor.executemany(
+            "INSERT INTO compras (fecha, producto_id, variante_id, sucursal_id, producto, variante, cantidad, costo_total, proveedor, metodo_pago, ubicacion, notas) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            filas,
+        )
+        stock, resumen, cuentas = {}, {}, {}
+        for fecha, id_p, id_v, id_s, _, _, cant, costo, _, metodo, _, _ in filas:
+            stock[(id_p, id_s, id_v)] = stock.get((id_p, id_s, id_v), 0) + cant
+            clave = (fecha.date(), id_s, id_p, id_v, metodo or '')
+            u, c, n = resumen.get(clave, (0, 0.0, 0))
+            resumen[clave] = (u + cant, c + costo, n + 1)
+            cuentas[metodo] = cuentas.get(metodo, 0.0) + costo
+        cursor.executemany(
+            "INSERT INTO inventario (producto_id, sucursal_id, variante_id, cantidad) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)",
+            [clave + (cant,) for clave, cant in stock.items()],
+        )
+        _anotar_stock(cursor, [clave + (cant,) for clave, cant in stock.items()], "importación")
+        cursor.executemany("""
+            INSERT INTO resumen_diario (dia, sucursal_id, producto_id, variante_id, metodo_pago, unidades_compradas, costo, compras)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE unidades_compradas = unidades_compradas + VALUES(unidades_compradas),
+                                    costo = costo + VALUES(costo), compras = compras + VALUES(compras)
+        """, [clave + valores for clave, valores in resumen.items()])
+        for metodo, total in cuentas.items():
+            _mover_cuenta(cursor, metodo, -round(total, 2), "importación")
+        conn.commit(); cache_db.invalidar("inventario", "compras", "resumen_diario", "cuentas")
+        return True, len(filas)
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally: conn.close()
+
+def guardar_catalogo_lote(productos, variantes):
+    """
+    Alta / actualización masiva del catálogo en una transacción.
+    productos: tuplas (nombre, costo, precio): si el nombre existe se actualizan precios y se reactiva.
+    variantes: tuplas (nombre_producto, nombre_variante); las repetidas se ignoran.
+    Devuelve (True, (productos, variantes_nuevas)) o (False, mensaje).
+    """
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        if productos:
+            cursor.executemany(
+                "INSERT INTO productos (nombre, costo, precio, activo) VALUES (%s, %s, %s, 1) ON DUPLICATE KEY UPDATE costo = VALUES(costo), precio = VALUES(precio), activo = 1",
+                productos,
+            )
+        nuevas = 0
+        if variantes:
+            nombres = sorted({p for p, _ in variantes})
+            marcas = ", ".join(["%s"] * len(nombres))
+            cursor.execute(f"SELECT nombre, id FROM productos WHERE nombre IN ({marcas})", nombres)
+            ids = dict(cursor.fetchall())
+            filas = [(p, ids[p], v) for p, v in variantes if p in ids]
+            cursor.executemany("INSERT IGNORE INTO variantes (producto_nombre, producto_id, nombre_variante) VALUES (%s, %s, %s)", filas)
+            nuevas = cursor.rowcount
+        conn.commit(); cache_db.invalidar("productos", "variantes")
+        return True, (len(productos), nuevas)
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
     finally: conn.close()
 
 # --- 4. FUNCIONES AUXILIARES FALTANTES (Error AttributeError) ---
+@cache_db.cacheado("sucursales", "productos")
 def obtener_listas_auxiliares():
     conn = get_db_connection()
     try:
         s = pd.read_sql("SELECT nombre FROM sucursales", conn)['nombre'].tolist()
         p = pd.read_sql("SELECT nombre FROM productos WHERE activo = 1", conn)['nombre'].tolist()
         return s, p
-    except: return [], []
+    except:
+        cache_db.no_cachear()
+        return [], []
     finally: conn.close()
 
+@cache_db.cacheado("variantes")
 def obtener_variantes_de_producto(producto):
     conn = get_db_connection(); cursor = conn.cursor()
     try:
-        cursor.execute("SELECT nombre_variante FROM variantes WHERE producto_nombre = %s", (producto,))
+        cursor.execute("SELECT v.nombre_variante FROM variantes v JOIN productos p ON p.id = v.producto_id WHERE p.nombre = %s ORDER BY v.nombre_variante", (producto,))
         res = cursor.fetchall()
         return [r[0] for r in res] if res else []
     finally: conn.close()
@@ -183,20 +719,21 @@ def obtener_variantes_de_producto(producto):
 def renombrar_variante(prod, old_var, new_var):
     conn = get_db_connection(); cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE variantes SET nombre_variante=%s WHERE producto_nombre=%s AND nombre_variante=%s", (new_var, prod, old_var))
-        cursor.execute("UPDATE inventario SET variante=%s WHERE producto_nombre=%s AND variante=%s", (new_var, prod, old_var))
-        cursor.execute("UPDATE ventas SET variante=%s WHERE producto=%s AND variante=%s", (new_var, prod, old_var))
-        cursor.execute("UPDATE compras SET variante=%s WHERE producto=%s AND variante=%s", (new_var, prod, old_var))
-        conn.commit(); return True, "Ok"
+        # Inventario e historiales apuntan a variante_id: alcanza con renombrar la fila de la variante
+        _, id_v, _ = _ids(prod, old_var, cursor=cursor)
+        cursor.execute("UPDATE variantes SET nombre_variante=%s WHERE id=%s", (new_var, id_v))
+        conn.commit(); cache_db.invalidar("variantes"); return True, "Ok"
     except Exception as e: return False, str(e)
     finally: conn.close()
 
 def mover_stock_entre_variantes(prod, suc, var_origen, var_destino, cantidad):
     conn = get_db_connection(); cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE inventario SET cantidad = cantidad - %s WHERE producto_nombre=%s AND sucursal_nombre=%s AND variante=%s", (cantidad, prod, suc, var_origen))
-        cursor.execute("INSERT INTO inventario (producto_nombre, sucursal_nombre, variante, cantidad) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE cantidad = cantidad + %s", (prod, suc, var_destino, cantidad, cantidad))
-        conn.commit(); return True
+        id_p, id_origen, id_s = _ids(prod, var_origen, suc, cursor=cursor)
+        _, id_destino, _ = _ids(prod, var_destino, cursor=cursor)
+        _ajustar_stock(cursor, id_p, id_s, id_origen, -cantidad, "traspaso")
+        _ajustar_stock(cursor, id_p, id_s, id_destino, cantidad, "traspaso")
+        conn.commit(); cache_db.invalidar("inventario"); return True
     except: return False
     finally: conn.close()
 
@@ -204,7 +741,7 @@ def borrado_logico_producto(nombre_producto):
     conn = get_db_connection(); cursor = conn.cursor()
     try:
         cursor.execute("UPDATE productos SET activo = 0 WHERE nombre = %s", (nombre_producto,))
-        conn.commit(); return True
+        conn.commit(); cache_db.invalidar("productos"); return True
     except: return False
     finally: conn.close()
 
@@ -212,25 +749,48 @@ def crear_producto(nombre, costo, precio):
     conn = get_db_connection(); cursor=conn.cursor()
     try: 
         cursor.execute("INSERT INTO productos (nombre, costo, precio, activo) VALUES (%s, %s, %s, 1)", (nombre, costo, precio))
-        conn.commit(); return True
+        conn.commit(); cache_db.invalidar("productos"); return True
     except: return False
     finally: conn.close()
 
 def crear_variante(prod, var):
     conn = get_db_connection(); cursor=conn.cursor()
     try: 
-        cursor.execute("INSERT INTO variantes (producto_nombre, nombre_variante) VALUES (%s, %s)", (prod, var))
-        conn.commit(); return True, "Ok"
+        cursor.execute("INSERT INTO variantes (producto_nombre, producto_id, nombre_variante) SELECT nombre, id, %s FROM productos WHERE nombre = %s", (var, prod))
+        if cursor.rowcount == 0: return False, "Producto inexistente"
+        conn.commit(); cache_db.invalidar("variantes"); return True, "Ok"
     except: return False, "Error"
     finally: conn.close()
 
+@cache_db.cacheado("productos", "variantes")
 def obtener_catalogo_venta():
     conn = get_db_connection()
     try:
-        return pd.read_sql("SELECT p.nombre, p.precio, v.nombre_variante FROM productos p LEFT JOIN variantes v ON p.nombre = v.producto_nombre WHERE p.activo = 1 ORDER BY p.nombre, v.nombre_variante", conn)
-    except: return pd.DataFrame()
+        return pd.read_sql("SELECT p.nombre, p.precio, v.nombre_variante FROM productos p LEFT JOIN variantes v ON v.producto_id = p.id WHERE p.activo = 1 ORDER BY p.nombre, v.nombre_variante", conn)
+    except:
+        cache_db.no_cachear()
+        return pd.DataFrame()
     finally: conn.close()
 
+@cache_db.cacheado("productos", "variantes")
+def obtener_indice_catalogo():
+    """
+    Índice de búsqueda del catálogo de venta (etiquetas "Producto | Sabor").
+    Se arma una sola vez por versión de productos/variantes y lo comparten todas las sesiones.
+    """
+    df = obtener_catalogo_venta()
+    if df.empty:
+        # Vacío puede ser un error de lectura: no dejarlo fijo hasta el próximo cambio de catálogo
+        cache_db.no_cachear()
+        return IndiceCatalogo([])
+    variante = df['nombre_variante'].fillna('')
+    etiquetas = (df['nombre'] + np.where(variante != '', ' | ' + variante, '')).tolist()
+    datos = {
+        e: {"base": n, "variante": v, "precio": float(p)}
+        for e, n, v, p in zip(etiquetas, df['nombre'], variante, df['precio'])
+    }
+    return IndiceCatalogo(etiquetas, datos)
+
 # --- 5. CLIENTES Y FINANZAS (Recuperados) ---
 def obtener_clientes_metricas():
     conn = get_db_connection()
@@ -241,7 +801,7 @@ def obtener_clientes_metricas():
 
 def crear_cliente(n, u):
     conn = get_db_connection(); cursor = conn.cursor()
-    try: cursor.execute("INSERT INTO clientes (nombre, ubicacion) VALUES (%s, %s)", (n, u)); conn.commit(); return True
+    try: cursor.execute("INSERT INTO clientes (nombre, ubicacion) VALUES (%s, %s)", (n, u)); conn.commit(); cache_db.invalidar("clientes"); return True
     except: return False
     finally: conn.close()
 
@@ -253,69 +813,337 @@ def obtener_lista_clientes_simple():
 
 def actualizar_cliente(id_c, n, u):
     conn = get_db_connection(); cursor = conn.cursor()
-    try: cursor.execute("UPDATE clientes SET nombre=%s, ubicacion=%s WHERE id=%s", (n, u, id_c)); conn.commit(); return True
+    try: cursor.execute("UPDATE clientes SET nombre=%s, ubicacion=%s WHERE id=%s", (n, u, id_c)); conn.commit(); cache_db.invalidar("clientes"); return True
     except: return False
     finally: conn.close()
 
 def eliminar_cliente(id_c):
     conn = get_db_connection(); cursor = conn.cursor()
     try:
+        cursor.execute("INSERT INTO cambios_historial (tabla, fila_id) SELECT 'ventas', id FROM ventas WHERE cliente_id=%s", (id_c,))
         cursor.execute("UPDATE ventas SET cliente_id=NULL WHERE cliente_id=%s", (id_c,))
         cursor.execute("DELETE FROM clientes WHERE id=%s", (id_c,))
-        conn.commit(); return True
+        conn.commit(); cache_db.invalidar("clientes", "ventas"); return True
     except: return False
     finally: conn.close()
 
 def obtener_resumen_finanzas():
     conn = get_db_connection()
     try:
-        df_v = pd.read_sql("SELECT metodo_pago, SUM(total) as total FROM ventas GROUP BY metodo_pago", conn)
-        df_c = pd.read_sql("SELECT metodo_pago, SUM(costo_total) as total FROM compras GROUP BY metodo_pago", conn)
-        df_s = pd.read_sql("SELECT cuenta, monto FROM saldos_iniciales", conn)
-        return df_v, df_c, df_s
-    except: return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        # Totales desde el resumen diario (crece por días, no por operaciones)
+        df_v = pd.read_sql("SELECT metodo_pago, SUM(ingresos) as total FROM resumen_diario WHERE ventas <> 0 GROUP BY metodo_pago", conn)
+        df_c = pd.read_sql("SELECT metodo_pago, SUM(costo) as total FROM resumen_diario WHERE compras <> 0 GROUP BY metodo_pago", conn)
+        return df_v, df_c
+    except: return pd.DataFrame(), pd.DataFrame()
     finally: conn.close()
 
-def actualizar_saldo_inicial(c, m):
+# --- CUENTAS (Caja / Banco) ---
+# `cuentas` guarda el saldo actual de cada medio de pago; `movimientos_cuenta` es el
+# libro: cada venta, compra, corrección o ajuste agrega una fila con el saldo resultante.
+# Ventas suman, compras restan. El saldo a una fecha es el de su último movimiento anterior.
+def _mover_cuenta(cursor, cuenta, monto, origen, referencia_id=None):
+    if not cuenta or not monto: return
+    cursor.execute("UPDATE cuentas SET saldo = saldo + %s WHERE nombre = %s", (monto, cuenta))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO cuentas (nombre, saldo) VALUES (%s, %s)", (cuenta, monto))
+    cursor.execute("""
+        INSERT INTO movimientos_cuenta (cuenta_id, fecha, monto, saldo, origen, referencia_id)
+        SELECT id, NOW(), %s, saldo, %s, %s FROM cuentas WHERE nombre = %s
+    """, (monto, origen, referencia_id, cuenta))
+
+def _corregir_cuenta(cursor, viejo, nuevo, origen, referencia_id):
+    """viejo / nuevo = (cuenta, monto). Un solo movimiento si la cuenta no cambió, dos si cambió."""
+    (c_old, m_old), (c_new, m_new) = viejo, nuevo
+    if c_old == c_new:
+        _mover_cuenta(cursor, c_new, float(m_new) - float(m_old), origen, referencia_id)
+    else:
+        _mover_cuenta(cursor, c_old, -float(m_old), origen, referencia_id)
+        _mover_cuenta(cursor, c_new, float(m_new), origen, referencia_id)
+
+@cache_db.cacheado("cuentas")
+def obtener_saldos_cuentas():
+    conn = get_db_connection()
+    try: return pd.read_sql("SELECT nombre AS cuenta, saldo FROM cuentas ORDER BY nombre", conn)
+    except:
+        cache_db.no_cachear()
+        return pd.DataFrame(columns=['cuenta', 'saldo'])
+    finally: conn.close()
+
+@cache_db.cacheado("cuentas")
+def obtener_saldos_al(dia):
+    """Saldo de cada cuenta al cierre de `dia` (una búsqueda por índice por cuenta)."""
+    hasta = datetime.combine(dia + timedelta(days=1), datetime.min.time())
+    conn = get_db_connection()
+    try:
+        return pd.read_sql("""
+            SELECT c.nombre AS cuenta,
+                   COALESCE((SELECT m.saldo FROM movimientos_cuenta m
+                             WHERE m.cuenta_id = c.id AND m.fecha < %s
+                             ORDER BY m.fecha DESC, m.id DESC LIMIT 1), 0) AS saldo
+            FROM cuentas c ORDER BY c.nombre
+        """, conn, params=(hasta,))
+    except:
+        cache_db.no_cachear()
+        return pd.DataFrame(columns=['cuenta', 'saldo'])
+    finally: conn.close()
+
+def ajustar_saldo_cuenta(cuenta, saldo_real):
+    """Recalibra una cuenta al monto real: registra la diferencia como movimiento de ajuste."""
     conn = get_db_connection(); cursor = conn.cursor()
-    try: cursor.execute("UPDATE saldos_iniciales SET monto=%s WHERE cuenta=%s", (m, c)); conn.commit(); return True
-    except: return False
+    try:
+        cursor.execute("SELECT saldo FROM cuentas WHERE nombre=%s FOR UPDATE", (cuenta,))
+        row = cursor.fetchone()
+        actual = float(row[0]) if row else 0.0
+        _mover_cuenta(cursor, cuenta, round(float(saldo_real) - actual, 2), "ajuste")
+        conn.commit(); cache_db.invalidar("cuentas"); return True
+    except:
+        conn.rollback(); return False
     finally: conn.close()
 
 # --- 6. TRANSACCIONES ---
+# resumen_diario acumula ventas y compras por (día, sucursal, producto, variante, método de pago).
+# Cada alta/edición/baja lo ajusta en la misma transacción leyendo la propia fila:
+# signo +1 después de insertar o editar, -1 antes de editar o borrar.
+def _resumen_venta(cursor, id_venta, signo):
+    cursor.execute("""
+        INSERT INTO resumen_diario (dia, sucursal_id, producto_id, variante_id, metodo_pago, unidades_vendidas, ingresos, ventas)
+        SELECT DATE(fecha), COALESCE(sucursal_id, 0), COALESCE(producto_id, 0), variante_id, COALESCE(metodo_pago, ''), %s * cantidad, %s * total, %s
+        FROM ventas WHERE id = %s
+        ON DUPLICATE KEY UPDATE unidades_vendidas = unidades_vendidas + VALUES(unidades_vendidas),
+                                ingresos = ingresos + VALUES(ingresos), ventas = ventas + VALUES(ventas)
+    """, (signo, signo, signo, id_venta))
+
+def _resumen_compra(cursor, id_compra, signo):
+    cursor.execute("""
+        INSERT INTO resumen_diario (dia, sucursal_id, producto_id, variante_id, metodo_pago, unidades_compradas, costo, compras)
+        SELECT DATE(fecha), COALESCE(sucursal_id, 0), COALESCE(producto_id, 0), variante_id, COALESCE(metodo_pago, ''), %s * cantidad, %s * costo_total, %s
+        FROM compras WHERE id = %s
+        ON DUPLICATE KEY UPDATE unidades_compradas = unidades_compradas + VALUES(unidades_compradas),
+                                costo = costo + VALUES(costo), compras = compras + VALUES(compras)
+    """, (signo, signo, signo, id_compra))
+
+def _registrar_cambio(cursor, tabla, fila_id):
+    """Anota una venta / compra editada o borrada, para el refresco incremental de analitica.py."""
+    cursor.execute("INSERT INTO cambios_historial (tabla, fila_id) VALUES (%s, %s)", (tabla, fila_id))
+
+def reconstruir_resumen_diario():
+    """Regenera resumen_diario desde el historial completo (en una sola transacción)."""
+    import migraciones
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        migraciones.llenar_resumen_diario(cursor)
+        cursor.execute("SELECT COUNT(*) FROM resumen_diario")
+        filas = cursor.fetchone()[0]
+        conn.commit(); cache_db.invalidar("resumen_diario")
+        return True, filas
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally: conn.close()
+
 def registrar_venta(producto, variante, cantidad, precio, metodo, ubicacion, notas, cliente_id):
-    conn = get_db_connection(); cursor=conn.cursor()
+    # Una venta suelta es un carrito de una línea
+    ok, _ = registrar_venta_carrito([{"producto": producto, "variante": variante, "cantidad": cantidad, "precio": precio}],
+                                    metodo, ubicacion, notas, cliente_id)
+    return ok
+
+def registrar_venta_carrito(items, metodo, ubicacion, notas, cliente_id):
+    """
+    Registra una venta de varias líneas (mismo cliente, sucursal y medio de pago) en una sola transacción.
+    items: lista de dicts {producto, variante, cantidad, precio} con el precio unitario de cada línea.
+    El stock se descuenta con una sentencia condicionada (sin chequeo previo aparte ni locks de tabla):
+    si alguna línea no alcanza, se deshace todo.
+    Devuelve (True, {etiqueta: stock que queda}) o (False, mensaje).
+    """
+    if not items: return False, "El carrito está vacío"
+    conn = get_db_connection(); cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE inventario SET cantidad = cantidad - %s WHERE producto_nombre=%s AND variante=%s AND sucursal_nombre=%s", (cantidad, producto, variante, ubicacion))
-        cursor.execute("INSERT INTO ventas (fecha, producto, variante, cantidad, precio_unitario, total, metodo_pago, ubicacion, notas, cliente_id) VALUES (NOW(), %s, %s, %s, %s, %s, %s, %s, %s, %s)", (producto, variante, cantidad, precio, precio*cantidad, metodo, ubicacion, notas, cliente_id))
-        conn.commit(); return True
-    except: return False
+        ok, res = _vender(cursor, conn.rollback, items, metodo, ubicacion, notas, cliente_id)
+        if not ok:
+            conn.rollback()
+            return False, res
+        conn.commit(); cache_db.invalidar("inventario", "ventas", "resumen_diario", "cuentas")
+        return True, res
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
     finally: conn.close()
 
+def _vender(cursor, deshacer, items, metodo, ubicacion, notas, cliente_id, fecha=None):
+    """
+    Cuerpo de registrar_venta_carrito sin commit: lo usa también aplicar_operaciones (diario local).
+    `deshacer` vuelve atrás lo escrito si falta stock (rollback, o ROLLBACK TO SAVEPOINT dentro de un lote).
+    `fecha`: la de la venta si se registró antes (diario local); si no, NOW() del servidor.
+    Devuelve (True, {etiqueta: stock que queda}) o (False, mensaje).
+    """
+    lineas, pedido, etiquetas = [], {}, {}
+    for it in items:
+        variante = it.get("variante") or ""
+        id_p, id_v, id_s = _ids(it["producto"], variante, ubicacion, cursor=cursor)
+        cant = int(it["cantidad"])
+        if cant <= 0: return False, f"Cantidad inválida para {it['producto']}"
+        lineas.append((id_p, id_v, it["producto"], variante, cant, float(it["precio"])))
+        # Un mismo SKU puede aparecer en varias líneas: se valida la suma
+        pedido[(id_p, id_v)] = pedido.get((id_p, id_v), 0) + cant
+        etiquetas[(id_p, id_v)] = f"{it['producto']} | {variante}" if variante else it["producto"]
+
+    # 1. Descontar con guarda (cantidad >= pedido): si algún SKU no alcanza, no se vende nada
+    claves = [(id_p, id_s, id_v) for id_p, id_v in pedido]
+    sql_stock = "SELECT producto_id, variante_id, cantidad FROM inventario WHERE (producto_id, sucursal_id, variante_id) IN ({})".format(
+        ", ".join(["(%s, %s, %s)"] * len(claves)))
+    params_stock = [x for clave in claves for x in clave]
+    if len(pedido) == 1:
+        (id_p, id_v), cant = next(iter(pedido.items()))
+        quedan = _descontar_stock(cursor, id_p, id_s, id_v, cant)
+        completo = quedan is not None
+        restantes = {etiquetas[(id_p, id_v)]: quedan}
+    else:
+        filas = " UNION ALL ".join(["SELECT %s AS producto_id, %s AS variante_id, %s AS cantidad"] * len(pedido))
+        cursor.execute(f"""
+            UPDATE inventario i JOIN ({filas}) x ON i.producto_id = x.producto_id AND i.variante_id = x.variante_id
+            SET i.cantidad = i.cantidad - x.cantidad
+            WHERE i.sucursal_id = %s AND i.cantidad >= x.cantidad
+        """, [x for (id_p, id_v), cant in pedido.items() for x in (id_p, id_v, cant)] + [id_s])
+        completo = cursor.rowcount == len(pedido)
+        if completo:
+            # Las filas descontadas quedan bloqueadas hasta el commit: esta lectura es la definitiva
+            cursor.execute(sql_stock, params_stock)
+            stock = {(id_p, id_v): c for id_p, id_v, c in cursor.fetchall()}
+            restantes = {etiquetas[sku]: stock[sku] for sku in pedido}
+    if not completo:
+        deshacer()
+        cursor.execute(sql_stock, params_stock)
+        stock = {(id_p, id_v): c for id_p, id_v, c in cursor.fetchall()}
+        faltan = [f"{etiquetas[sku]} (hay {stock.get(sku, 0)} u., se piden {cant})"
+                  for sku, cant in pedido.items() if stock.get(sku, 0) < cant]
+        return False, "Stock insuficiente: " + ", ".join(faltan or [etiquetas[sku] for sku in pedido])
+
+    # 2. Líneas de venta (executemany -> un solo INSERT multi-fila), todas con la misma fecha
+    if fecha is None:
+        cursor.execute("SELECT NOW()")
+        fecha = cursor.fetchone()[0]
+    # El id de la primera línea es el número de carrito (ventas.carrito_id) de todas
+    sql_venta = "INSERT INTO ventas (carrito_id, fecha, producto_id, variante_id, sucursal_id, producto, variante, cantidad, precio_unitario, total, metodo_pago, ubicacion, notas, cliente_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    filas = [(fecha, id_p, id_v, id_s, prod, var, cant, precio, precio * cant, metodo, ubicacion, notas, cliente_id)
+             for id_p, id_v, prod, var, cant, precio in lineas]
+    cursor.execute(sql_venta, (None,) + filas[0])
+    primera = cursor.lastrowid
+    cursor.execute("UPDATE ventas SET carrito_id = id WHERE id = %s", (primera,))
+    if len(filas) > 1:
+        cursor.executemany(sql_venta, [(primera,) + f for f in filas[1:]])
+    _anotar_stock(cursor, [(id_p, id_s, id_v, -cant) for (id_p, id_v), cant in pedido.items()], "venta", primera)
+
+    # 3. Resumen diario y cuenta, agregados por SKU / por carrito
+    resumen = {}
+    for id_p, id_v, _, _, cant, precio in lineas:
+        u, t, n = resumen.get((id_p, id_v), (0, 0.0, 0))
+        resumen[(id_p, id_v)] = (u + cant, t + precio * cant, n + 1)
+    cursor.executemany("""
+        INSERT INTO resumen_diario (dia, sucursal_id, producto_id, variante_id, metodo_pago, unidades_vendidas, ingresos, ventas)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE unidades_vendidas = unidades_vendidas + VALUES(unidades_vendidas),
+                                ingresos = ingresos + VALUES(ingresos), ventas = ventas + VALUES(ventas)
+    """, [(fecha.date(), id_s, id_p, id_v, metodo or '', u, t, n) for (id_p, id_v), (u, t, n) in resumen.items()])
+    _mover_cuenta(cursor, metodo, sum(precio * cant for *_, cant, precio in lineas), "venta", primera)
+    return True, restantes
+
 def registrar_compra(producto, variante, cantidad, costo, proveedor, metodo, ubicacion, notas):
     conn = get_db_connection(); cursor=conn.cursor()
     try:
-        cursor.execute("INSERT INTO inventario (producto_nombre, sucursal_nombre, variante, cantidad) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE cantidad = cantidad + %s", (producto, ubicacion, variante, cantidad, cantidad))
-        cursor.execute("INSERT INTO compras (fecha, producto, variante, cantidad, costo_total, proveedor, metodo_pago, ubicacion, notas) VALUES (NOW(), %s, %s, %s, %s, %s, %s, %s, %s)", (producto, variante, cantidad, costo, proveedor, metodo, ubicacion, notas))
-        conn.commit(); return True
+        _comprar(cursor, producto, variante, cantidad, costo, proveedor, metodo, ubicacion, notas)
+        conn.commit(); cache_db.invalidar("inventario", "compras", "resumen_diario", "cuentas"); return True
     except: return False
     finally: conn.close()
 
-def eliminar_venta(id_v, d):
+def _comprar(cursor, producto, variante, cantidad, costo, proveedor, metodo, ubicacion, notas, fecha=None):
+    """Cuerpo de registrar_compra sin commit (ver _vender). Devuelve el id de la compra."""
+    id_p, id_v, id_s = _ids(producto, variante, ubicacion, cursor=cursor)
+    cursor.execute("INSERT INTO compras (fecha, producto_id, variante_id, sucursal_id, producto, variante, cantidad, costo_total, proveedor, metodo_pago, ubicacion, notas) VALUES (COALESCE(%s, NOW()), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", (fecha, id_p, id_v, id_s, producto, variante, cantidad, costo, proveedor, metodo, ubicacion, notas))
+    id_compra = cursor.lastrowid
+    _ajustar_stock(cursor, id_p, id_s, id_v, cantidad, "compra", id_compra)
+    _resumen_compra(cursor, id_compra, 1)
+    _mover_cuenta(cursor, metodo, -costo, "compra", id_compra)
+    return id_compra
+
+# --- DIARIO LOCAL (ver diario_local.py) ---
+# Errores propios de la operación (no de la red): la operación se rechaza y el lote sigue.
+# Cualquier otro error (conexión caída, lock wait timeout) corta el lote y se reintenta entero.
+_ERRORES_INTEGRIDAD = (mysql.connector.errors.IntegrityError, sqlite3.IntegrityError)
+_ERRORES_DE_DATOS = (ValueError, KeyError, mysql.connector.errors.DataError) + _ERRORES_INTEGRIDAD
+
+def aplicar_operaciones(operaciones):
+    """
+    Aplica en orden un lote de ventas / compras anotadas en el diario local, en UNA transacción.
+    operaciones: dicts {uid, tipo ("venta" | "compra"), datos (argumentos), fecha (datetime del alta)}.
+
+    Cada operación corre dentro de un SAVEPOINT y deja su uid en operaciones_aplicadas: si el
+    uid ya estaba (el lote se aplicó pero el diario no llegó a marcarlo), no se aplica de nuevo.
+    Devuelve [(uid, ok, mensaje)]; ok=False es un rechazo definitivo (ej. stock insuficiente).
+    Si falla la conexión, lanza la excepción y no queda nada aplicado.
+    """
     conn = get_db_connection(); cursor = conn.cursor()
+    resultados = []
     try:
-        cursor.execute("UPDATE inventario SET cantidad = cantidad + %s WHERE producto_nombre=%s AND variante=%s AND sucursal_nombre=%s", (int(d['CANTIDAD']), str(d['PRODUCTO']), str(d.get('VARIANTE','')), str(d['UBICACION'])))
+        for op in operaciones:
+            cursor.execute("SAVEPOINT op")
+            try:
+                cursor.execute("INSERT INTO operaciones_aplicadas (uid, tipo) VALUES (%s, %s)", (op["uid"], op["tipo"]))
+            except _ERRORES_INTEGRIDAD:
+                cursor.execute("ROLLBACK TO SAVEPOINT op")
+                resultados.append((op["uid"], True, "ya estaba aplicada"))
+                continue
+            deshacer = lambda: cursor.execute("ROLLBACK TO SAVEPOINT op")
+            try:
+                if op["tipo"] == "venta":
+                    ok, res = _vender(cursor, deshacer, fecha=op["fecha"], **op["datos"])
+                else:
+                    ok, res = True, _comprar(cursor, fecha=op["fecha"], **op["datos"])
+            except _ERRORES_DE_DATOS as e:
+                ok, res = False, str(e)
+            if ok:
+                cursor.execute("RELEASE SAVEPOINT op")
+                resultados.append((op["uid"], True, "Ok"))
+            else:
+                deshacer()
+                resultados.append((op["uid"], False, res))
+        conn.commit(); cache_db.invalidar("inventario", "ventas", "compras", "resumen_diario", "cuentas")
+        return resultados
+    except Exception:
+        conn.rollback()
+        raise
+    finally: conn.close()
+
+def eliminar_venta(id_v, d=None):
+    # `d` (la fila mostrada) ya no hace falta: el SKU se lee de la propia venta
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT producto_id, variante_id, sucursal_id, cantidad, metodo_pago, total FROM ventas WHERE id=%s FOR UPDATE", (id_v,))
+        row = cursor.fetchone()
+        if not row: return False
+        id_p, id_var, id_s, cant, metodo, total = row
+        if id_p and id_s: _ajustar_stock(cursor, id_p, id_s, id_var, cant, "venta eliminada", id_v)
+        _resumen_venta(cursor, id_v, -1)
+        _mover_cuenta(cursor, metodo, -float(total or 0), "venta eliminada", id_v)
         cursor.execute("DELETE FROM ventas WHERE id=%s", (id_v,))
-        conn.commit(); return True
+        _registrar_cambio(cursor, "ventas", id_v)
+        conn.commit(); cache_db.invalidar("inventario", "ventas", "resumen_diario", "cuentas"); return True
     except: return False
     finally: conn.close()
 
-def eliminar_compra(id_c, d):
+def eliminar_compra(id_c, d=None):
+    # `d` (la fila mostrada) ya no hace falta: el SKU se lee de la propia compra
     conn = get_db_connection(); cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE inventario SET cantidad = cantidad - %s WHERE producto_nombre=%s AND variante=%s AND sucursal_nombre=%s", (int(d['CANTIDAD']), str(d['PRODUCTO']), str(d.get('VARIANTE','')), str(d['UBICACION'])))
+        cursor.execute("SELECT producto_id, variante_id, sucursal_id, cantidad, metodo_pago, costo_total FROM compras WHERE id=%s FOR UPDATE", (id_c,))
+        row = cursor.fetchone()
+        if not row: return False
+        id_p, id_var, id_s, cant, metodo, costo = row
+        if id_p and id_s: _ajustar_stock(cursor, id_p, id_s, id_var, -cant, "compra eliminada", id_c)
+        _resumen_compra(cursor, id_c, -1)
+        _mover_cuenta(cursor, metodo, float(costo or 0), "compra eliminada", id_c)
         cursor.execute("DELETE FROM compras WHERE id=%s", (id_c,))
-        conn.commit(); return True
+        _registrar_cambio(cursor, "compras", id_c)
+        conn.commit(); cache_db.invalidar("inventario", "compras", "resumen_diario", "cuentas"); return True
     except: return False
     finally: conn.close()
 
@@ -327,32 +1155,32 @@ def obtener_venta_por_id(id_v):
 def actualizar_venta(id_v, nc, np, nm, nn):
     conn = get_db_connection(); cursor = conn.cursor()
     try:
-        # CORRECCIÓN: Cambiamos 'sucursal_nombre' por 'ubicacion' que es el nombre real en la tabla ventas
-        cursor.execute("SELECT producto, variante, ubicacion, cantidad FROM ventas WHERE id=%s", (id_v,))
+        cursor.execute("SELECT producto_id, variante_id, sucursal_id, cantidad, metodo_pago, total FROM ventas WHERE id=%s FOR UPDATE", (id_v,))
         row = cursor.fetchone()
         
         if not row: return False, "No existe la venta"
         
         # Datos actuales en la base de datos
-        prod_db = row[0]
-        var_db = row[1] if row[1] else ''
-        suc_db = row[2] # Aquí recibimos la ubicación correctamente
-        cant_old = row[3]
+        id_p, id_var, id_s, cant_old, met_old, tot_old = row
         
         # Calculamos la diferencia para ajustar el stock
         # Si vendí 1 y ahora pongo 3, la diferencia es +2 (tengo que restar 2 más al stock)
         # Si vendí 3 y ahora pongo 1, la diferencia es -2 (tengo que devolver 2 al stock)
         diff = nc - cant_old
         
-        # Actualizamos el inventario (Aquí sí se llama 'sucursal_nombre')
-        cursor.execute("UPDATE inventario SET cantidad = cantidad - %s WHERE producto_nombre=%s AND variante=%s AND sucursal_nombre=%s", 
-                       (diff, prod_db, var_db, suc_db))
+        # Actualizamos el inventario
+        if id_p and id_s: _ajustar_stock(cursor, id_p, id_s, id_var, -diff, "venta editada", id_v)
         
-        # Actualizamos la venta con los nuevos datos
+        # Actualizamos la venta con los nuevos datos (y el resumen: sale lo viejo, entra lo nuevo)
+        _resumen_venta(cursor, id_v, -1)
         cursor.execute("UPDATE ventas SET cantidad=%s, precio_unitario=%s, total=%s, metodo_pago=%s, notas=%s WHERE id=%s", 
                        (nc, np, nc*np, nm, nn, id_v))
+        _resumen_venta(cursor, id_v, 1)
+        _corregir_cuenta(cursor, (met_old, tot_old or 0), (nm, nc*np), "venta editada", id_v)
+        _registrar_cambio(cursor, "ventas", id_v)
         
         conn.commit()
+        cache_db.invalidar("inventario", "ventas", "resumen_diario", "cuentas")
         return True, "Ok"
     except Exception as e:
         return False, str(e)
@@ -373,15 +1201,13 @@ def actualizar_compra(id_compra, nueva_cant, nuevo_costo, nuevo_prov, nuevo_meto
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # 1. Obtener datos viejos (CORREGIDO: Usamos 'ubicacion' y quitamos 'sucursal_nombre' que no existe)
-        cursor.execute("SELECT producto, variante, ubicacion, cantidad FROM compras WHERE id = %s", (id_compra,))
+        # 1. Obtener datos viejos
+        cursor.execute("SELECT producto_id, variante_id, sucursal_id, cantidad, metodo_pago, costo_total FROM compras WHERE id = %s FOR UPDATE", (id_compra,))
         row = cursor.fetchone()
         
         if not row: return False, "Compra no encontrada"
         
-        # Desempaquetamos los 4 valores correctos
-        prod, var, suc, old_cant = row
-        var = var if var else ""
+        id_p, id_var, id_s, old_cant, old_metodo, old_costo = row
         
         # 2. Calcular diferencia de Stock (Nuevo - Viejo)
         diferencia = nueva_cant - old_cant
@@ -389,18 +1215,15 @@ def actualizar_compra(id_compra, nueva_cant, nuevo_costo, nuevo_prov, nuevo_meto
         # 3. Validación de Seguridad
         # Si estamos reduciendo la compra (ej: corregir de 10 a 5), verificar que tengamos ese stock para "devolver"
         if diferencia < 0:
-            cursor.execute("SELECT cantidad FROM inventario WHERE producto_nombre=%s AND variante=%s AND sucursal_nombre=%s", (prod, var, suc))
+            cursor.execute("SELECT cantidad FROM inventario WHERE producto_id=%s AND sucursal_id=%s AND variante_id=%s", (id_p, id_s, id_var))
             res = cursor.fetchone()
             stock_actual = res[0] if res else 0
             
             if stock_actual < abs(diferencia):
                 return False, f"No puedes reducir {abs(diferencia)} u. porque solo quedan {stock_actual} en stock (ya se vendieron)."
 
-        # 4. Actualizar Inventario (Usamos 'sucursal_nombre' porque así se llama en la tabla inventario)
-        cursor.execute("""
-            UPDATE inventario SET cantidad = cantidad + %s 
-            WHERE producto_nombre=%s AND variante=%s AND sucursal_nombre=%s
-        """, (diferencia, prod, var, suc))
+        # 4. Actualizar Inventario
+        if id_p and id_s: _ajustar_stock(cursor, id_p, id_s, id_var, diferencia, "compra editada", id_compra)
         
         # 5. Actualizar Registro Compra
         sql_upd = """
@@ -408,9 +1231,15 @@ def actualizar_compra(id_compra, nueva_cant, nuevo_costo, nuevo_prov, nuevo_meto
             SET cantidad=%s, costo_total=%s, proveedor=%s, metodo_pago=%s, notas=%s
             WHERE id=%s
         """
+        _resumen_compra(cursor, id_compra, -1)
         cursor.execute(sql_upd, (nueva_cant, nuevo_costo, nuevo_prov, nuevo_metodo, nuevas_notas, id_compra))
+        _resumen_compra(cursor, id_compra, 1)
+        # Las compras salen de la cuenta: montos en negativo
+        _corregir_cuenta(cursor, (old_metodo, -float(old_costo or 0)), (nuevo_metodo, -float(nuevo_costo)), "compra editada", id_compra)
+        _registrar_cambio(cursor, "compras", id_compra)
         
         conn.commit()
+        cache_db.invalidar("inventario", "compras", "resumen_diario", "cuentas")
         return True, "Compra corregida exitosamente."
     except Exception as e:
         conn.rollback()
@@ -421,6 +1250,7 @@ def actualizar_compra(id_compra, nueva_cant, nuevo_costo, nuevo_prov, nuevo_meto
         
 # --- EN database.py ---
 
+@cache_db.cacheado("inventario")
 def obtener_stock_actual(producto, sucursal, variante=""):
     """
     Obtiene la cantidad disponible de un producto/variante en una sucursal específica.
@@ -428,19 +1258,315 @@ def obtener_stock_actual(producto, sucursal, variante=""):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # Aseguramos que variante no sea None para la consulta
-        variante = variante if variante else ""
+        id_p, id_v, id_s = _ids(producto, variante, sucursal, cursor=cursor)
         
         sql = """
         SELECT cantidad FROM inventario 
-        WHERE producto_nombre = %s AND sucursal_nombre = %s AND variante = %s
+        WHERE producto_id = %s AND sucursal_id = %s AND variante_id = %s
         """
-        cursor.execute(sql, (producto, sucursal, variante))
+        cursor.execute(sql, (id_p, id_s, id_v))
         result = cursor.fetchone()
         
         return result[0] if result else 0
     except Exception as e:
         print(f"Error consultando stock: {e}")
+        cache_db.no_cachear()
         return 0
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+# --- 7. DATOS PARA REPORTES PDF (ver reportes_pdf.py) ---
+@cache_db.cacheado("ventas", "variantes", "clientes")
+def obtener_datos_comprobante(id_venta):
+    """
+    Datos del comprobante de una venta: la venta y las demás líneas de su carrito (carrito_id).
+    Las ventas de antes de carrito_id salen solas. Devuelve un dict de tipos simples o None si no existe.
+    """
+    conn = get_db_connection(); cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT fecha, cliente_id, ubicacion, notas, carrito_id FROM ventas WHERE id=%s", (id_venta,))
+        cab = cursor.fetchone()
+        if not cab: return None
+        campos = "t.id, t.producto, COALESCE(v.nombre_variante, t.variante) AS variante, t.cantidad, t.precio_unitario, t.total, t.metodo_pago"
+        if cab['carrito_id'] is None:
+            cursor.execute(f"SELECT {campos} FROM ventas t LEFT JOIN variantes v ON v.id = t.variante_id WHERE t.id = %s", (id_venta,))
+        else:
+            cursor.execute(f"SELECT {campos} FROM ventas t LEFT JOIN variantes v ON v.id = t.variante_id WHERE t.carrito_id = %s ORDER BY t.id",
+                           (cab['carrito_id'],))
+        filas = cursor.fetchall()
+        lineas = [
+            {"producto": f"{l['producto']} | {l['variante']}" if l['variante'] else l['producto'],
+             "cantidad": int(l['cantidad'] or 0), "precio": float(l['precio_unitario'] or 0), "total": float(l['total'] or 0)}
+            for l in filas
+        ]
+        # Una línea editada puede haber cambiado de medio de pago: se listan todos los del carrito
+        metodos = list(dict.fromkeys(l['metodo_pago'] for l in filas if l['metodo_pago']))
+        cliente = "Consumidor Final"
+        if cab['cliente_id']:
+            cursor.execute("SELECT nombre FROM clientes WHERE id=%s", (cab['cliente_id'],))
+            fila = cursor.fetchone()
+            if fila: cliente = fila['nombre']
+        return {
+            "id": int(id_venta), "fecha": cab['fecha'].strftime("%d/%m/%Y %H:%M"), "sucursal": cab['ubicacion'] or "",
+            "cliente": cliente, "metodo": " / ".join(metodos), "notas": cab['notas'] or "", "lineas": lineas,
+        }
+    finally: conn.close()
+
+def obtener_datos_reporte_mensual(sucursal, anio, mes):
+    """Totales del mes de una sucursal, desde resumen_diario (por producto y por día). Dict de tipos simples."""
+    desde = datetime(anio, mes, 1).date()
+    hasta = (datetime(anio + (mes == 12), mes % 12 + 1, 1)).date()
+    id_s = _mapa_ids()[1].get(sucursal)
+    if id_s is None: return None
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT COALESCE(p.nombre, '?'), COALESCE(v.nombre_variante, ''),
+                   SUM(r.unidades_vendidas), SUM(r.ingresos), SUM(r.unidades_compradas), SUM(r.costo)
+            FROM resumen_diario r
+            LEFT JOIN productos p ON p.id = r.producto_id
+            LEFT JOIN variantes v ON v.id = r.variante_id
+            WHERE r.dia >= %s AND r.dia < %s AND r.sucursal_id = %s
+            GROUP BY r.producto_id, r.variante_id, p.nombre, v.nombre_variante
+            ORDER BY SUM(r.ingresos) DESC, SUM(r.costo) DESC
+        """, (desde, hasta, id_s))
+        productos = [
+            {"producto": f"{n} | {v}" if v else n, "vendidas": int(uv or 0), "ingresos": float(ing or 0),
+             "compradas": int(uc or 0), "costo": float(c or 0)}
+            for n, v, uv, ing, uc, c in cursor.fetchall()
+        ]
+        cursor.execute("""
+            SELECT r.dia, SUM(r.ventas), SUM(r.ingresos), SUM(r.compras), SUM(r.costo)
+            FROM resumen_diario r
+            WHERE r.dia >= %s AND r.dia < %s AND r.sucursal_id = %s
+            GROUP BY r.dia ORDER BY r.dia
+        """, (desde, hasta, id_s))
+        dias = [{"dia": d.strftime("%d/%m"), "ventas": int(nv or 0), "ingresos": float(i or 0), "compras": int(nc or 0), "costo": float(c or 0)}
+                for d, nv, i, nc, c in cursor.fetchall()]
+        return {"sucursal": sucursal, "anio": anio, "mes": mes, "productos": productos, "dias": dias}
+    finally: conn.close()
+
+# --- 8. COPIA ANALÍTICA (ver analitica.py) ---
+# Columnas que se copian de cada tabla del historial (ids + etiquetas + importes)
+COLUMNAS_ANALITICA = {
+    "ventas": ["id", "fecha", "producto_id", "variante_id", "sucursal_id", "cliente_id", "producto", "variante",
+               "cantidad", "precio_unitario", "total", "metodo_pago"],
+    "compras": ["id", "fecha", "producto_id", "variante_id", "sucursal_id", "producto", "variante",
+                "cantidad", "costo_total", "proveedor", "metodo_pago"],
+}
+
+def leer_cambios_historial(tabla, despues_de):
+    """
+    Ids de `tabla` editados o borrados con anotación posterior a `despues_de`.
+    Devuelve (última anotación leída, set de ids); la primera sirve de marca para la próxima vez.
+    """
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cambios_historial")
+        hasta = cursor.fetchone()[0]
+        cursor.execute("SELECT DISTINCT fila_id FROM cambios_historial WHERE tabla = %s AND id > %s AND id <= %s",
+                       (tabla, despues_de, hasta))
+        return hasta, {f for (f,) in cursor.fetchall()}
+    finally: conn.close()
+
+def iterar_filas_analitica(tabla, desde_id=0, ids=None, bloque=50000):
+    """
+    DataFrames con COLUMNAS_ANALITICA[tabla]: las filas con id > desde_id (cursor sin buffer, de a bloques),
+    o, si se pasa `ids`, solo esas (las que todavía existen).
+    """
+    columnas = ", ".join(COLUMNAS_ANALITICA[tabla])
+    if ids is not None:
+        ids = sorted(ids)
+        for i in range(0, len(ids), 1000):
+            parte = ids[i:i + 1000]
+            conn = get_db_connection()
+            try:
+                marcas = ", ".join(["%s"] * len(parte))
+                yield pd.read_sql(f"SELECT {columnas} FROM {tabla} WHERE id IN ({marcas})", conn, params=parte)
+            finally: conn.close()
+        return
+    conn = get_db_connection(); cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(f"SELECT {columnas} FROM {tabla} WHERE id > %s ORDER BY id", (desde_id,))
+        while True:
+            filas = cursor.fetchmany(bloque)
+            if not filas:
+                break
+            yield pd.DataFrame(filas, columns=COLUMNAS_ANALITICA[tabla])
+    finally:
+        conn.close()
+
+def ultimo_id(tabla):
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}")
+        return cursor.fetchone()[0]
+    finally: conn.close()
+
+# --- 9. LIBRO DE STOCK ---
+# movimientos_stock: cada cambio de inventario (ver _anotar_stock). instantaneas_stock: cada
+# tanto se guarda una copia de inventario junto con el último movimiento que ya contiene
+# (hasta_movimiento). El stock a una fecha es la última instantánea anterior más los
+# movimientos con id posterior a ella: nunca se relee el libro entero.
+MOVIMIENTOS_POR_INSTANTANEA = 5000     # o una por día, lo que llegue primero
+REVISAR_INSTANTANEA_CADA = 600         # segundos entre revisiones desde la app
+_ultima_revision_instantanea = 0.0
+_instantanea_en_curso = threading.Lock()
+
+def _instantanea_pendiente(cursor, solo_si_corresponde):
+    """Lectura simple (sin locks): True si hay movimientos nuevos y, con solo_si_corresponde, si ya toca otra."""
+    cursor.execute("SELECT fecha, hasta_movimiento FROM instantaneas_stock ORDER BY id DESC LIMIT 1")
+    fecha_previa, desde = cursor.fetchone() or (None, 0)
+    cursor.execute("SELECT COUNT(*) FROM movimientos_stock WHERE id > %s", (desde,))
+    nuevos = cursor.fetchone()[0]
+    if not nuevos:
+        return False
+    return not solo_si_corresponde or fecha_previa is None or nuevos >= MOVIMIENTOS_POR_INSTANTANEA \
+        or datetime.now() - fecha_previa >= timedelta(days=1)
+
+def tomar_instantanea_stock(solo_si_corresponde=False):
+    """
+    Guarda una instantánea: inventario y el último id de movimientos_stock, leídos juntos.
+    solo_si_corresponde: únicamente si se juntaron MOVIMIENTOS_POR_INSTANTANEA o la última tiene más de un día.
+    Bloquea inventario (frena las ventas) mientras copia: no llamarla dentro de una corrida de
+    la página (ver revisar_instantanea_stock) sino en segundo plano o desde la línea de comandos.
+    Devuelve (True, id de la instantánea o None si no hacía falta) o (False, mensaje).
+    """
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        # 1. ¿Hace falta? Sin locks: casi siempre la respuesta es no
+        pendiente = _instantanea_pendiente(cursor, solo_si_corresponde)
+        conn.rollback()  # cierra la lectura: lo que sigue necesita una vista nueva, posterior al lock
+        if not pendiente:
+            return True, None
+        # 2. Lock sobre inventario: espera a las transacciones que lo están tocando y frena las
+        # nuevas hasta el commit. Todas anotan en el libro después de tocar inventario, así que
+        # ya no queda ningún movimiento sin confirmar y todo id <= MAX(id) está en la copia.
+        # (Sin el lock no alcanza con MAX(id): un id más bajo puede ser de una transacción abierta.)
+        cursor.execute("SELECT producto_id, sucursal_id, variante_id, cantidad FROM inventario FOR UPDATE")
+        inventario = [f for f in cursor.fetchall() if f[3]]
+        ahora = datetime.now().replace(microsecond=0)
+        cursor.execute("SELECT hasta_movimiento FROM instantaneas_stock ORDER BY id DESC LIMIT 1")
+        desde = (cursor.fetchone() or (0,))[0]
+        cursor.execute("SELECT MAX(id) FROM movimientos_stock WHERE id > %s", (desde,))
+        hasta = cursor.fetchone()[0]
+        if hasta is None:
+            # Otro proceso la tomó entre la revisión y el lock
+            conn.rollback()
+            return True, None
+        cursor.execute("INSERT INTO instantaneas_stock (fecha, hasta_movimiento) VALUES (%s, %s)", (ahora, hasta))
+        nueva = cursor.lastrowid
+        if inventario:
+            cursor.executemany(
+                "INSERT INTO instantaneas_stock_filas (instantanea_id, producto_id, sucursal_id, variante_id, cantidad) VALUES (%s, %s, %s, %s, %s)",
+                [(nueva,) + tuple(f) for f in inventario],
+            )
+        conn.commit()
+        return True, nueva
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally: conn.close()
+
+def revisar_instantanea_stock():
+    """
+    Para llamar en cada corrida de la app: a lo sumo cada REVISAR_INSTANTANEA_CADA segundos por
+    proceso lanza la revisión en un hilo aparte, así la página no espera ni la lectura ni el lock.
+    """
+    global _ultima_revision_instantanea
+    if time.time() - _ultima_revision_instantanea < REVISAR_INSTANTANEA_CADA:
+        return
+    if not _instantanea_en_curso.acquire(blocking=False):
+        return
+    _ultima_revision_instantanea = time.time()
+
+    def revisar():
+        try:
+            ok, res = tomar_instantanea_stock(solo_si_corresponde=True)
+            if not ok: print(f"Error tomando la instantánea de stock: {res}")
+        finally:
+            _instantanea_en_curso.release()
+    threading.Thread(target=revisar, name="instantanea-stock", daemon=True).start()
+
+@cache_db.cacheado("inventario")
+def obtener_stock_al(dia):
+    """
+    Stock de cada SKU × sucursal al cierre de `dia`: la última instantánea anterior más los
+    movimientos posteriores (acotados por la instantánea siguiente, si la hay).
+    DataFrame Producto, Variante, Sucursal, Cantidad (sin las filas en 0).
+    """
+    hasta = datetime.combine(dia + timedelta(days=1), datetime.min.time())
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, hasta_movimiento FROM instantaneas_stock WHERE fecha <= %s ORDER BY fecha DESC, id DESC LIMIT 1", (hasta,))
+        id_inst, desde = cursor.fetchone() or (0, 0)
+        # La instantánea siguiente ya contiene todo lo anterior a `hasta`: sirve de tope
+        cursor.execute("SELECT hasta_movimiento FROM instantaneas_stock WHERE fecha > %s ORDER BY fecha, id LIMIT 1", (hasta,))
+        siguiente = cursor.fetchone()
+        rango, params = "m.id > %s AND m.fecha < %s", [id_inst, desde, hasta]
+        if siguiente:
+            rango += " AND m.id <= %s"; params.append(siguiente[0])
+        return pd.read_sql(f"""
+            SELECT p.nombre AS Producto, COALESCE(v.nombre_variante, '') AS Variante, s.nombre AS Sucursal, SUM(x.cantidad) AS Cantidad
+            FROM (SELECT producto_id, sucursal_id, variante_id, cantidad FROM instantaneas_stock_filas WHERE instantanea_id = %s
+                  UNION ALL
+                  SELECT m.producto_id, m.sucursal_id, m.variante_id, m.delta FROM movimientos_stock m WHERE {rango}) x
+            JOIN productos p ON p.id = x.producto_id
+            JOIN sucursales s ON s.id = x.sucursal_id
+            LEFT JOIN variantes v ON v.id = x.variante_id
+            GROUP BY p.nombre, v.nombre_variante, s.nombre
+            HAVING SUM(x.cantidad) <> 0
+            ORDER BY p.nombre, v.nombre_variante, s.nombre
+        """, conn, params=params)
+    except:
+        cache_db.no_cachear()
+        return pd.DataFrame(columns=['Producto', 'Variante', 'Sucursal', 'Cantidad'])
+    finally: conn.close()
+
+@cache_db.cacheado("inventario")
+def obtener_movimientos_stock(producto, variante, sucursal, limite=100):
+    """Los últimos movimientos del libro de un SKU en una sucursal, el más nuevo primero."""
+    conn = get_db_connection()
+    try:
+        id_p, id_v, id_s = _ids(producto, variante, sucursal, cursor=conn.cursor())
+        return pd.read_sql("""
+            SELECT fecha AS Fecha, delta AS Movimiento, origen AS Origen, referencia_id AS Referencia
+            FROM movimientos_stock WHERE producto_id = %s AND sucursal_id = %s AND variante_id = %s
+            ORDER BY id DESC LIMIT %s
+        """, conn, params=(id_p, id_s, id_v, limite))
+    except:
+        cache_db.no_cachear()
+        return pd.DataFrame(columns=['Fecha', 'Movimiento', 'Origen', 'Referencia'])
+    finally: conn.close()
+
+def verificar_stock():
+    """
+    Compara inventario con lo que suma el libro (última instantánea + movimientos posteriores).
+    Una diferencia es un cambio de stock posterior a esa instantánea que no pasó por database.py
+    (ej. un UPDATE a mano): obtener_movimientos_stock del SKU muestra desde cuándo cuadraba.
+    Devuelve un DataFrame Producto, Variante, Sucursal, Inventario, Libro, Diferencia (solo las que no coinciden).
+    """
+    conn = get_db_connection(); cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, hasta_movimiento FROM instantaneas_stock ORDER BY id DESC LIMIT 1")
+        id_inst, desde = cursor.fetchone() or (0, 0)
+        df = pd.read_sql("""
+            SELECT p.nombre AS Producto, COALESCE(v.nombre_variante, '') AS Variante, s.nombre AS Sucursal,
+                   SUM(x.inventario) AS Inventario, SUM(x.libro) AS Libro
+            FROM (SELECT producto_id, sucursal_id, variante_id, cantidad AS inventario, 0 AS libro FROM inventario
+                  UNION ALL
+                  SELECT producto_id, sucursal_id, variante_id, 0, cantidad FROM instantaneas_stock_filas WHERE instantanea_id = %s
+                  UNION ALL
+                  SELECT producto_id, sucursal_id, variante_id, 0, delta FROM movimientos_stock WHERE id > %s) x
+            JOIN productos p ON p.id = x.producto_id
+            JOIN sucursales s ON s.id = x.sucursal_id
+            LEFT JOIN variantes v ON v.id = x.variante_id
+            GROUP BY p.nombre, v.nombre_variante, s.nombre
+            HAVING SUM(x.inventario) <> SUM(x.libro)
+            ORDER BY p.nombre, v.nombre_variante, s.nombre
+        """, conn, params=(id_inst, desde))
+        df['Diferencia'] = df['Inventario'] - df['Libro']
+        return df
+    finally: conn.close()
+
+# --- INSTRUMENTACIÓN (al final: envuelve todas las funciones públicas de arriba) ---
+diagnostico.instrumentar(globals(), __name__)
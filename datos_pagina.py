@@ -0,0 +1,79 @@
+"""
+Datos de cada página de app.py, declarados por página y cargados a pedido.
+
+Cada página lista en PAGINAS los conjuntos que usa; app.py arma una Pagina por
+corrida y los pide con datos["nombre"]. Un conjunto se lee recién la primera vez
+que se pide y queda guardado para el resto de la corrida: dos pestañas que usan
+la matriz de stock la leen una sola vez. Si en el medio hubo una escritura sobre
+alguna de sus tablas (ej. desde un fragmento), se vuelve a leer (ver
+cache_db.generaciones).
+
+Cada carga se mide y se anota en diagnostico (página Diagnóstico → "Carga por
+página"), junto con el presupuesto de la página: si la suma de cargas de una
+corrida lo supera, queda registrado como excedido.
+"""
+import os
+import time
+
+import cache_db
+import database as db
+import diagnostico
+
+# nombre -> (función que lo lee, tablas de las que depende)
+CONJUNTOS = {
+    "sucursales": (lambda: db.obtener_datos_globales()[1], ("sucursales",)),
+    "indice_catalogo": (db.obtener_indice_catalogo, ("productos", "variantes")),
+    "clientes": (db.obtener_lista_clientes_simple, ("clientes",)),
+    "clientes_metricas": (db.obtener_clientes_metricas, ("clientes", "ventas")),
+    "matriz": (db.obtener_datos_matrix, ("productos", "variantes", "inventario", "sucursales")),
+    "listas_auxiliares": (db.obtener_listas_auxiliares, ("productos", "sucursales")),
+    "resumen_finanzas": (db.obtener_resumen_finanzas, ("resumen_diario",)),
+    "saldos": (db.obtener_saldos_cuentas, ("cuentas",)),
+}
+
+# Página -> conjuntos que puede pedir
+PAGINAS = {
+    "Registrar Venta": ("sucursales", "clientes", "indice_catalogo"),
+    "Registrar Compra": ("sucursales", "indice_catalogo"),
+    "Movimientos": ("sucursales",),
+    "Stock": ("matriz", "listas_auxiliares"),
+    "Clientes": ("clientes", "clientes_metricas"),
+    "Finanzas": ("sucursales", "matriz", "resumen_finanzas", "saldos"),
+    "Diagnóstico": (),
+}
+
+# Presupuesto de carga de datos por corrida, en ms (AURUM_PRESUPUESTO_MS para el resto)
+PRESUPUESTO_DEFECTO = float(os.environ.get("AURUM_PRESUPUESTO_MS", 300))
+PRESUPUESTOS_MS = {
+    "Registrar Venta": 150,
+    "Registrar Compra": 150,
+    "Finanzas": 500,
+}
+
+
+class Pagina:
+    """
+    Conjuntos de datos de una página para una corrida: datos["matriz"] lo lee la primera vez.
+    El valor se comparte durante la corrida: si hay que modificarlo, trabajar sobre una copia.
+    """
+
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.declarados = PAGINAS.get(pagina, ())
+        self.presupuesto_ms = PRESUPUESTOS_MS.get(pagina, PRESUPUESTO_DEFECTO)
+        self._cargados = {}  # nombre -> (generaciones de sus tablas, valor)
+        diagnostico.fijar_presupuesto(self.presupuesto_ms)
+
+    def __getitem__(self, nombre):
+        if nombre not in self.declarados:
+            raise KeyError(f"La página {self.pagina} no declaró el conjunto '{nombre}' (ver datos_pagina.PAGINAS)")
+        funcion, tablas = CONJUNTOS[nombre]
+        gens = cache_db.generaciones(*tablas)
+        cargado = self._cargados.get(nombre)
+        if cargado is not None and cargado[0] == gens:
+            return cargado[1]
+        t0 = time.perf_counter()
+        valor = funcion()
+        diagnostico.registrar_carga(self.pagina, nombre, time.perf_counter() - t0)
+        self._cargados[nombre] = (gens, valor)
+        return valor
@@ -0,0 +1,409 @@
+"""
+Medición de latencia de database.py: funciones, sentencias SQL y préstamo de conexiones.
+
+database.get_db_connection() entrega la conexión envuelta en ConexionMedida: cada
+cursor mide por separado el execute y los fetch, y cuenta filas (leídas en un
+SELECT, afectadas en un INSERT/UPDATE/DELETE). Al final de database.py,
+instrumentar() envuelve todas las funciones públicas del módulo, así cada
+sentencia queda atribuida a la función que la corrió.
+
+Todo se acumula en memoria del proceso (últimas MUESTRAS mediciones por clave,
+para percentiles) y lo muestra la página oculta "Diagnóstico" de la app
+(?diagnostico=1). Las sentencias que tardan más que AURUM_LENTO_MS (250 ms por
+defecto) se registran con logging en "aurum.diagnostico" y en la lista de lentas.
+
+Por corrida de la página (rerun de Streamlit): iniciar_rerun() abre un acumulador
+nuevo para el hilo actual; todo lo que se mida en ese hilo se suma ahí. Una corrida
+cortada por st.stop() / st.rerun() no llega a terminar_rerun(): la cierra la
+siguiente iniciar_rerun(), con la hora de su última medición. Las corridas de un
+solo fragmento (st.fragment) se abren con fragmento=<nombre> y se cuentan aparte.
+"""
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+import numpy as np
+
+MUESTRAS = 2000
+MAX_LENTAS = 200
+UMBRAL_LENTO = float(os.environ.get("AURUM_LENTO_MS", 250)) / 1000
+
+log = logging.getLogger("aurum.diagnostico")
+
+_lock = threading.Lock()
+_funciones = {}    # nombre -> _Serie
+_sentencias = {}   # (función, sql normalizado) -> {"ejecutar": _Serie, "traer": _Serie, "filas": n}
+_conexiones = None
+_lentas = deque(maxlen=MAX_LENTAS)
+_cargas = {}       # (página, conjunto) -> _Serie (ver datos_pagina.py)
+_paginas = {}      # página -> {"carga": _Serie, "presupuesto_ms": ms, "excedidas": n}
+_local = threading.local()
+
+
+class _Serie:
+    """Últimas MUESTRAS duraciones (para percentiles) más totales acumulados desde el arranque."""
+
+    def __init__(self):
+        self.muestras = deque(maxlen=MUESTRAS)
+        self.llamadas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, seg):
+        self.muestras.append(seg)
+        self.llamadas += 1
+        self.total += seg
+        self.maximo = max(self.maximo, seg)
+
+    def resumen(self):
+        """Dict en milisegundos: llamadas, p50, p95, p99, máximo y total."""
+        m = np.array(self.muestras) * 1000 if self.muestras else np.zeros(1)
+        p50, p95, p99 = (float(p) for p in np.percentile(m, [50, 95, 99]))
+        return {"llamadas": self.llamadas, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+                "max_ms": self.maximo * 1000, "total_ms": self.total * 1000}
+
+
+def normalizar_sql(sql):
+    """Una línea, sin espacios de más y con las listas de parámetros colapsadas (IN, multi-fila)."""
+    sql = re.sub(r"\s+", " ", str(sql)).strip()
+    sql = re.sub(r"%s(, %s)+", "%s, ...", sql)
+    sql = re.sub(r"(\([^()]*%s[^()]*\))(, \([^()]*%s[^()]*\))+", r"\1, ...", sql)
+    return sql
+
+
+def _funcion_actual():
+    pila = getattr(_local, "pila", None)
+    return pila[-1] if pila else "(fuera de database.py)"
+
+
+def _rerun():
+    return getattr(_local, "rerun", None)
+
+
+# --- REGISTRO ---
+def registrar_conexion(seg):
+    global _conexiones
+    with _lock:
+        if _conexiones is None:
+            _conexiones = _Serie()
+        _conexiones.agregar(seg)
+    r = _rerun()
+    if r is not None:
+        r["ultimo"] = time.time()
+        r["conexiones"] += 1
+        r["espera_conexion_ms"] += seg * 1000
+
+
+def registrar_sentencia(sql, ejecutar, traer, filas):
+    funcion = _funcion_actual()
+    clave = (funcion, normalizar_sql(sql))
+    with _lock:
+        datos = _sentencias.get(clave)
+        if datos is None:
+            datos = _sentencias[clave] = {"ejecutar": _Serie(), "traer": _Serie(), "filas": 0}
+        datos["ejecutar"].agregar(ejecutar)
+        datos["traer"].agregar(traer)
+        datos["filas"] += max(filas, 0)
+    r = _rerun()
+    if r is not None:
+        r["ultimo"] = time.time()
+        r["sentencias"] += 1
+        r["sql_ms"] += (ejecutar + traer) * 1000
+        r["filas"] += max(filas, 0)
+    total = ejecutar + traer
+    if total > UMBRAL_LENTO:
+        lenta = {"momento": time.strftime("%Y-%m-%d %H:%M:%S"), "funcion": funcion, "sql": clave[1],
+                 "ejecutar_ms": ejecutar * 1000, "traer_ms": traer * 1000, "filas": filas}
+        with _lock:
+            _lentas.append(lenta)
+        log.warning("Consulta lenta (%.0f ms, %s filas) en %s: %s", total * 1000, filas, funcion, clave[1][:300])
+
+
+def registrar_funcion(nombre, seg, externa):
+    with _lock:
+        serie = _funciones.get(nombre)
+        if serie is None:
+            serie = _funciones[nombre] = _Serie()
+        serie.agregar(seg)
+    r = _rerun()
+    if r is not None:
+        r["ultimo"] = time.time()
+        llamadas, ms = r["funciones"].get(nombre, (0, 0.0))
+        r["funciones"][nombre] = (llamadas + 1, ms + seg * 1000)
+        if externa:
+            # Solo las llamadas de primer nivel suman al total (las anidadas ya están adentro)
+            r["database_ms"] += seg * 1000
+
+
+def registrar_carga(pagina, conjunto, seg):
+    """Carga de un conjunto de datos de página (datos_pagina.Pagina)."""
+    with _lock:
+        serie = _cargas.get((pagina, conjunto))
+        if serie is None:
+            serie = _cargas[(pagina, conjunto)] = _Serie()
+        serie.agregar(seg)
+    r = _rerun()
+    if r is not None:
+        r["ultimo"] = time.time()
+        r["datos"][conjunto] = r["datos"].get(conjunto, 0.0) + seg * 1000
+
+
+def fijar_presupuesto(ms):
+    """Presupuesto de carga de datos de la corrida actual; terminar_rerun() lo compara con lo cargado."""
+    r = _rerun()
+    if r is not None:
+        r["presupuesto_ms"] = ms
+
+
+# --- CONEXIÓN Y CURSOR MEDIDOS ---
+class CursorMedido:
+    """Cursor de mysql.connector que mide execute / fetch. Una sentencia se registra al ejecutar la siguiente o al cerrar."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pendiente = None  # [sql, seg execute, seg fetch, filas]
+
+    def _cerrar_pendiente(self):
+        if self._pendiente is not None:
+            sql, ejecutar, traer, filas = self._pendiente
+            self._pendiente = None
+            registrar_sentencia(sql, ejecutar, traer, filas)
+
+    def _ejecutar(self, metodo, sql, *args, **kwargs):
+        self._cerrar_pendiente()
+        t0 = time.perf_counter()
+        try:
+            return metodo(sql, *args, **kwargs)
+        finally:
+            seg = time.perf_counter() - t0
+            # Sin resultado (INSERT/UPDATE/DELETE): las filas son las afectadas
+            filas = self._cursor.rowcount if self._cursor.description is None else 0
+            self._pendiente = [sql, seg, 0.0, filas]
+
+    def execute(self, sql, *args, **kwargs):
+        return self._ejecutar(self._cursor.execute, sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._ejecutar(self._cursor.executemany, sql, *args, **kwargs)
+
+    def _traer(self, metodo, *args):
+        t0 = time.perf_counter()
+        filas = metodo(*args)
+        if self._pendiente is not None:
+            self._pendiente[2] += time.perf_counter() - t0
+            if filas is not None:
+                self._pendiente[3] += len(filas) if isinstance(filas, list) else 1
+        return filas
+
+    def fetchone(self):
+        return self._traer(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._traer(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._traer(self._cursor.fetchall)
+
+    def close(self):
+        self._cerrar_pendiente()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionMedida:
+    """Envuelve la conexión prestada por el pool: sus cursores son CursorMedido."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursores = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = CursorMedido(self._conn.cursor(*args, **kwargs))
+        self._cursores.append(cursor)
+        return cursor
+
+    def close(self):
+        # Las sentencias cuyo cursor nunca se cerró se registran al devolver la conexión
+        for cursor in self._cursores:
+            cursor._cerrar_pendiente()
+        self._cursores = []
+        self._conn.close()
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- FUNCIONES ---
+def _entrar(nombre):
+    pila = getattr(_local, "pila", None)
+    if pila is None:
+        pila = _local.pila = []
+    pila.append(nombre)
+    return len(pila) == 1
+
+
+def _salir():
+    _local.pila.pop()
+
+
+def medido(funcion):
+    """Decorador: mide cada llamada y atribuye a la función las sentencias que corre adentro."""
+    nombre = funcion.__name__
+
+    if inspect.isgeneratorfunction(funcion):
+        @wraps(funcion)
+        def generador(*args, **kwargs):
+            # Solo cuenta el tiempo adentro del generador, no el de quien lo consume
+            gen, total, externa = funcion(*args, **kwargs), 0.0, False
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    externa = _entrar(nombre)
+                    try:
+                        valor = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        _salir()
+                        total += time.perf_counter() - t0
+                    yield valor
+            finally:
+                gen.close()
+                registrar_funcion(nombre, total, externa)
+        return generador
+
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        externa = _entrar(nombre)
+        t0 = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            _salir()
+            registrar_funcion(nombre, time.perf_counter() - t0, externa)
+    return envoltura
+
+
+def instrumentar(espacio, modulo):
+    """Envuelve con medido() todas las funciones públicas definidas en `modulo` (llamar con globals())."""
+    for nombre, valor in list(espacio.items()):
+        if nombre.startswith("_") or not inspect.isfunction(valor) or valor.__module__ != modulo:
+            continue
+        espacio[nombre] = medido(valor)
+
+
+# --- POR CORRIDA DE LA PÁGINA ---
+def iniciar_rerun(pagina=None, anterior=None, fragmento=None):
+    """
+    Abre el acumulador de esta corrida para el hilo actual y lo devuelve (guardarlo en session_state).
+    anterior: la corrida previa de la sesión; si quedó abierta (st.stop(), st.rerun()) se cierra acá.
+    fragmento: nombre del st.fragment si Streamlit corre solo ese fragmento.
+    """
+    for r in (anterior, _rerun()):
+        if r is not None and r["fin"] is None:
+            _cerrar(r, r["ultimo"])
+    ahora = time.time()
+    _local.rerun = {"pagina": pagina, "fragmento": fragmento, "inicio": ahora, "ultimo": ahora, "fin": None,
+                    "conexiones": 0, "espera_conexion_ms": 0.0, "sentencias": 0, "sql_ms": 0.0, "filas": 0,
+                    "database_ms": 0.0, "funciones": {}, "datos": {}, "presupuesto_ms": None}
+    return _local.rerun
+
+
+def terminar_rerun(r=None):
+    """Cierra la corrida `r` (por defecto la del hilo actual)."""
+    r = r if r is not None else _rerun()
+    if r is not None and r["fin"] is None:
+        _cerrar(r, time.time())
+
+
+def _cerrar(r, fin):
+    r["fin"] = fin
+    if _rerun() is r:
+        _local.rerun = None
+    if r["presupuesto_ms"] is not None:
+        carga = sum(r["datos"].values())
+        with _lock:
+            pagina = _paginas.get(r["pagina"])
+            if pagina is None:
+                pagina = _paginas[r["pagina"]] = {"carga": _Serie(), "presupuesto_ms": r["presupuesto_ms"], "excedidas": 0}
+            pagina["carga"].agregar(carga / 1000)
+            pagina["presupuesto_ms"] = r["presupuesto_ms"]
+            if carga > r["presupuesto_ms"]:
+                pagina["excedidas"] += 1
+        if carga > r["presupuesto_ms"]:
+            log.warning("Página %s: %.0f ms cargando datos (presupuesto %.0f ms): %s", r["pagina"], carga,
+                        r["presupuesto_ms"], ", ".join(f"{k} {v:.0f} ms" for k, v in r["datos"].items()))
+
+
+# --- LECTURA ---
+def resumen_funciones():
+    with _lock:
+        filas = [{"funcion": n, **s.resumen()} for n, s in _funciones.items()]
+    return sorted(filas, key=lambda f: -f["total_ms"])
+
+
+def resumen_sentencias():
+    with _lock:
+        filas = []
+        for (funcion, sql), d in _sentencias.items():
+            e, t = d["ejecutar"].resumen(), d["traer"].resumen()
+            filas.append({"funcion": funcion, "sql": sql, "llamadas": e["llamadas"],
+                          "ejecutar_p50_ms": e["p50_ms"], "ejecutar_p95_ms": e["p95_ms"],
+                          "traer_p50_ms": t["p50_ms"], "traer_p95_ms": t["p95_ms"],
+                          "total_ms": e["total_ms"] + t["total_ms"], "filas_prom": d["filas"] / max(e["llamadas"], 1)})
+    return sorted(filas, key=lambda f: -f["total_ms"])
+
+
+def resumen_conexiones():
+    with _lock:
+        return _conexiones.resumen() if _conexiones else None
+
+
+def resumen_paginas():
+    """Por página: carga de datos por corrida (p50/p95/máx) contra su presupuesto."""
+    with _lock:
+        filas = []
+        for pagina, d in _paginas.items():
+            c = d["carga"].resumen()
+            filas.append({"pagina": pagina, "corridas": c["llamadas"], "carga_p50_ms": c["p50_ms"], "carga_p95_ms": c["p95_ms"],
+                          "carga_max_ms": c["max_ms"], "presupuesto_ms": d["presupuesto_ms"], "excedidas": d["excedidas"]})
+    return sorted(filas, key=lambda f: -f["carga_p95_ms"])
+
+
+def resumen_cargas():
+    """Por (página, conjunto): cuántas veces se leyó y cuánto tardó."""
+    with _lock:
+        filas = [{"pagina": p, "conjunto": c, **s.resumen()} for (p, c), s in _cargas.items()]
+    return sorted(filas, key=lambda f: -f["total_ms"])
+
+
+def lentas():
+    with _lock:
+        return list(reversed(_lentas))
+
+
+def reiniciar():
+    global _conexiones
+    with _lock:
+        _funciones.clear()
+        _sentencias.clear()
+        _lentas.clear()
+        _cargas.clear()
+        _paginas.clear()
+        _conexiones = None
@@ -0,0 +1,221 @@
+"""
+Diario local de ventas y compras: se anotan en un SQLite del equipo y un hilo de fondo
+las pasa a la base en lotes.
+
+Con la base en la nube, registrar una venta esperaba varios viajes de red y un corte
+la perdía. Con el diario activo (AURUM_DIARIO=ruta en el entorno o [diario] ruta en
+secrets), la app solo hace un INSERT local (WAL + synchronous=FULL: queda en disco antes
+de confirmar al vendedor) y sigue.
+
+Garantías del envío (vaciar()):
+  - orden: las operaciones se aplican por número de secuencia, de a LOTE por transacción;
+    si la base no responde, el lote entero se reintenta más tarde (con espera creciente)
+    y nada posterior se adelanta.
+  - una sola vez: cada operación lleva un uid que se guarda en operaciones_aplicadas en la
+    misma transacción (ver database.aplicar_operaciones). Si se cae el proceso entre el
+    commit remoto y la marca local, al reenviar el lote la base la reconoce y no la duplica.
+  - rechazos: si una operación no se puede aplicar (stock insuficiente, producto borrado),
+    queda "rechazada" con el motivo y el resto sigue; desde la app se reintenta o descarta.
+
+El stock se valida al aplicar, no al anotar: con el diario activo una venta puede quedar
+rechazada unos segundos después de que el vendedor la vio confirmada.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import streamlit as st
+
+LOTE = 200             # operaciones por transacción remota
+INTERVALO = 1.0        # segundos entre vueltas del hilo si no hay nada nuevo
+ESPERA_MAXIMA = 60.0   # tope de la espera entre reintentos con la base caída
+DIAS_CONSERVAR = 7     # las aplicadas se borran del diario pasado este plazo
+
+log = logging.getLogger("aurum.diario")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS operaciones (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL UNIQUE,
+    tipo TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    creada TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    mensaje TEXT,
+    resuelta TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_operaciones_estado ON operaciones (estado, seq);
+"""
+
+_local = threading.local()
+_hilo = None
+_hilo_lock = threading.Lock()
+_vaciado_lock = threading.Lock()
+_despertar = threading.Event()
+_ultimo_envio = None   # time.time() del último lote aplicado
+_ultimo_error = None   # (time.time(), mensaje) del último lote que no se pudo enviar
+
+
+def ruta():
+    """Archivo del diario, o None si el diario está apagado (las ventas van directo a la base)."""
+    if os.environ.get("AURUM_DIARIO"):
+        return os.environ["AURUM_DIARIO"]
+    if "diario" in st.secrets:
+        return st.secrets["diario"]["ruta"]
+    return None
+
+
+def activo():
+    import database as db
+    # Con el modo SQLite embebido la base ya es local: no hay nada que diferir
+    return db._ruta_sqlite() is None and ruta() is not None
+
+
+def _conexion():
+    """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)."""
+    cnx = getattr(_local, "cnx", None)
+    if cnx is None:
+        cnx = sqlite3.connect(ruta(), timeout=10, isolation_level=None)
+        cnx.execute("PRAGMA journal_mode=WAL")
+        cnx.execute("PRAGMA synchronous=FULL")
+        cnx.executescript(ESQUEMA)
+        _local.cnx = cnx
+    return cnx
+
+
+def _ahora():
+    return datetime.now().isoformat(sep=" ", timespec="microseconds")
+
+
+# --- ANOTAR (lo que llama la app) ---
+def _anotar(tipo, datos):
+    uid = uuid.uuid4().hex
+    _conexion().execute("INSERT INTO operaciones (uid, tipo, datos, creada) VALUES (?, ?, ?, ?)",
+                        (uid, tipo, json.dumps(datos), _ahora()))
+    iniciar()
+    _despertar.set()
+    return uid
+
+
+def anotar_venta(items, metodo, ubicacion, notas, cliente_id):
+    """Como database.registrar_venta_carrito, pero devuelve (True, uid) apenas queda en el diario."""
+    if not items: return False, "El carrito está vacío"
+    for it in items:
+        if int(it["cantidad"]) <= 0: return False, f"Cantidad inválida para {it['producto']}"
+    try:
+        items = [{"producto": it["producto"], "variante": it.get("variante") or "",
+                  "cantidad": int(it["cantidad"]), "precio": float(it["precio"])} for it in items]
+        return True, _anotar("venta", {"items": items, "metodo": metodo, "ubicacion": ubicacion,
+                                        "notas": notas, "cliente_id": cliente_id})
+    except Exception as e:
+        return False, str(e)
+
+
+def anotar_compra(producto, variante, cantidad, costo, proveedor, metodo, ubicacion, notas):
+    """Como database.registrar_compra (devuelve True / False)."""
+    try:
+        _anotar("compra", {"producto": producto, "variante": variante, "cantidad": int(cantidad), "costo": float(costo),
+                           "proveedor": proveedor, "metodo": metodo, "ubicacion": ubicacion, "notas": notas})
+        return True
+    except Exception:
+        return False
+
+
+# --- ENVÍO A LA BASE ---
+def vaciar(limite=LOTE):
+    """Aplica en la base el próximo lote de pendientes. Devuelve cuántas se procesaron (lanza si la base falla)."""
+    global _ultimo_envio, _ultimo_error
+    import database as db
+    with _vaciado_lock:
+        cnx = _conexion()
+        filas = cnx.execute("SELECT seq, uid, tipo, datos, creada FROM operaciones WHERE estado = 'pendiente' "
+                            "ORDER BY seq LIMIT ?", (limite,)).fetchall()
+        if not filas:
+            return 0
+        operaciones = [{"uid": uid, "tipo": tipo, "datos": json.loads(datos),
+                        "fecha": datetime.fromisoformat(creada).replace(microsecond=0)}
+                       for _, uid, tipo, datos, creada in filas]
+        try:
+            resultados = db.aplicar_operaciones(operaciones)
+        except Exception as e:
+            _ultimo_error = (time.time(), str(e))
+            cnx.execute("UPDATE operaciones SET intentos = intentos + 1, mensaje = ? WHERE seq = ?", (str(e), filas[0][0]))
+            raise
+        resuelta = _ahora()
+        cnx.execute("BEGIN")
+        cnx.executemany("UPDATE operaciones SET estado = ?, mensaje = ?, resuelta = ? WHERE uid = ?",
+                        [("aplicada" if ok else "rechazada", mensaje, resuelta, uid) for uid, ok, mensaje in resultados])
+        cnx.execute("COMMIT")
+        for uid, ok, mensaje in resultados:
+            if not ok:
+                log.warning("Operación %s rechazada por la base: %s", uid, mensaje)
+        _ultimo_envio, _ultimo_error = time.time(), None
+        return len(filas)
+
+
+def _purgar():
+    _conexion().execute("DELETE FROM operaciones WHERE estado IN ('aplicada', 'descartada') AND resuelta < datetime('now', 'localtime', ?)",
+                        (f"-{DIAS_CONSERVAR} days",))
+
+
+def _trabajar():
+    espera, ultima_purga = INTERVALO, 0
+    while True:
+        try:
+            if vaciar() == LOTE:
+                continue  # hay más en cola: seguir sin esperar
+            espera = INTERVALO
+            if time.time() - ultima_purga > 3600:
+                _purgar()
+                ultima_purga = time.time()
+        except Exception as e:
+            espera = min(espera * 2, ESPERA_MAXIMA)
+            log.warning("No se pudo enviar el diario a la base (reintento en %.0fs): %s", espera, e)
+        _despertar.wait(espera)
+        _despertar.clear()
+
+
+def iniciar():
+    """Arranca el hilo de envío (uno por proceso). No hace nada si el diario está apagado."""
+    global _hilo
+    if not activo():
+        return
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_trabajar, name="aurum-diario", daemon=True)
+            _hilo.start()
+
+
+# --- ESTADO (para la app) ---
+def estado():
+    """pendientes, rechazadas, atraso_seg (antigüedad de la pendiente más vieja), último envío y último error."""
+    cnx = _conexion()
+    pendientes, mas_vieja = cnx.execute("SELECT COUNT(*), MIN(creada) FROM operaciones WHERE estado = 'pendiente'").fetchone()
+    rechazadas = cnx.execute("SELECT COUNT(*) FROM operaciones WHERE estado = 'rechazada'").fetchone()[0]
+    atraso = (datetime.now() - datetime.fromisoformat(mas_vieja)).total_seconds() if mas_vieja else 0.0
+    return {"pendientes": pendientes, "rechazadas": rechazadas, "atraso_seg": atraso,
+            "ultimo_envio": _ultimo_envio, "ultimo_error": _ultimo_error,
+            "hilo_activo": _hilo is not None and _hilo.is_alive()}
+
+
+def rechazadas():
+    filas = _conexion().execute("SELECT uid, tipo, datos, creada, mensaje FROM operaciones WHERE estado = 'rechazada' ORDER BY seq").fetchall()
+    return [{"uid": uid, "tipo": tipo, "datos": json.loads(datos), "creada": creada, "mensaje": mensaje}
+            for uid, tipo, datos, creada, mensaje in filas]
+
+
+def reintentar(uid):
+    """Vuelve a poner en cola una rechazada (ej. después de cargar el stock que faltaba)."""
+    _conexion().execute("UPDATE operaciones SET estado = 'pendiente', mensaje = NULL WHERE uid = ? AND estado = 'rechazada'", (uid,))
+    _despertar.set()
+
+
+def descartar(uid):
+    _conexion().execute("UPDATE operaciones SET estado = 'descartada', resuelta = ? WHERE uid = ? AND estado = 'rechazada'",
+                        (_ahora(), uid))
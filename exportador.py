@@ -0,0 +1,115 @@
+"""
+Exportación del historial de ventas / compras a CSV o Parquet con memoria acotada.
+
+Los datos salen de database.iterar_movimientos (cursor sin buffer, de a bloques) y
+se escriben bloque por bloque: el CSV empieza a salir con el primer bloque y el
+Parquet escribe un row group por bloque. Desde la línea de comandos nunca se arma el
+historial entero en memoria; el botón de la app sí (ver a_archivo_temporal).
+
+Uso:
+    python exportador.py ventas -o ventas.csv
+    python exportador.py compras --formato parquet -o compras.parquet --desde 2024-01-01 --hasta 2024-12-31
+    python exportador.py ventas --sucursal Centro --producto whey > ventas_whey.csv
+"""
+import argparse
+import sys
+import tempfile
+from datetime import date
+
+BLOQUE = 5000
+
+
+def bloques_csv(tipo, bloque=BLOQUE, **filtros):
+    """Genera el CSV como bytes, un pedazo por bloque (el primero lleva el encabezado)."""
+    import database as db
+    primero = True
+    for df in db.iterar_movimientos(tipo, bloque=bloque, **filtros):
+        yield df.to_csv(index=False, header=primero).encode("utf-8")
+        primero = False
+    if primero:
+        # Sin filas: igual se entrega el encabezado
+        columnas = db.COLUMNAS_VENTAS if tipo == "Ventas" else db.COLUMNAS_COMPRAS
+        yield (",".join(columnas.values()) + "\n").encode("utf-8")
+
+
+def _esquema(tipo):
+    import pyarrow as pa
+    comunes = [("ID", pa.int64()), ("FECHA", pa.timestamp("s")), ("PRODUCTO", pa.string()),
+               ("VARIANTE", pa.string()), ("CANTIDAD", pa.int64())]
+    if tipo == "Ventas":
+        resto = [("PRECIO UNITARIO", pa.float64()), ("TOTAL", pa.float64()), ("METODO PAGO", pa.string()),
+                 ("UBICACION", pa.string()), ("NOTAS", pa.string()), ("CLIENTE_ID", pa.int64())]
+    else:
+        resto = [("COSTO", pa.float64()), ("PROVEEDOR", pa.string()), ("METODO PAGO", pa.string()),
+                 ("UBICACION", pa.string()), ("NOTAS", pa.string())]
+    return pa.schema(comunes + resto)
+
+
+def escribir_parquet(tipo, destino, bloque=BLOQUE, **filtros):
+    """Escribe el Parquet en `destino` (ruta o archivo binario), un row group por bloque. Devuelve filas escritas."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import database as db
+    esquema = _esquema(tipo)
+    filas = 0
+    with pq.ParquetWriter(destino, esquema, compression="zstd") as escritor:
+        for df in db.iterar_movimientos(tipo, bloque=bloque, **filtros):
+            # Los DECIMAL de MySQL llegan como Decimal: pasarlos a float para el esquema fijo
+            for campo in esquema:
+                if pa.types.is_floating(campo.type):
+                    df[campo.name] = df[campo.name].astype(float)
+            escritor.write_table(pa.Table.from_pandas(df[esquema.names], schema=esquema, preserve_index=False))
+            filas += len(df)
+    return filas
+
+
+def escribir_csv(tipo, destino, bloque=BLOQUE, **filtros):
+    """Escribe el CSV en `destino` (archivo binario abierto). Devuelve bytes escritos."""
+    total = 0
+    for pedazo in bloques_csv(tipo, bloque, **filtros):
+        destino.write(pedazo)
+        total += len(pedazo)
+    return total
+
+
+def a_archivo_temporal(tipo, formato, bloque=BLOQUE, **filtros):
+    """
+    Genera la exportación en un archivo temporal en disco (la lectura y la escritura van de a
+    bloques) y devuelve su contenido en bytes, para `data` de st.download_button.
+    El botón sí guarda el archivo entero en memoria (Streamlit lo sirve desde ahí): para
+    historiales muy grandes usar la línea de comandos, que escribe directo al destino.
+    """
+    with tempfile.TemporaryFile() as archivo:
+        if formato == "parquet":
+            escribir_parquet(tipo, archivo, bloque, **filtros)
+        else:
+            escribir_csv(tipo, archivo, bloque, **filtros)
+        archivo.seek(0)
+        return archivo.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el historial de ventas o compras.")
+    parser.add_argument("tipo", choices=["ventas", "compras"])
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("-o", "--salida", help="archivo de salida (CSV: por defecto a la salida estándar)")
+    parser.add_argument("--sucursal")
+    parser.add_argument("--producto")
+    parser.add_argument("--desde", type=date.fromisoformat)
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--bloque", type=int, default=BLOQUE)
+    args = parser.parse_args()
+
+    tipo = args.tipo.capitalize()
+    filtros = dict(sucursal=args.sucursal, producto=args.producto, desde=args.desde, hasta=args.hasta)
+    if args.formato == "parquet":
+        if not args.salida:
+            parser.error("--formato parquet necesita -o/--salida")
+        n = escribir_parquet(tipo, args.salida, args.bloque, **filtros)
+        print(f"✅ {n} filas exportadas a {args.salida}", file=sys.stderr)
+    elif args.salida:
+        with open(args.salida, "wb") as f:
+            escribir_csv(tipo, f, args.bloque, **filtros)
+        print(f"✅ Exportado a {args.salida}", file=sys.stderr)
+    else:
+        escribir_csv(tipo, sys.stdout.buffer, args.bloque, **filtros)
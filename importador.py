@@ -0,0 +1,277 @@
+"""
+Importación masiva de compras y del catálogo desde CSV o Excel.
+
+El archivo se lee por bloques (nunca entero en memoria). Cada bloque se valida
+contra productos / variantes / sucursales con búsquedas en diccionarios (un solo
+viaje a la base por importación, vía el mapa de ids cacheado) y las filas válidas
+se escriben con sentencias multi-fila en una transacción por bloque. Las filas con
+problemas no se importan y quedan en el reporte de errores (número de fila + motivo).
+
+Productos, variantes y sucursales se buscan sin distinguir mayúsculas, acentos ni
+espacios de más ("  proteina  CHOCOLATE" es "Proteína Chocolate"), y se guardan como
+están escritos en la base.
+
+Columnas (los encabezados no distinguen mayúsculas ni acentos):
+    compras:  producto, variante, sucursal, cantidad, costo_total, proveedor, metodo_pago, notas, fecha
+              (variante, proveedor, metodo_pago, notas y fecha son opcionales; costo = costo total de la línea;
+               metodo_pago: Efectivo o Transferencia, vacío = Efectivo)
+    catalogo: nombre, costo, precio, variante   (una fila por sabor; variante opcional)
+
+Uso:
+    python importador.py compras remito.xlsx
+    python importador.py catalogo lista_precios.csv --errores errores.csv
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from buscador import normalizar
+
+BLOQUE = 5000
+METODO_DEFECTO = "Efectivo"
+METODOS = ("Efectivo", "Transferencia")  # las cuentas que lee Finanzas: otro método no se importa
+
+# Encabezados alternativos -> nombre interno
+ALIAS = {
+    "compras": {
+        "sabor": "variante", "sucursal_destino": "sucursal", "destino": "sucursal", "ubicacion": "sucursal",
+        "costo": "costo_total", "costo_total_de_la_compra": "costo_total", "metodo": "metodo_pago",
+        "pago": "metodo_pago", "nro_factura": "notas",
+    },
+    "catalogo": {"producto": "nombre", "sabor": "variante", "precio_venta": "precio"},
+}
+COLUMNAS = {
+    "compras": (["producto", "sucursal", "cantidad", "costo_total"], ["variante", "proveedor", "metodo_pago", "notas", "fecha"]),
+    "catalogo": (["nombre", "costo", "precio"], ["variante"]),
+}
+
+
+def _columna(nombre):
+    return "_".join(normalizar(nombre).split())
+
+
+def _clave(texto):
+    """Forma de comparar nombres: sin mayúsculas, acentos ni espacios de más."""
+    return " ".join(normalizar(texto).casefold().split())
+
+
+AMBIGUO = "ambiguo"
+
+
+def _indice(pares):
+    """(clave, (id, nombre en la base)) -> dict. Si dos nombres de la base comparten clave, esa clave es AMBIGUO."""
+    indice = {}
+    for clave, valor in pares:
+        indice[clave] = AMBIGUO if clave in indice else valor
+    return indice
+
+
+def _resolver(claves, indice):
+    """Serie de claves -> (ids, nombres como están en la base, máscara de ambiguas). Sin coincidencia: None."""
+    hallados = [indice.get(k) for k in claves]
+    ids = pd.Series([h[0] if isinstance(h, tuple) else None for h in hallados], index=claves.index, dtype="object")
+    nombres = pd.Series([h[1] if isinstance(h, tuple) else None for h in hallados], index=claves.index, dtype="object")
+    ambiguas = pd.Series([h is AMBIGUO for h in hallados], index=claves.index)
+    return ids, nombres, ambiguas
+
+
+def _no_encontrado(que, claves, ambiguas):
+    """Motivo por fila, con el nombre ya normalizado (lo que se buscó en la base)."""
+    return pd.Series([f"{que} {'ambiguo' if a else 'inexistente'}: '{k}'" for k, a in zip(claves, ambiguas)],
+                     index=claves.index, dtype="object")
+
+
+def leer_bloques(archivo, nombre_archivo, tamano=BLOQUE):
+    """Genera DataFrames de hasta `tamano` filas (todo como texto). `archivo`: ruta o archivo abierto."""
+    if nombre_archivo.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezado = [str(c or "") for c in next(filas, [])]
+            bloque = []
+            for fila in filas:
+                bloque.append(["" if v is None else v for v in fila])
+                if len(bloque) == tamano:
+                    yield pd.DataFrame(bloque, columns=encabezado)
+                    bloque = []
+            if bloque:
+                yield pd.DataFrame(bloque, columns=encabezado)
+        finally:
+            libro.close()
+    else:
+        # sep=None: detecta "," o ";" (las planillas en español suelen exportar con ";")
+        yield from pd.read_csv(archivo, sep=None, engine="python", dtype=str, keep_default_na=False,
+                               chunksize=tamano, encoding="utf-8-sig")
+
+
+def _preparar(df, tipo):
+    df = df.rename(columns=lambda c: ALIAS[tipo].get(_columna(c), _columna(c)))
+    obligatorias, opcionales = COLUMNAS[tipo]
+    faltan = [c for c in obligatorias if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas: {', '.join(faltan)}")
+    for c in opcionales:
+        if c not in df.columns:
+            df[c] = ""
+    df = df[obligatorias + opcionales].copy()
+    for c in df.columns:
+        df[c] = df[c].astype(str).str.strip().replace({"nan": "", "None": ""})
+    return df
+
+
+def _numero(serie):
+    # Acepta "1.234,50" y "1234.50"
+    texto = serie.str.replace(r"[$\s]", "", regex=True)
+    con_coma = texto.str.contains(",", regex=False)
+    texto = texto.where(~con_coma, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(texto, errors="coerce")
+
+
+def _fecha(serie):
+    """
+    Las celdas de fecha de Excel llegan como '2025-01-03 00:00:00': las que empiezan con el año
+    se leen como ISO; solo el resto (texto tipo '03/01/2025') se lee con el día primero.
+    """
+    iso = serie.str.match(r"\d{4}-\d{1,2}-\d{1,2}")
+    fecha = pd.to_datetime(serie.where(iso), errors="coerce", format="ISO8601")
+    texto = pd.to_datetime(serie.where(~iso & (serie != "")), errors="coerce", format="mixed", dayfirst=True)
+    return fecha.where(iso, texto)
+
+
+def _motivos(df, chequeos):
+    """chequeos: lista de (máscara de filas con error, motivo o Serie de motivos). Devuelve Serie fila -> 'motivo; motivo'."""
+    motivos = pd.Series("", index=df.index)
+    for mascara, motivo in chequeos:
+        motivos = motivos.where(~mascara, motivos + motivo + "; ")
+    return motivos.str.rstrip("; ")
+
+
+def validar_compras(df, mapa_ids):
+    """
+    mapa_ids: (productos, sucursales, variantes) como los devuelve database._mapa_ids().
+    Devuelve (filas para registrar_compras_lote, DataFrame de errores con columna 'motivo').
+    """
+    productos, sucursales, variantes = mapa_ids
+    cp, cs, cv = df["producto"].map(_clave), df["sucursal"].map(_clave), df["variante"].map(_clave)
+    id_p, producto, amb_p = _resolver(cp, _indice((_clave(n), (i, n)) for n, i in productos.items()))
+    id_s, sucursal, amb_s = _resolver(cs, _indice((_clave(n), (i, n)) for n, i in sucursales.items()))
+    id_v, variante, amb_v = _resolver(
+        pd.Series(list(zip(id_p, cv)), index=df.index, dtype="object"),
+        _indice(((i_p, _clave(n)), (i_v, n)) for (i_p, n), i_v in variantes.items()),
+    )
+    sin_variante = cv == ""
+    id_v, variante = id_v.where(~sin_variante, 0), variante.where(~sin_variante, "")
+    cantidad = _numero(df["cantidad"])
+    costo = _numero(df["costo_total"])
+    fecha = _fecha(df["fecha"])
+    cm = df["metodo_pago"].map(_clave)
+    metodo = cm.map({_clave(m): m for m in METODOS}).where(cm != "", METODO_DEFECTO)
+    motivos = _motivos(df, [
+        (id_p.isna(), _no_encontrado("producto", cp, amb_p)),
+        (id_p.notna() & id_v.isna(), _no_encontrado("variante", cv, amb_v)),
+        (id_s.isna(), _no_encontrado("sucursal", cs, amb_s)),
+        (cantidad.isna() | (cantidad <= 0) | (cantidad % 1 != 0), "cantidad inválida"),
+        (costo.isna() | (costo < 0), "costo inválido"),
+        ((df["fecha"] != "") & fecha.isna(), "fecha inválida"),
+        (metodo.isna(), "método de pago inválido: '" + cm + "' (" + " / ".join(METODOS) + ")"),
+    ])
+    ok = motivos == ""
+    filas = list(zip(
+        [f.to_pydatetime() if pd.notna(f) else None for f in fecha[ok]],
+        id_p[ok].astype(int), id_v[ok].astype(int), id_s[ok].astype(int),
+        producto[ok], variante[ok],
+        cantidad[ok].astype(int), costo[ok].astype(float).round(2),
+        df.loc[ok, "proveedor"], metodo[ok], sucursal[ok], df.loc[ok, "notas"],
+    ))
+    filas = [tuple(x.item() if hasattr(x, "item") else x for x in f) for f in filas]
+    return filas, df[~ok].assign(motivo=motivos[~ok])
+
+
+def validar_catalogo(df, mapa_ids=({}, {}, {})):
+    """
+    mapa_ids: como en validar_compras. Un producto o variante que ya existe se actualiza con el
+    nombre de la base; uno nuevo se crea como aparece por primera vez en el archivo.
+    Devuelve (productos, variantes para guardar_catalogo_lote, DataFrame de errores con columna 'motivo').
+    """
+    productos_db, _, variantes_db = mapa_ids
+    cp, cv = df["nombre"].map(_clave), df["variante"].map(_clave)
+    id_p, nombre, amb_p = _resolver(cp, _indice((_clave(n), (i, n)) for n, i in productos_db.items()))
+    nombre = nombre.fillna(df["nombre"].groupby(cp).transform("first"))
+    _, variante, amb_v = _resolver(
+        pd.Series(list(zip(id_p, cv)), index=df.index, dtype="object"),
+        _indice(((i_p, _clave(n)), (i_v, n)) for (i_p, n), i_v in variantes_db.items()),
+    )
+    variante = variante.fillna(df["variante"].groupby([cp, cv]).transform("first"))
+    costo, precio = _numero(df["costo"]), _numero(df["precio"])
+    motivos = _motivos(df, [
+        (cp == "", "nombre vacío"),
+        (amb_p, _no_encontrado("producto", cp, amb_p)),
+        (amb_v, _no_encontrado("variante", cv, amb_v)),
+        (costo.isna() | (costo < 0), "costo inválido"),
+        (precio.isna() | (precio < 0), "precio inválido"),
+    ])
+    ok = motivos == ""
+    # Si un producto aparece en varias filas (una por sabor), vale el último precio
+    base = pd.DataFrame({"clave": cp[ok], "nombre": nombre[ok], "costo": costo[ok], "precio": precio[ok]}).drop_duplicates("clave", keep="last")
+    productos = [(n, float(c), float(p)) for _, n, c, p in base.itertuples(index=False)]
+    con_var = ok & (cv != "")
+    variantes = list(dict.fromkeys(zip(nombre[con_var], variante[con_var])))
+    return productos, variantes, df[~ok].assign(motivo=motivos[~ok])
+
+
+def importar(archivo, nombre_archivo, tipo, tamano=BLOQUE, progreso=None):
+    """
+    Importa el archivo por bloques. tipo: "compras" o "catalogo".
+    progreso: función opcional (filas_leidas) que se llama después de cada bloque.
+    Devuelve dict con filas leídas, importadas y el DataFrame de errores (fila, motivo, columnas originales).
+    """
+    import database as db
+    leidas, importadas, errores = 0, 0, []
+    mapa = db._mapa_ids() if tipo == "compras" else None
+    for bloque in leer_bloques(archivo, nombre_archivo, tamano):
+        df = _preparar(bloque, tipo)
+        # Número de fila como lo ve el usuario en la planilla (la 1 es el encabezado)
+        df.index = range(leidas + 2, leidas + 2 + len(df))
+        leidas += len(df)
+        df = df[(df != "").any(axis=1)]  # filas vacías (comunes al final de un Excel)
+        if tipo == "compras":
+            filas, malas = validar_compras(df, mapa)
+            ok, res = db.registrar_compras_lote(filas)
+            n_ok = res if ok else 0
+        else:
+            # El mapa se vuelve a leer por bloque: el anterior pudo dar de alta productos
+            productos, variantes, malas = validar_catalogo(df, db._mapa_ids())
+            ok, res = db.guardar_catalogo_lote(productos, variantes)
+            n_ok = len(df) - len(malas) if ok else 0
+        if not ok:
+            # Falló la escritura del bloque entero (se deshizo): todas sus filas válidas van al reporte
+            validas = df.drop(index=malas.index)
+            malas = pd.concat([malas, validas.assign(motivo=f"error al guardar el bloque: {res}")])
+        importadas += n_ok
+        if not malas.empty:
+            errores.append(malas)
+        if progreso:
+            progreso(leidas)
+    df_err = pd.concat(errores) if errores else pd.DataFrame(columns=["motivo"])
+    df_err = df_err.rename_axis("fila").reset_index().sort_values("fila")
+    return {"leidas": leidas, "importadas": importadas, "errores": df_err}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa compras o catálogo desde CSV / Excel.")
+    parser.add_argument("tipo", choices=sorted(COLUMNAS))
+    parser.add_argument("archivo")
+    parser.add_argument("--bloque", type=int, default=BLOQUE)
+    parser.add_argument("--errores", help="CSV donde guardar las filas rechazadas")
+    args = parser.parse_args()
+
+    r = importar(args.archivo, os.path.basename(args.archivo), args.tipo, args.bloque,
+                 progreso=lambda n: print(f"  {n} filas leídas...", end="\r"))
+    print(f"\n✅ {r['importadas']} de {r['leidas']} filas importadas. ❌ {len(r['errores'])} con errores.")
+    if args.errores and not r["errores"].empty:
+        r["errores"].to_csv(args.errores, index=False)
+        print(f"Reporte de errores: {args.errores}")
+    sys.exit(1 if len(r["errores"]) else 0)
@@ -0,0 +1,556 @@
+"""
+Migraciones versionadas de la base de datos.
+
+Cada migración tiene un número de versión y se aplica una sola vez: la tabla
+`schema_version` guarda cuáles ya corrieron. Todas son idempotentes (revisan
+information_schema antes de tocar nada) para poder adoptar bases que ya
+fueron reparadas a mano con los scripts viejos.
+
+Uso:
+    python migraciones.py            # aplica las pendientes
+    python migraciones.py --estado   # muestra qué versiones están aplicadas
+    python migraciones.py --reconstruir-resumen   # regenera resumen_diario desde ventas/compras
+    python migraciones.py --instantanea-stock     # guarda una instantánea del libro de stock (para cron)
+"""
+import sys
+from datetime import datetime
+
+# --- HELPERS DE ESQUEMA ---
+def _columna_existe(cursor, tabla, columna):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (tabla, columna),
+    )
+    return cursor.fetchone() is not None
+
+def _indice_existe(cursor, tabla, indice):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (tabla, indice),
+    )
+    return cursor.fetchone() is not None
+
+def _constraint_existe(cursor, tabla, nombre):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TABLE_CONSTRAINTS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = %s",
+        (tabla, nombre),
+    )
+    return cursor.fetchone() is not None
+
+def _agregar_columna(cursor, tabla, columna, definicion):
+    if not _columna_existe(cursor, tabla, columna):
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+# --- MIGRACIONES ---
+def m001_tablas_base(cursor):
+    """Tablas originales (aurum_db.sql), para poder levantar una base vacía."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS productos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL UNIQUE,
+            costo DECIMAL(10,2) DEFAULT 0.00,
+            precio DECIMAL(10,2) DEFAULT 0.00
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sucursales (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL UNIQUE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventario (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            producto_nombre VARCHAR(255),
+            sucursal_nombre VARCHAR(100),
+            cantidad INT DEFAULT 0,
+            UNIQUE KEY unique_stock (producto_nombre, sucursal_nombre)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ventas (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            fecha DATETIME,
+            producto VARCHAR(255),
+            cantidad INT,
+            precio_unitario DECIMAL(10,2),
+            total DECIMAL(10,2),
+            metodo_pago VARCHAR(50),
+            ubicacion VARCHAR(100),
+            notas TEXT
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS compras (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            fecha DATETIME,
+            producto VARCHAR(255),
+            cantidad INT,
+            costo_total DECIMAL(10,2),
+            metodo_pago VARCHAR(50),
+            proveedor VARCHAR(255),
+            ubicacion VARCHAR(50),
+            notas TEXT
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saldos_iniciales (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            cuenta VARCHAR(50) UNIQUE,
+            monto DECIMAL(10,2) DEFAULT 0.00
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("INSERT IGNORE INTO saldos_iniciales (cuenta, monto) VALUES ('Efectivo', 0), ('Transferencia', 0)")
+
+def m002_productos_activo(cursor):
+    """Borrado lógico de productos (ex fix_cloud.py / migracion_stock_v2.py)."""
+    _agregar_columna(cursor, "productos", "activo", "TINYINT(1) DEFAULT 1")
+    cursor.execute("UPDATE productos SET activo = 1 WHERE activo IS NULL")
+    # migracion_stock_v2 creaba idx_prod_nombre, pero 'nombre' ya tiene índice UNIQUE: no se repite.
+
+def m003_clientes(cursor):
+    """Clientes y ventas.cliente_id (ex actualizar_db.py)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL UNIQUE,
+            ubicacion VARCHAR(100),
+            fecha_alta DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("INSERT IGNORE INTO clientes (nombre, ubicacion) VALUES ('Consumidor Final', 'General')")
+    cursor.execute("SELECT id FROM clientes WHERE nombre = 'Consumidor Final'")
+    id_consumidor_final = cursor.fetchone()[0]
+
+    _agregar_columna(cursor, "ventas", "cliente_id", "INT DEFAULT NULL")
+    if not _constraint_existe(cursor, "ventas", "fk_venta_cliente"):
+        cursor.execute("ALTER TABLE ventas ADD CONSTRAINT fk_venta_cliente FOREIGN KEY (cliente_id) REFERENCES clientes(id)")
+
+    # Ventas viejas sin cliente -> Consumidor Final
+    cursor.execute("UPDATE ventas SET cliente_id = %s WHERE cliente_id IS NULL", (id_consumidor_final,))
+
+def m004_variantes(cursor):
+    """Variantes (sabores) en catálogo, inventario e historiales (ex migracion_variantes.py)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS variantes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            producto_nombre VARCHAR(255),
+            nombre_variante VARCHAR(100),
+            FOREIGN KEY (producto_nombre) REFERENCES productos(nombre) ON DELETE CASCADE,
+            UNIQUE KEY unique_var (producto_nombre, nombre_variante)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    _agregar_columna(cursor, "inventario", "variante", "VARCHAR(100) DEFAULT ''")
+    cursor.execute("UPDATE inventario SET variante = '' WHERE variante IS NULL")
+
+    # La clave única del inventario pasa a incluir la variante
+    if not _indice_existe(cursor, "inventario", "unique_stock_var"):
+        cursor.execute("ALTER TABLE inventario ADD UNIQUE KEY unique_stock_var (producto_nombre, sucursal_nombre, variante)")
+    if _indice_existe(cursor, "inventario", "unique_stock"):
+        cursor.execute("ALTER TABLE inventario DROP INDEX unique_stock")
+
+    _agregar_columna(cursor, "ventas", "variante", "VARCHAR(100) DEFAULT ''")
+    _agregar_columna(cursor, "compras", "variante", "VARCHAR(100) DEFAULT ''")
+
+def m005_compras_envio(cursor):
+    """Costo de envío en compras (ex migrate_db.py)."""
+    _agregar_columna(cursor, "compras", "envio", "DECIMAL(10,2) DEFAULT 0.00")
+
+def m006_claves_enteras(cursor):
+    """
+    Claves enteras: producto_id / variante_id / sucursal_id en variantes, inventario,
+    ventas y compras. variante_id = 0 significa "sin variante".
+    El inventario pierde las columnas de texto; ventas y compras las conservan
+    como etiqueta histórica (nombre al momento de la operación).
+    """
+    # 1. variantes -> producto_id
+    _agregar_columna(cursor, "variantes", "producto_id", "INT NULL AFTER id")
+    cursor.execute("UPDATE variantes v JOIN productos p ON p.nombre = v.producto_nombre SET v.producto_id = p.id WHERE v.producto_id IS NULL")
+    cursor.execute("DELETE FROM variantes WHERE producto_id IS NULL")
+    cursor.execute("ALTER TABLE variantes MODIFY producto_id INT NOT NULL")
+    if not _indice_existe(cursor, "variantes", "uq_variante"):
+        cursor.execute("ALTER TABLE variantes ADD UNIQUE KEY uq_variante (producto_id, nombre_variante)")
+    if not _constraint_existe(cursor, "variantes", "fk_variante_producto"):
+        cursor.execute("ALTER TABLE variantes ADD CONSTRAINT fk_variante_producto FOREIGN KEY (producto_id) REFERENCES productos(id) ON DELETE CASCADE")
+
+    # 2. inventario -> (producto_id, sucursal_id, variante_id)
+    if _columna_existe(cursor, "inventario", "producto_nombre"):
+        _agregar_columna(cursor, "inventario", "producto_id", "INT NULL")
+        _agregar_columna(cursor, "inventario", "sucursal_id", "INT NULL")
+        _agregar_columna(cursor, "inventario", "variante_id", "INT NOT NULL DEFAULT 0")
+        # Sabores que solo quedaron en el inventario (renombres a medias): se recrean para no perder ese stock
+        cursor.execute("""
+            INSERT IGNORE INTO variantes (producto_nombre, producto_id, nombre_variante)
+            SELECT DISTINCT p.nombre, p.id, i.variante FROM inventario i JOIN productos p ON p.nombre = i.producto_nombre
+            WHERE i.variante <> ''
+        """)
+        cursor.execute("UPDATE inventario i JOIN productos p ON p.nombre = i.producto_nombre SET i.producto_id = p.id")
+        cursor.execute("UPDATE inventario i JOIN sucursales s ON s.nombre = i.sucursal_nombre SET i.sucursal_id = s.id")
+        cursor.execute("""
+            UPDATE inventario i JOIN variantes v ON v.producto_id = i.producto_id AND v.nombre_variante = i.variante
+            SET i.variante_id = v.id
+        """)
+        # Stock de productos o sucursales que ya no existen: la app nunca pudo mostrarlo
+        cursor.execute("DELETE FROM inventario WHERE producto_id IS NULL OR sucursal_id IS NULL")
+        indice_viejo = "DROP INDEX unique_stock_var," if _indice_existe(cursor, "inventario", "unique_stock_var") else ""
+        cursor.execute(f"""
+            ALTER TABLE inventario
+                MODIFY producto_id INT NOT NULL,
+                MODIFY sucursal_id INT NOT NULL,
+                {indice_viejo}
+                ADD UNIQUE KEY uq_inventario (producto_id, sucursal_id, variante_id),
+                DROP COLUMN producto_nombre,
+                DROP COLUMN sucursal_nombre,
+                DROP COLUMN variante
+        """)
+
+    # 3. ventas / compras -> ids (las columnas de texto quedan como etiqueta histórica)
+    for tabla in ("ventas", "compras"):
+        _agregar_columna(cursor, tabla, "producto_id", "INT NULL")
+        _agregar_columna(cursor, tabla, "variante_id", "INT NOT NULL DEFAULT 0")
+        _agregar_columna(cursor, tabla, "sucursal_id", "INT NULL")
+        cursor.execute(f"UPDATE {tabla} t JOIN productos p ON p.nombre = t.producto SET t.producto_id = p.id WHERE t.producto_id IS NULL")
+        cursor.execute(f"UPDATE {tabla} t JOIN sucursales s ON s.nombre = t.ubicacion SET t.sucursal_id = s.id WHERE t.sucursal_id IS NULL")
+        cursor.execute(f"""
+            UPDATE {tabla} t JOIN variantes v ON v.producto_id = t.producto_id AND v.nombre_variante = t.variante
+            SET t.variante_id = v.id WHERE t.variante_id = 0 AND t.variante <> ''
+        """)
+
+def m007_indices_historial(cursor):
+    """
+    Índices de ventas/compras pensados para las consultas de database.py:
+    - (fecha): Movimientos sin filtro, ORDER BY fecha DESC, id DESC (el id viaja en el índice)
+    - (sucursal_id, fecha): Movimientos filtrado por sucursal, mismo orden
+    - (producto_id, variante_id, fecha): historial de un SKU
+    - (cliente_id, total): cubre el SUM por cliente de obtener_clientes_metricas
+    - (metodo_pago, total) / (metodo_pago, costo_total): cubren los SUM de Finanzas
+    """
+    indices = [
+        ("ventas", "idx_ventas_fecha", "(fecha)"),
+        ("ventas", "idx_ventas_sucursal_fecha", "(sucursal_id, fecha)"),
+        ("ventas", "idx_ventas_sku_fecha", "(producto_id, variante_id, fecha)"),
+        ("ventas", "idx_ventas_cliente_total", "(cliente_id, total)"),
+        ("ventas", "idx_ventas_metodo_total", "(metodo_pago, total)"),
+        ("compras", "idx_compras_fecha", "(fecha)"),
+        ("compras", "idx_compras_sucursal_fecha", "(sucursal_id, fecha)"),
+        ("compras", "idx_compras_sku_fecha", "(producto_id, variante_id, fecha)"),
+        ("compras", "idx_compras_metodo_costo", "(metodo_pago, costo_total)"),
+        ("productos", "idx_productos_activo_nombre", "(activo, nombre)"),
+    ]
+    for tabla, nombre, columnas in indices:
+        if not _indice_existe(cursor, tabla, nombre):
+            cursor.execute(f"ALTER TABLE {tabla} ADD INDEX {nombre} {columnas}")
+    # El índice que MySQL creó solo para la FK de cliente queda cubierto por idx_ventas_cliente_total
+    if _indice_existe(cursor, "ventas", "fk_venta_cliente"):
+        cursor.execute("ALTER TABLE ventas DROP INDEX fk_venta_cliente")
+
+def llenar_resumen_diario(cursor):
+    """Vacía resumen_diario y lo recalcula desde todo el historial de ventas y compras."""
+    cursor.execute("DELETE FROM resumen_diario")
+    cursor.execute("""
+        INSERT INTO resumen_diario (dia, sucursal_id, producto_id, variante_id, metodo_pago, unidades_vendidas, ingresos, ventas)
+        SELECT DATE(fecha), COALESCE(sucursal_id, 0), COALESCE(producto_id, 0), variante_id, COALESCE(metodo_pago, ''),
+               COALESCE(SUM(cantidad), 0), COALESCE(SUM(total), 0), COUNT(*)
+        FROM ventas WHERE fecha IS NOT NULL
+        GROUP BY DATE(fecha), COALESCE(sucursal_id, 0), COALESCE(producto_id, 0), variante_id, COALESCE(metodo_pago, '')
+    """)
+    cursor.execute("""
+        INSERT INTO resumen_diario (dia, sucursal_id, producto_id, variante_id, metodo_pago, unidades_compradas, costo, compras)
+        SELECT DATE(fecha), COALESCE(sucursal_id, 0), COALESCE(producto_id, 0), variante_id, COALESCE(metodo_pago, ''),
+               COALESCE(SUM(cantidad), 0), COALESCE(SUM(costo_total), 0), COUNT(*)
+        FROM compras WHERE fecha IS NOT NULL
+        GROUP BY DATE(fecha), COALESCE(sucursal_id, 0), COALESCE(producto_id, 0), variante_id, COALESCE(metodo_pago, '')
+        ON DUPLICATE KEY UPDATE unidades_compradas = VALUES(unidades_compradas), costo = VALUES(costo), compras = VALUES(compras)
+    """)
+
+def m008_resumen_diario(cursor):
+    """Tabla de totales diarios por (día, sucursal, producto, variante, método de pago) y carga inicial."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS resumen_diario (
+            dia DATE NOT NULL,
+            sucursal_id INT NOT NULL DEFAULT 0,
+            producto_id INT NOT NULL DEFAULT 0,
+            variante_id INT NOT NULL DEFAULT 0,
+            metodo_pago VARCHAR(50) NOT NULL DEFAULT '',
+            unidades_vendidas INT NOT NULL DEFAULT 0,
+            ingresos DECIMAL(14,2) NOT NULL DEFAULT 0,
+            ventas INT NOT NULL DEFAULT 0,
+            unidades_compradas INT NOT NULL DEFAULT 0,
+            costo DECIMAL(14,2) NOT NULL DEFAULT 0,
+            compras INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, sucursal_id, producto_id, variante_id, metodo_pago),
+            KEY idx_resumen_metodo (metodo_pago, ventas, ingresos, compras, costo)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    llenar_resumen_diario(cursor)
+
+def m009_cuentas(cursor):
+    """
+    Libro de cuentas (Caja / Banco): saldo actual por cuenta y un movimiento por operación.
+    La historia previa se carga como saldo inicial + un movimiento por día y cuenta
+    (desde resumen_diario), con el saldo acumulado calculado en la base.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cuentas (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(50) NOT NULL UNIQUE,
+            saldo DECIMAL(14,2) NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movimientos_cuenta (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            cuenta_id INT NOT NULL,
+            fecha DATETIME NOT NULL,
+            monto DECIMAL(14,2) NOT NULL,
+            saldo DECIMAL(14,2) NOT NULL,
+            origen VARCHAR(30) NOT NULL,
+            referencia_id INT NULL,
+            KEY idx_movcuenta_fecha (cuenta_id, fecha, id),
+            CONSTRAINT fk_movcuenta_cuenta FOREIGN KEY (cuenta_id) REFERENCES cuentas(id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("SELECT COUNT(*) FROM movimientos_cuenta")
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute("""
+        INSERT IGNORE INTO cuentas (nombre)
+        SELECT cuenta FROM saldos_iniciales WHERE cuenta IS NOT NULL
+        UNION SELECT DISTINCT metodo_pago FROM resumen_diario WHERE metodo_pago <> ''
+    """)
+    cursor.execute("""
+        INSERT INTO movimientos_cuenta (cuenta_id, fecha, monto, saldo, origen)
+        SELECT c.id, (SELECT COALESCE(MIN(dia), CURDATE()) FROM resumen_diario), s.monto, 0, 'inicial'
+        FROM saldos_iniciales s JOIN cuentas c ON c.nombre = s.cuenta
+        WHERE s.monto <> 0
+    """)
+    cursor.execute("""
+        INSERT INTO movimientos_cuenta (cuenta_id, fecha, monto, saldo, origen)
+        SELECT c.id, TIMESTAMP(r.dia, '23:59:59'), SUM(r.ingresos) - SUM(r.costo), 0, 'historial'
+        FROM resumen_diario r JOIN cuentas c ON c.nombre = r.metodo_pago
+        GROUP BY c.id, r.dia
+        ORDER BY r.dia, c.id
+    """)
+    cursor.execute("""
+        UPDATE movimientos_cuenta m
+        JOIN (SELECT id, SUM(monto) OVER (PARTITION BY cuenta_id ORDER BY fecha, id) AS acumulado
+              FROM movimientos_cuenta) x ON x.id = m.id
+        SET m.saldo = x.acumulado
+    """)
+    cursor.execute("""
+        UPDATE cuentas c
+        SET saldo = (SELECT COALESCE(SUM(m.monto), 0) FROM movimientos_cuenta m WHERE m.cuenta_id = c.id)
+    """)
+
+def m010_cambios_historial(cursor):
+    """
+    Registro de ventas / compras editadas o borradas (id de la fila, no el detalle).
+    Lo consume analitica.py para refrescar su copia columnar sin releer todo el historial;
+    las altas no se registran: se detectan por id.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cambios_historial (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            tabla VARCHAR(10) NOT NULL,
+            fila_id INT NOT NULL,
+            fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_cambios_tabla (tabla, id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+def m011_operaciones_aplicadas(cursor):
+    """
+    Uid de cada operación del diario local (diario_local.py) ya aplicada. Se inserta en la
+    misma transacción que la venta / compra: reenviar un lote no la duplica.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS operaciones_aplicadas (
+            uid CHAR(32) PRIMARY KEY,
+            tipo VARCHAR(10) NOT NULL,
+            aplicada DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+def m012_busqueda_texto(cursor):
+    """
+    Índices FULLTEXT para el buscador de Movimientos (database.buscar_movimientos):
+    facturas en notas, proveedor, producto y variante, y nombre de cliente. Uno por ALTER: el primer índice
+    FULLTEXT de una tabla InnoDB la reconstruye (agrega FTS_DOC_ID).
+    Las palabras de menos de innodb_ft_min_token_size letras (3 por defecto) no se indexan.
+    """
+    indices = [
+        ("ventas", "ft_ventas_texto", "(producto, variante, notas)"),
+        ("compras", "ft_compras_texto", "(producto, variante, proveedor, notas)"),
+        ("clientes", "ft_clientes_nombre", "(nombre)"),
+    ]
+    for tabla, nombre, columnas in indices:
+        if not _indice_existe(cursor, tabla, nombre):
+            cursor.execute(f"ALTER TABLE {tabla} ADD FULLTEXT INDEX {nombre} {columnas}")
+
+def abrir_movimientos_stock(cursor):
+    """Un movimiento 'apertura' por SKU × sucursal con stock: desde acá el libro suma lo mismo que inventario."""
+    cursor.execute("""
+        INSERT INTO movimientos_stock (fecha, producto_id, sucursal_id, variante_id, delta, origen)
+        SELECT NOW(), producto_id, sucursal_id, variante_id, cantidad, 'apertura' FROM inventario WHERE cantidad <> 0
+    """)
+
+def m013_movimientos_stock(cursor):
+    """
+    Libro de stock: cada cambio de inventario.cantidad deja una fila en movimientos_stock
+    (delta, origen y la venta / compra que lo causó); inventario queda como el estado actual.
+    instantaneas_stock guarda cada tanto el stock completo que suma el libro hasta un
+    movimiento: el stock a una fecha sale de la instantánea anterior más lo posterior a ella.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movimientos_stock (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            fecha DATETIME NOT NULL,
+            producto_id INT NOT NULL,
+            sucursal_id INT NOT NULL,
+            variante_id INT NOT NULL DEFAULT 0,
+            delta INT NOT NULL,
+            origen VARCHAR(20) NOT NULL,
+            referencia_id INT NULL,
+            KEY idx_movstock_sku (producto_id, sucursal_id, variante_id, id),
+            KEY idx_movstock_fecha (fecha)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS instantaneas_stock (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            fecha DATETIME NOT NULL,
+            hasta_movimiento BIGINT NOT NULL,
+            KEY idx_instantaneas_fecha (fecha)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS instantaneas_stock_filas (
+            instantanea_id INT NOT NULL,
+            producto_id INT NOT NULL,
+            sucursal_id INT NOT NULL,
+            variante_id INT NOT NULL DEFAULT 0,
+            cantidad INT NOT NULL,
+            PRIMARY KEY (instantanea_id, producto_id, sucursal_id, variante_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("SELECT COUNT(*) FROM movimientos_stock")
+    if cursor.fetchone()[0] == 0:
+        abrir_movimientos_stock(cursor)
+
+def m014_ventas_carrito(cursor):
+    """
+    ventas.carrito_id: el id de la primera línea del carrito, en todas sus líneas. Agrupa
+    el comprobante sin adivinar por fecha y cliente. Las ventas anteriores quedan en NULL
+    (comprobante de una sola línea).
+    """
+    _agregar_columna(cursor, "ventas", "carrito_id", "INT NULL")
+    if not _indice_existe(cursor, "ventas", "idx_ventas_carrito"):
+        cursor.execute("ALTER TABLE ventas ADD INDEX idx_ventas_carrito (carrito_id)")
+
+MIGRACIONES = [
+    (1, "tablas_base", m001_tablas_base),
+    (2, "productos_activo", m002_productos_activo),
+    (3, "clientes", m003_clientes),
+    (4, "variantes", m004_variantes),
+    (5, "compras_envio", m005_compras_envio),
+    (6, "claves_enteras", m006_claves_enteras),
+    (7, "indices_historial", m007_indices_historial),
+    (8, "resumen_diario", m008_resumen_diario),
+    (9, "cuentas", m009_cuentas),
+    (10, "cambios_historial", m010_cambios_historial),
+    (11, "operaciones_aplicadas", m011_operaciones_aplicadas),
+    (12, "busqueda_texto", m012_busqueda_texto),
+    (13, "movimientos_stock", m013_movimientos_stock),
+    (14, "ventas_carrito", m014_ventas_carrito),
+]
+
+# --- MOTOR ---
+def _asegurar_tabla_version(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            aplicada_en DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+def versiones_aplicadas(cursor):
+    _asegurar_tabla_version(cursor)
+    cursor.execute("SELECT version FROM schema_version")
+    return {r[0] for r in cursor.fetchall()}
+
+def ejecutar_migraciones(conn, log=print):
+    """
+    Aplica en orden las migraciones pendientes. Devuelve la lista de versiones aplicadas.
+    Usa un lock con nombre para que dos procesos que arrancan juntos no migren a la vez.
+    """
+    cursor = conn.cursor(buffered=True)
+    aplicadas_ahora = []
+    cursor.execute("SELECT GET_LOCK('aurum_migraciones', 60)")
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("No se pudo tomar el lock de migraciones (¿otra instancia migrando?)")
+    try:
+        ya = versiones_aplicadas(cursor)
+        for version, nombre, funcion in MIGRACIONES:
+            if version in ya:
+                continue
+            log(f"--- Aplicando migración {version:03d} ({nombre})...")
+            try:
+                funcion(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, nombre, aplicada_en) VALUES (%s, %s, %s)",
+                    (version, nombre, datetime.now()),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            aplicadas_ahora.append(version)
+            log(f"✅ Migración {version:03d} aplicada.")
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('aurum_migraciones')")
+        cursor.fetchall()
+        cursor.close()
+    return aplicadas_ahora
+
+def version_actual(conn):
+    cursor = conn.cursor(buffered=True)
+    try:
+        ya = versiones_aplicadas(cursor)
+        return max(ya) if ya else 0
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    from database import get_db_connection, _ruta_sqlite
+
+    conn = get_db_connection()
+    try:
+        if "--reconstruir-resumen" in sys.argv:
+            from database import reconstruir_resumen_diario
+            ok, res = reconstruir_resumen_diario()
+            print(f"✅ resumen_diario regenerado ({res} filas)." if ok else f"❌ Error: {res}")
+        elif "--instantanea-stock" in sys.argv:
+            from database import tomar_instantanea_stock
+            ok, res = tomar_instantanea_stock()
+            print((f"✅ Instantánea de stock #{res} guardada." if res else "ℹ️ Sin movimientos de stock nuevos.") if ok else f"❌ Error: {res}")
+        elif _ruta_sqlite():
+            # SQLite se crea directo en la versión final (base_sqlite.crear_esquema)
+            from database import inicializar_db
+            inicializar_db()
+            print(f"ℹ️ Base SQLite {_ruta_sqlite()}: esquema al día.")
+        elif "--estado" in sys.argv:
+            cursor = conn.cursor(buffered=True)
+            ya = versiones_aplicadas(cursor)
+            for version, nombre, _ in MIGRACIONES:
+                marca = "✅" if version in ya else "⏳"
+                print(f"{marca} {version:03d} {nombre}")
+        else:
+            print("🔄 Iniciando migración de base de datos...")
+            hechas = ejecutar_migraciones(conn)
+            if hechas:
+                print(f"🚀 {len(hechas)} migración(es) aplicada(s).")
+            else:
+                print("ℹ️ La base ya estaba al día.")
+    finally:
+        conn.close()
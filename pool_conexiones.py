@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+
+class ConexionPool:
+    """
+    Conexión prestada por el pool.
+    Se usa igual que una conexión de mysql.connector, pero close() la devuelve
+    al pool en vez de cortar el socket (así las funciones de database.py no cambian).
+    """
+
+    def __init__(self, pool, cnx, creada):
+        self._pool = pool
+        self._cnx = cnx
+        self._creada = creada
+        self._devuelta = False
+
+    def close(self):
+        if not self._devuelta:
+            self._devuelta = True
+            self._pool._devolver(self)
+
+    def is_connected(self):
+        # Una conexión ya devuelta no debe volver a usarse desde afuera
+        return not self._devuelta and self._cnx.is_connected()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cnx, nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones MySQL compartido por todo el proceso (todas las sesiones de Streamlit).
+
+    - tamano: máximo de conexiones abiertas a la vez. Si están todas prestadas,
+      obtener() espera hasta `espera_max` segundos a que alguien devuelva una.
+    - reciclar_seg: las conexiones más viejas que esto se cierran y se reabren
+      (evita que el servidor las corte por wait_timeout).
+    - ping_seg: si una conexión estuvo ociosa más que esto, se le hace ping antes
+      de prestarla; si no responde se descarta y se abre otra.
+    """
+
+    def __init__(self, config, tamano=5, reciclar_seg=1800, ping_seg=30, espera_max=10):
+        self.config = dict(config)
+        self.tamano = tamano
+        self.reciclar_seg = reciclar_seg
+        self.ping_seg = ping_seg
+        self.espera_max = espera_max
+
+        self._libres = deque()  # (cnx, creada, ultimo_uso)
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(tamano)
+
+    # --- CICLO DE VIDA ---
+    def _abrir(self):
+        return mysql.connector.connect(**self.config), time.monotonic()
+
+    def _cerrar(self, cnx):
+        try:
+            cnx.close()
+        except Exception:
+            pass
+
+    def _sana(self, cnx, creada, ultimo_uso):
+        ahora = time.monotonic()
+        if self.reciclar_seg and ahora - creada > self.reciclar_seg:
+            return False
+        if ahora - ultimo_uso > self.ping_seg:
+            try:
+                cnx.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def obtener(self):
+        if not self._cupos.acquire(timeout=self.espera_max):
+            raise mysql.connector.errors.PoolError(
+                f"Pool agotado: {self.tamano} conexiones en uso durante {self.espera_max}s"
+            )
+        try:
+            while True:
+                with self._lock:
+                    libre = self._libres.pop() if self._libres else None
+                if libre is None:
+                    cnx, creada = self._abrir()
+                    break
+                cnx, creada, ultimo_uso = libre
+                if self._sana(cnx, creada, ultimo_uso):
+                    break
+                self._cerrar(cnx)
+        except Exception:
+            self._cupos.release()
+            raise
+        return ConexionPool(self, cnx, creada)
+
+    def _devolver(self, prestada):
+        cnx = prestada._cnx
+        try:
+            # Nunca devolver una conexión con una transacción abierta:
+            # la siguiente sesión leería un snapshot viejo o heredaría cambios sin commit.
+            if cnx.unread_result:
+                cnx.consume_results()
+            if cnx.in_transaction:
+                cnx.rollback()
+            with self._lock:
+                self._libres.append((cnx, prestada._creada, time.monotonic()))
+        except Exception:
+            self._cerrar(cnx)
+        finally:
+            self._cupos.release()
+
+    def cerrar_todo(self):
+        with self._lock:
+            libres, self._libres = list(self._libres), deque()
+        for cnx, _, _ in libres:
+            self._cerrar(cnx)
+
+    def estado(self):
+        with self._lock:
+            libres = len(self._libres)
+        return {"tamano": self.tamano, "libres": libres}
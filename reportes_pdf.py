@@ -0,0 +1,248 @@
+"""
+Comprobantes de venta y reportes mensuales por sucursal en PDF (fpdf).
+
+Los datos se leen en el proceso de la app (consultas chicas por índice) y el dibujo
+del PDF corre en un pool de procesos, fuera del hilo que atiende la página.
+Cada PDF queda guardado en disco con un nombre que incluye una huella de sus datos:
+  comprobante_<id venta>_<huella>.pdf
+  reporte_<año>-<mes>_<sucursal>_<huella>.pdf
+Si los datos no cambiaron, la siguiente descarga sale directo del disco; si se editó
+la venta (o entraron movimientos en ese mes), la huella cambia y se regenera.
+Los PDF que no se usan hace DIAS_CONSERVAR días se borran, y si la carpeta pasa de
+MAXIMO_MB se borran los menos usados (ver limpiar).
+
+Uso (generación masiva de fin de mes, usa todos los núcleos):
+    python reportes_pdf.py 2025 6
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from fpdf import FPDF
+
+CARPETA = os.environ.get("AURUM_PDF_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_pdf"))
+MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+         "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+DIAS_CONSERVAR = 30
+MAXIMO_MB = 200
+LIMPIAR_CADA = 3600    # segundos entre limpiezas automáticas (por proceso)
+
+_pool = None
+_pool_lock = threading.Lock()
+_ultima_limpieza = 0.0
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el servidor de Streamlit tiene muchos hilos y un fork copiaría locks tomados
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+# --- DIBUJO (corre en los procesos del pool: solo recibe datos simples) ---
+def _txt(valor):
+    # fpdf 1.7 solo maneja latin-1
+    return str(valor).encode("latin-1", "replace").decode("latin-1")
+
+
+def _plata(valor):
+    return f"${valor:,.0f}".replace(",", ".")
+
+
+def _encabezado(pdf, titulo, subtitulo):
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, _txt("Aurum Suplementos"), ln=1)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, _txt(titulo), ln=1)
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 6, _txt(subtitulo), ln=1)
+    pdf.ln(4)
+
+
+def _tabla(pdf, columnas, filas):
+    """columnas: [(titulo, ancho, alineación)]; filas: listas de textos ya formateados."""
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_fill_color(230, 230, 230)
+    for titulo, ancho, alin in columnas:
+        pdf.cell(ancho, 7, _txt(titulo), border=1, align=alin, fill=True)
+    pdf.ln()
+    pdf.set_font("Arial", "", 9)
+    for fila in filas:
+        for (_, ancho, alin), valor in zip(columnas, fila):
+            pdf.cell(ancho, 6, _txt(valor)[:int(ancho * 0.6)], border=1, align=alin)
+        pdf.ln()
+
+
+def _guardar(pdf, ruta):
+    temporal = ruta + ".tmp"
+    pdf.output(temporal, "F")
+    os.replace(temporal, ruta)  # nunca dejar un PDF a medio escribir con el nombre final
+    return ruta
+
+
+def dibujar_comprobante(datos, ruta):
+    pdf = FPDF()
+    _encabezado(pdf, f"Comprobante de venta N° {datos['id']}",
+                f"{datos['fecha']}  -  Sucursal {datos['sucursal']}  -  Cliente: {datos['cliente']}")
+    _tabla(pdf, [("Producto", 100, "L"), ("Cant.", 20, "R"), ("Precio", 35, "R"), ("Total", 35, "R")],
+           [[l["producto"], l["cantidad"], _plata(l["precio"]), _plata(l["total"])] for l in datos["lineas"]])
+    pdf.ln(3)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(155, 8, _txt("TOTAL"), align="R")
+    pdf.cell(35, 8, _txt(_plata(sum(l["total"] for l in datos["lineas"]))), align="R", ln=1)
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 6, _txt(f"Medio de pago: {datos['metodo']}"), ln=1)
+    if datos["notas"]:
+        pdf.cell(0, 6, _txt(f"Notas: {datos['notas']}"), ln=1)
+    return _guardar(pdf, ruta)
+
+
+def dibujar_reporte_mensual(datos, ruta):
+    pdf = FPDF()
+    prods, dias = datos["productos"], datos["dias"]
+    ingresos, costo = sum(p["ingresos"] for p in prods), sum(p["costo"] for p in prods)
+    _encabezado(pdf, f"Reporte mensual - {MESES[datos['mes'] - 1]} {datos['anio']}", f"Sucursal {datos['sucursal']}")
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 7, _txt(f"Ventas: {_plata(ingresos)} ({sum(d['ventas'] for d in dias)} operaciones)   "
+                        f"Compras: {_plata(costo)} ({sum(d['compras'] for d in dias)} operaciones)"), ln=1)
+    pdf.ln(2)
+    _tabla(pdf, [("Día", 25, "L"), ("Ventas", 25, "R"), ("Ingresos", 45, "R"), ("Compras", 25, "R"), ("Costo", 45, "R")],
+           [[d["dia"], d["ventas"], _plata(d["ingresos"]), d["compras"], _plata(d["costo"])] for d in dias])
+    pdf.ln(4)
+    _tabla(pdf, [("Producto", 85, "L"), ("Vendidas", 22, "R"), ("Ingresos", 30, "R"), ("Compradas", 23, "R"), ("Costo", 30, "R")],
+           [[p["producto"], p["vendidas"], _plata(p["ingresos"]), p["compradas"], _plata(p["costo"])] for p in prods])
+    return _guardar(pdf, ruta)
+
+
+# --- CACHÉ EN DISCO + POOL ---
+def _huella(datos):
+    return hashlib.sha1(json.dumps(datos, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def _ruta(prefijo, datos):
+    os.makedirs(CARPETA, exist_ok=True)
+    return os.path.join(CARPETA, f"{prefijo}_{_huella(datos)}.pdf")
+
+
+def limpiar(dias=DIAS_CONSERVAR, maximo_mb=MAXIMO_MB):
+    """
+    Borra los PDF sin usar hace más de `dias` (la fecha de modificación se renueva cada vez
+    que uno sale del disco) y, si la carpeta sigue pasando de `maximo_mb`, los menos usados.
+    Devuelve cuántos archivos borró.
+    """
+    if not os.path.isdir(CARPETA):
+        return 0
+    archivos = []
+    for nombre in os.listdir(CARPETA):
+        ruta = os.path.join(CARPETA, nombre)
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            continue  # lo borró otro proceso
+        archivos.append((info.st_mtime, info.st_size, ruta))
+    archivos.sort()  # el menos usado primero
+    limite = time.time() - dias * 86400
+    total = sum(tam for _, tam, _ in archivos)
+    borrados = 0
+    for mtime, tam, ruta in archivos:
+        if mtime >= limite and total <= maximo_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(ruta)
+            borrados += 1
+        except OSError:
+            pass
+        total -= tam
+    return borrados
+
+
+def _limpiar_si_corresponde():
+    global _ultima_limpieza
+    if time.time() - _ultima_limpieza >= LIMPIAR_CADA:
+        _ultima_limpieza = time.time()
+        limpiar()
+
+
+def _encargar(funcion, prefijo, datos):
+    """Devuelve un Future con la ruta del PDF; si ya está en disco, el Future ya viene resuelto."""
+    _limpiar_si_corresponde()
+    ruta = _ruta(prefijo, datos)
+    if os.path.exists(ruta):
+        try:
+            os.utime(ruta)  # usado: limpiar() lo conserva
+        except OSError:
+            pass
+        listo = Future()
+        listo.set_result(ruta)
+        return listo
+    return _obtener_pool().submit(funcion, datos, ruta)
+
+
+def ruta_comprobante(id_venta):
+    """
+    Ruta que corresponde hoy al comprobante (la huella cambia si se editó alguna línea del carrito).
+    Sirve de clave para guardar el Future: uno de una ruta vieja ya no es el comprobante vigente.
+    """
+    import database as db
+    datos = db.obtener_datos_comprobante(id_venta)
+    return None if datos is None else _ruta(f"comprobante_{int(id_venta)}", datos)
+
+
+def encargar_comprobante(id_venta):
+    """Future con la ruta del comprobante (None si la venta no existe)."""
+    import database as db
+    datos = db.obtener_datos_comprobante(id_venta)
+    if datos is None:
+        return None
+    return _encargar(dibujar_comprobante, f"comprobante_{int(id_venta)}", datos)
+
+
+def encargar_reporte_mensual(sucursal, anio, mes):
+    import database as db
+    datos = db.obtener_datos_reporte_mensual(sucursal, anio, mes)
+    if datos is None:
+        return None
+    nombre = re.sub(r"[^A-Za-z0-9]+", "-", sucursal).strip("-") or "sucursal"
+    return _encargar(dibujar_reporte_mensual, f"reporte_{anio}-{mes:02d}_{nombre}", datos)
+
+
+def leer(futuro, espera=60):
+    """
+    Bytes del PDF (espera a que termine si todavía se está generando). Desde la app,
+    llamarla recién con futuro.done(): si no, bloquea la página mientras se dibuja.
+    None si el archivo ya no está (lo borró limpiar()): hay que volver a encargarlo.
+    """
+    if futuro is None:
+        return None
+    try:
+        with open(futuro.result(timeout=espera), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def generar_mes(anio, mes, sucursales=None):
+    """Genera los reportes de todas las sucursales en paralelo. Devuelve {sucursal: ruta}."""
+    import database as db
+    sucursales = sucursales or db.obtener_datos_globales()[1]
+    futuros = {s: encargar_reporte_mensual(s, anio, mes) for s in sucursales}
+    return {s: f.result() for s, f in futuros.items() if f is not None}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    hechos = generar_mes(int(sys.argv[1]), int(sys.argv[2]))
+    for suc, ruta in hechos.items():
+        print(f"✅ {suc}: {ruta}")
@@ -0,0 +1,131 @@
+"""
+Chequeo de índices: corre EXPLAIN sobre cada consulta de database.py y falla
+(código de salida 1) si alguna hace un escaneo completo (type = ALL) de una
+tabla que no está en la lista de lecturas completas permitidas.
+
+Las consultas se extraen del código fuente (todas las cadenas que empiezan con
+SELECT / UPDATE / DELETE / INSERT ... SELECT); las que se arman en tiempo de
+ejecución (historial y búsqueda de Movimientos) se generan con todas sus combinaciones de filtros.
+
+Correrlo contra una base con volumen real o sembrada con datos de prueba: con
+tablas casi vacías el optimizador elige escaneos completos porque son más baratos.
+
+Uso:
+    python verificar_indices.py
+"""
+import ast
+import os
+import re
+import sys
+from datetime import date, datetime
+from itertools import product
+
+import database as db
+
+# Tablas que algunas consultas leen enteras a propósito (catálogo, listas chicas,
+# la matriz de stock completa, el directorio de clientes). El historial nunca.
+LECTURAS_COMPLETAS = {"productos", "variantes", "sucursales", "saldos_iniciales", "cuentas", "clientes", "inventario", "schema_version"}
+
+RE_TABLA = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+PALABRAS_SQL = {"LEFT", "RIGHT", "INNER", "JOIN", "WHERE", "ON", "GROUP", "ORDER", "SET", "LIMIT", "FOR", "USING"}
+
+RE_SQL = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT\s+INTO\s+\w+\s*\([^)]*\)\s*SELECT)\b", re.IGNORECASE | re.DOTALL)
+
+
+def consultas_estaticas(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    # Los pedazos de f-strings no son consultas completas (esas van en consultas_dinamicas)
+    en_fstrings = {id(v) for n in ast.walk(arbol) if isinstance(n, ast.JoinedStr) for v in n.values}
+    vistas = set()
+    for nodo in ast.walk(arbol):
+        if id(nodo) in en_fstrings:
+            continue
+        if isinstance(nodo, ast.Constant) and isinstance(nodo.value, str) and RE_SQL.match(nodo.value):
+            sql = " ".join(nodo.value.split())
+            if sql not in vistas:
+                vistas.add(sql)
+                yield f"línea {nodo.lineno}", sql
+
+
+def consultas_dinamicas():
+    for tipo in ("Ventas", "Compras"):
+        for suc, prod, rango, pagina in product([None, 1], [None, "prote"], [False, True], [False, True]):
+            sql, params = db.sql_movimientos(
+                tipo,
+                sucursal_id=suc,
+                producto=prod,
+                desde=date(2025, 1, 1) if rango else None,
+                hasta=date(2025, 12, 31) if rango else None,
+                despues_de=(datetime(2025, 6, 1), 1000) if pagina else None,
+            )
+            filtros = f"sucursal={bool(suc)} producto={bool(prod)} fechas={rango} página={pagina}"
+            yield f"sql_movimientos({tipo}, {filtros})", sql, params
+        for suc, rango in product([None, 1], [False, True]):
+            sql, params = db.sql_busqueda(
+                tipo,
+                "factura 0012-3344",
+                sucursal_id=suc,
+                desde=date(2025, 1, 1) if rango else None,
+                hasta=date(2025, 12, 31) if rango else None,
+            )
+            yield f"sql_busqueda({tipo}, sucursal={bool(suc)} fechas={rango})", sql, params
+
+
+def tablas_por_alias(sql):
+    alias = {}
+    for tabla, nombre in RE_TABLA.findall(sql):
+        alias[tabla] = tabla
+        if nombre and nombre.upper() not in PALABRAS_SQL:
+            alias[nombre] = tabla
+    return alias
+
+
+def explicar(cursor, sql, params=None):
+    # Sin valores reales, cada %s se reemplaza por '1': sirve tanto para columnas
+    # numéricas como de texto sin invalidar el uso de índices.
+    if params is None:
+        sql = re.sub(r"LIMIT\s+%s", "LIMIT 50", sql, flags=re.IGNORECASE)
+        params = ["1"] * sql.count("%s")
+    cursor.execute("EXPLAIN " + sql, params)
+    columnas = [c[0] for c in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+def main():
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.py")
+    consultas = [(origen, sql, None) for origen, sql in consultas_estaticas(ruta)]
+    consultas += list(consultas_dinamicas())
+
+    conn = db.get_db_connection()
+    cursor = conn.cursor(buffered=True)
+    fallas = 0
+    try:
+        for origen, sql, params in consultas:
+            try:
+                plan = explicar(cursor, sql, params)
+            except Exception as e:
+                fallas += 1
+                print(f"❌ {origen}: EXPLAIN falló ({e})\n   {sql}")
+                continue
+            alias = tablas_por_alias(sql)
+            escaneos = [
+                alias.get(p["table"], p["table"]) for p in plan
+                if p.get("type") == "ALL" and not str(p["table"]).startswith("<")  # <derived2>, <union2,3>: resultados intermedios
+                and alias.get(p["table"], p["table"]) not in LECTURAS_COMPLETAS
+            ]
+            if escaneos:
+                fallas += 1
+                print(f"❌ {origen}: escaneo completo de {', '.join(escaneos)}\n   {sql}")
+            else:
+                print(f"✅ {origen}")
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"\n{len(consultas)} consultas revisadas, {fallas} con problemas.")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())